@@ -0,0 +1,299 @@
+"""
+Generates the fixture pages served by the benchmarks, into benchmarks/fixtures.
+
+The pages follow the layout of the real pages that scraper.py reads (the nrlstats season
+and match pages, the Wayback copies of the 2007 and 2008 seasons, and the
+basketball-reference box score, play-by-play, daily index and schedule pages), with made up stats,
+so that the benchmarks run without touching the real sites. They are generated from a
+fixed seed, so rerunning this gives the same pages. pages.json maps each URL that the
+benchmarks request to the page that is served for it, and captures.json lists the Wayback
+captures that the stand-in CDX server knows of.
+"""
+import datetime
+import json
+import os
+import random
+
+fixtures_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+rng = random.Random(2015)
+
+nrl_teams = [
+    ("Wests Tigers", "Wests", "TIGERS"), ("Parramatta", "Parramatta", "EELS"),
+    ("South Sydney", "SouthSydney", "RABBITOHS"), ("Brisbane", "Brisbane", "BRONCOS"),
+    ("Gold Coast", "GoldCoast", "TITANS"), ("Warriors", "NewZealand", "WARRIORS"),
+    ("Manly", "Manly", "SEA EAGLES"), ("Sydney Roosters", "Sydney", "ROOSTERS"),
+]
+
+player_columns = {
+    "summary" : ["Pos", "Mins", "Tries", "Goals", "Points", "Runs", "Metres", "Tackles", "Errors"],
+    "points" : ["Pos", "Mins", "Tries", "Try Assists", "Conversions", "Penalty Goals", "Field Goals", "Points"],
+    "runs" : ["Pos", "Mins", "Runs", "Metres", "Hitups", "Dummy Half Runs", "Line Breaks", "Tackle Breaks", "Offloads"],
+    "tackles" : ["Pos", "Mins", "Tackles", "Missed Tackles", "Ineffective Tackles", "One On One"],
+    "kicks" : ["Pos", "Mins", "Kicks", "Kick Metres", "40/20s", "Line Dropouts"],
+}
+
+positions = ["FB", "WG", "CE", "CE", "WG", "FE", "HB", "PR", "HK", "PR", "SR", "SR", "LK", "INT", "INT", "INT", "INT"]
+
+team_stats = ["Possession %", "Completed Sets", "Total Runs", "Total Run Metres", "Line Breaks",
+              "Tackle Breaks", "Offloads", "Tackles", "Missed Tackles", "Errors", "Penalties Conceded",
+              "Kicks", "Kick Metres", "40/20 Kicks", "Play The Balls", "Possession Efficiency"]
+
+def page_chrome(title, body):
+    """
+    Wraps a page body in the navigation, scripts and footer that real pages carry.
+    """
+    nav = "".join('<li><a href="/section/%d.html">Section %d</a></li>' % (i, i) for i in range(60))
+    script = "var data = [" + ",".join(str(rng.randint(0, 9999)) for i in range(800)) + "];"
+    footer = "".join("<p>Footer text paragraph %d, with a few words of filler in it.</p>" % i for i in range(40))
+    return ('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>%s</title>'
+            '<script type="text/javascript">%s</script></head><body>'
+            '<div id="header"><ul class="nav">%s</ul></div><div id="content">%s</div>'
+            '<div id="footer">%s</div></body></html>\n' % (title, script, nav, body, footer))
+
+def player_table(div_id, category, teams):
+    columns = player_columns[category]
+    rows = ["<tr><th>Player</th>" + "".join("<th>%s</th>" % c for c in columns) + "</tr>"]
+    for team_num, team in enumerate(teams):
+        if team_num == 1:
+            rows.append("<tr><td>%s</td>" % team[2] + "<td></td>" * len(columns) + "</tr>")
+        for player_num, position in enumerate(positions):
+            cells = ["<td>%d %s, %s</td>" % (player_num + 1, rng.choice(["Smith", "Jones", "Taylor", "Brown"]),
+                                            rng.choice(["Josh", "Sam", "Ben", "Tom"]))]
+            for column in columns:
+                if column == "Pos":
+                    value = position
+                elif column == "Mins":
+                    value = str(rng.randint(10, 80))
+                else:
+                    value = str(rng.randint(0, 30))
+                cells.append("<td>%s</td>" % value)
+            rows.append("<tr>" + "".join(cells) + "</tr>")
+    return '<div id="%s" class="tab-data"><table class="ps">%s</table></div>' % (div_id, "".join(rows))
+
+def compound_value(stat):
+    if "%" in stat or "Efficiency" in stat:
+        return "%d%%" % rng.randint(35, 65)
+    if stat == "Play The Balls":
+        return "%d | %d | %d | %d" % (rng.randint(120, 160), rng.randint(0, 30), rng.randint(50, 100), rng.randint(0, 30))
+    if stat == "Kicks":
+        return "%d (%dm)<br/>%d<br/>%d" % (rng.randint(10, 25), rng.randint(150, 600), rng.randint(0, 3), rng.randint(0, 3))
+    return str(rng.randint(0, 400))
+
+def team_table(div_id, teams):
+    rows = ["<tr><th>%s</th><th>Stat</th><th>%s</th></tr>" % (teams[0][2].title(), teams[1][2].title())]
+    for stat in team_stats:
+        rows.append("<tr><td>%s</td><th>%s</th><td>%s</td></tr>" % (compound_value(stat), stat, compound_value(stat)))
+    return '<div id="%s" class="tab-data"><table class="ts">%s</table></div>' % (div_id, "".join(rows))
+
+def nrl_match_page(teams):
+    divs = []
+    for period_num in range(3):
+        for category in ["summary", "points", "runs", "tackles", "kicks"]:
+            divs.append(player_table("tab-ps-%d-%s-data" % (period_num, category), category, teams))
+    for period_num in range(3):
+        divs.append(team_table("tab-tsHalf-%d-data" % period_num, teams))
+        divs.append(team_table("tab-mdHalf-%d-data" % period_num, teams))
+    divs.append(team_table("page-scorecard-data", teams))
+    return page_chrome("%s v %s" % (teams[0][0], teams[1][0]), "".join(divs))
+
+def nrl_season_page(year, rounds, match_link):
+    body = []
+    match_num = 0
+    date = datetime.date(year, 3, 6)
+    for round_num in range(1, rounds + 1):
+        rows = ["<tr><th>Date</th><th>Match</th><th>Score</th><th>Status</th><th>Reports</th></tr>"]
+        for i in range(0, len(nrl_teams), 2):
+            home, away = nrl_teams[(i + round_num * 2) % len(nrl_teams)], nrl_teams[(i + 1 + round_num * 2) % len(nrl_teams)]
+            rows.append('<tr><td>%d %s</td><td><a href="%s">%s v %s</a></td><td>%d - %d</td>'
+                        '<td>Full Time</td><td><a href="#">Report</a></td></tr>'
+                        % (date.day, date.strftime("%b"), match_link(match_num), home[0], away[0],
+                           rng.randint(0, 40), rng.randint(0, 40)))
+            match_num += 1
+            date += datetime.timedelta(days=1)
+        body.append('<div class="m_nrl"><div class="m_h">Round %d</div><div class="m_b"><table>%s</table></div></div>'
+                    % (round_num, "".join(rows)))
+        date += datetime.timedelta(days=3)
+    return page_chrome("Season %d" % year, "".join(body)), match_num
+
+def wayback_chrome(page):
+    toolbar = '<div id="wm-ipp"><table><tr><td>' + "".join('<a href="#">%d</a>' % y for y in range(1996, 2010)) + "</td></tr></table></div>"
+    return page.replace("<body>", "<body>" + toolbar, 1)
+
+def box_score_table(table_id, rows_count):
+    columns = ["MP", "FG", "FGA", "FG%", "3P", "3PA", "3P%", "FT", "FTA", "FT%", "ORB", "DRB", "TRB",
+               "AST", "STL", "BLK", "TOV", "PF", "PTS", "+/-"]
+    head = ('<thead><tr class="over_header"><th colspan="2"></th><th colspan="%d">Basic Box Score Stats</th></tr>'
+            '<tr><th>Starters</th>%s</tr></thead>' % (len(columns) - 1, "".join("<th>%s</th>" % c for c in columns)))
+    rows = []
+    for i in range(rows_count):
+        cells = ['<td><a href="/players/x/player%02d.html">Player %d</a></td>' % (i, i)]
+        cells.append("<td>%d:%02d</td>" % (rng.randint(5, 45), rng.randint(0, 59)))
+        cells.extend("<td>%d</td>" % rng.randint(0, 12) for c in columns[1:])
+        rows.append("<tr>" + "".join(cells) + "</tr>")
+        if i == 4:
+            rows.append('<tr class="thead"><th>Reserves</th>' + "".join("<th>%s</th>" % c for c in columns) + "</tr>")
+    return ('<table class="sortable stats_table" id="%s">%s<tbody>%s</tbody></table>'
+            % (table_id, head, "".join(rows)))
+
+def box_score_page(teams):
+    tables = []
+    for team in teams:
+        tables.append(box_score_table(team + "_basic", 13))
+        tables.append(box_score_table(team + "_advanced", 13))
+    return page_chrome("Box Score", "".join(tables))
+
+def pbp_page(teams):
+    tables = ['<table class="stats_table" id="line_score"><tr><th>Team</th><th>1</th><th>2</th><th>3</th><th>4</th><th>T</th></tr>'
+              + "".join("<tr><td>%s</td>%s</tr>" % (team, "".join("<td>%d</td>" % rng.randint(15, 35) for i in range(5))) for team in teams)
+              + "</table>",
+              '<table class="stats_table" id="four_factors"><tr><th>Team</th><th>Pace</th><th>eFG%</th></tr>'
+              + "".join("<tr><td>%s</td><td>%d</td><td>.%03d</td></tr>" % (team, rng.randint(85, 100), rng.randint(400, 600)) for team in teams)
+              + "</table>",
+              '<table class="stats_table" id="officials"><tr><th>Officials</th></tr><tr><td>Ref One, Ref Two</td></tr></table>']
+    # The quarter headings open with <th> and close with </td>, as on the real page.
+    rows = ['<tr><th colspan="6">1st Quarter</td></tr>',
+            "<tr><th>Time</th><th>%s</th><th></th><th>Score</th><th></th><th>%s</th></tr>" % tuple(teams)]
+    score = [0, 0]
+    for quarter in range(1, 5):
+        if quarter > 1:
+            rows.append('<tr><th colspan="6">%s Quarter</td></tr>' % ["", "1st", "2nd", "3rd", "4th"][quarter])
+        rows.append('<tr><td>12:00.0</td><td colspan="5">Start of %s quarter</td></tr>' % ["", "1st", "2nd", "3rd", "4th"][quarter])
+        for event in range(120):
+            clock = "%d:%04.1f" % (11 - event // 11, 59.9 - (event % 11) * 5.3)
+            side = rng.randint(0, 1)
+            points = rng.choice([0, 0, 2, 2, 3, 1])
+            score[side] += points
+            text = '<a href="/players/x/player%02d.html">Player %d</a> %s' % (event % 13, event % 13,
+                                                                                 rng.choice(["makes 2-pt shot", "misses 3-pt shot", "defensive rebound", "turnover"]))
+            plus = "+%d" % points if points else ""
+            if side == 0:
+                rows.append("<tr><td>%s</td><td>%s</td><td>%s</td><td>%d-%d</td><td></td><td></td></tr>" % (clock, text, plus, score[0], score[1]))
+            else:
+                rows.append("<tr><td>%s</td><td></td><td></td><td>%d-%d</td><td>%s</td><td>%s</td></tr>" % (clock, score[0], score[1], plus, text))
+    tables.append('<table class="no_highlight stats_table">%s</table>' % "".join(rows))
+    return page_chrome("Play-By-Play", "".join(tables))
+
+def box_score_index_page(date, games):
+    body = []
+    for game, teams in games:
+        body.append('<div class="game_summary"><table><tr><td>%s</td><td>%s</td></tr></table>'
+                    '<p class="links"><a href="/boxscores/%s.html">Box Score</a> '
+                    '<a href="/boxscores/pbp/%s.html">Play-By-Play</a></p></div>' % (teams[0], teams[1], game, game))
+    return page_chrome("Box scores for %s" % date.isoformat(), "".join(body))
+
+def schedule_page(season, month, days, month_names):
+    """
+    A schedule page of a season, listing the games of the given month, with the links to the
+    other months of the season.
+    """
+    filters = "".join('<a href="/leagues/NBA_%d_games-%s.html">%s</a>' % (season, name, name.capitalize())
+                      for name in month_names)
+    rows = []
+    for date, games in days:
+        for game, teams in games:
+            box_score = ""
+            if game is not None:
+                box_score = '<a href="/boxscores/%s.html">Box Score</a>' % game
+            rows.append('<tr><th scope="row" data-stat="date_game" csk="%s0">'
+                        '<a href="/boxscores/index.fcgi?month=%d&amp;day=%d&amp;year=%d">%s</a></th>'
+                        '<td data-stat="visitor_team_name">%s</td><td data-stat="visitor_pts">%d</td>'
+                        '<td data-stat="home_team_name">%s</td><td data-stat="home_pts">%d</td>'
+                        '<td data-stat="box_score_text">%s</td></tr>'
+                        % (date.strftime("%Y%m%d"), date.month, date.day, date.year, date.strftime("%a, %b %d, %Y"),
+                           teams[1], rng.randint(80, 120), teams[0], rng.randint(80, 120), box_score))
+            if len(rows) % 11 == 10:
+                # The site repeats the headings every so often down the table.
+                rows.append('<tr class="thead"><th>Date</th><th>Visitor</th><th>PTS</th>'
+                            '<th>Home</th><th>PTS</th><th></th></tr>')
+    table = ('<table class="stats_table" id="schedule"><thead><tr><th>Date</th><th>Visitor</th><th>PTS</th>'
+             '<th>Home</th><th>PTS</th><th></th></tr></thead><tbody>%s</tbody></table>' % "".join(rows))
+    return page_chrome("%d-%02d NBA Schedule: %s" % (season - 1, season % 100, month),
+                       '<div class="filter">%s</div>%s' % (filters, table))
+
+def write_fixture(name, text):
+    with open(os.path.join(fixtures_dir, name), 'w') as f:
+        f.write(text)
+
+def main():
+    if not os.path.exists(fixtures_dir):
+        os.makedirs(fixtures_dir)
+    pages = {}
+
+    write_fixture("nrlstats_match_a.html", nrl_match_page(nrl_teams[0:2]))
+    write_fixture("nrlstats_match_b.html", nrl_match_page(nrl_teams[2:4]))
+    match_files = ["nrlstats_match_a.html", "nrlstats_match_b.html"]
+
+    season, matches = nrl_season_page(2015, 4, lambda match_num: "/nrl/match%04d.html" % match_num)
+    write_fixture("nrlstats_season2015.html", season)
+    pages["http://live.nrlstats.com/nrl/season2015.html"] = "nrlstats_season2015.html"
+    for match_num in range(matches):
+        pages["http://live.nrlstats.com/nrl/match%04d.html" % match_num] = match_files[match_num % 2]
+
+    base_2007 = "http://web.archive.org/web/20080718185646/http://www.nrlstats.com/season2007/"
+    season, matches = nrl_season_page(2007, 1, lambda match_num: "match%04d.html" % match_num)
+    write_fixture("wayback_season2007.html", wayback_chrome(season))
+    pages[base_2007 + "index.html"] = "wayback_season2007.html"
+    for match_num in range(matches):
+        pages[base_2007 + "match%04d.html" % match_num] = match_files[match_num % 2]
+
+    # The captures of the 2007 season that the stand-in CDX server lists (see captures.json),
+    # as a wayback.WaybackIndex fetches them raw (id_), without the toolbar: the season page
+    # at the snapshot, each match page a little after it as the crawler reached it, and an
+    # earlier capture of each match that isn't served, which shouldn't be chosen.
+    archive_url = "http://web.archive.org/web/"
+    original_2007 = "http://www.nrlstats.com/season2007/"
+    snapshot = datetime.datetime(2008, 7, 18, 18, 56, 46)
+    write_fixture("wayback_season2007_raw.html", season)
+    captures = [[snapshot.strftime("%Y%m%d%H%M%S"), original_2007 + "index.html", "wayback_season2007_raw.html"]]
+    for match_num in range(matches):
+        timestamp = (snapshot + datetime.timedelta(seconds=(match_num + 1) * 97)).strftime("%Y%m%d%H%M%S")
+        captures.append([timestamp, original_2007 + "match%04d.html" % match_num, match_files[match_num % 2]])
+        captures.append(["20070601000000", original_2007 + "match%04d.html" % match_num, None])
+    for timestamp, original, name in captures:
+        if name is not None:
+            pages[archive_url + timestamp + "id_/" + original] = name
+    with open(os.path.join(fixtures_dir, "captures.json"), 'w') as f:
+        f.write(json.dumps(captures, indent=1) + "\n")
+
+    base_2008 = "http://web.archive.org/web/20090916203853/http://live.nrlstats.com/"
+    season, matches = nrl_season_page(2008, 1, lambda match_num: "nrl/match%04d.html" % match_num)
+    write_fixture("wayback_season2008.html", wayback_chrome(season))
+    pages[base_2008 + "nrl/season2008.html"] = "wayback_season2008.html"
+    for match_num in range(matches):
+        pages[base_2008 + "nrl/match%04d.html" % match_num] = match_files[match_num % 2]
+
+    write_fixture("bbref_boxscore_a.html", box_score_page(["SAS", "GSW"]))
+    write_fixture("bbref_boxscore_b.html", box_score_page(["MIA", "IND"]))
+    write_fixture("bbref_pbp.html", pbp_page(["SAS", "GSW"]))
+    base = "http://www.basketball-reference.com"
+    for day in [14, 15, 16]:
+        date = datetime.date(2013, 5, day)
+        games = [("201305%02d0SAS" % day, ("SAS", "GSW")), ("201305%02d0MIA" % day, ("MIA", "IND"))]
+        name = "bbref_index_%s.html" % date.isoformat()
+        write_fixture(name, box_score_index_page(date, games))
+        pages[base + "/boxscores/index.cgi?month=5&day=%d&year=2013" % day] = name
+        for game_num, (game, teams) in enumerate(games):
+            pages[base + "/boxscores/%s.html" % game] = ["bbref_boxscore_a.html", "bbref_boxscore_b.html"][game_num]
+            pages[base + "/boxscores/pbp/%s.html" % game] = "bbref_pbp.html"
+
+    # The schedule of the 2012-13 season. Only the games in May have box score pages.
+    season_months = ["october", "november", "december", "january", "february", "march", "april", "may", "june"]
+    october = [(datetime.date(2012, 10, 30), [("201210300CLE", ("CLE", "WAS")), ("201210300MIA", ("MIA", "BOS"))])]
+    write_fixture("bbref_schedule_2013.html", schedule_page(2013, "October", october, season_months))
+    pages[base + "/leagues/NBA_2013_games.html"] = "bbref_schedule_2013.html"
+    may = []
+    for day in range(1, 32):
+        date = datetime.date(2013, 5, day)
+        if day in [14, 15, 16]:
+            may.append((date, [("201305%02d0SAS" % day, ("SAS", "GSW")), ("201305%02d0MIA" % day, ("MIA", "IND"))]))
+        elif day % 3 == 0:
+            may.append((date, [("201305%02d0OKC" % day, ("OKC", "MEM"))]))
+    write_fixture("bbref_schedule_2013_may.html", schedule_page(2013, "May", may, season_months))
+    pages[base + "/leagues/NBA_2013_games-may.html"] = "bbref_schedule_2013_may.html"
+
+    with open(os.path.join(fixtures_dir, "pages.json"), 'w') as f:
+        f.write(json.dumps(pages, indent=1, sort_keys=True) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""
+Benchmarks scraper.py against the fixture pages in benchmarks/fixtures (see
+make_fixtures.py), which a local stand-in server (see stand_in_server.py) serves in place of
+the real sites.
+
+In the throttled cases, the stand-in server behaves like an overloaded site: it answers
+429 with Retry-After when too many requests are in flight, fails every so often with 503,
+and slows down as the load rises. Pages are served with an ETag, and a request that has
+the page already gets 304 Not Modified.
+
+Each case runs in a fresh process, a few times over, and the best time is kept. For the
+end-to-end cases (a whole season, a range of box score dates, a play-by-play page) the
+pages fetched per second and the peak RSS are reported. For the parse cases, a single page
+that is already in memory is parsed over and over, and the milliseconds and peak RSS growth
+per page are reported.
+
+The results are written as JSON and compared with the baseline committed in
+benchmarks/baseline.json. Any metric that is worse than the baseline by more than the
+tolerance, any case that fails, and any case that isn't in the baseline is reported as a
+regression, and the exit status is 1. Saving the baseline for only some cases (with --case)
+keeps the others. Usage:
+
+    python benchmarks/run_benchmarks.py                  # compare with benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --save-baseline  # make this run the new baseline
+    python benchmarks/run_benchmarks.py --case parse_nrlstats_match --repeat 5
+    python benchmarks/run_benchmarks.py --check-parsers  # compare the HTML parsers
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(bench_dir))
+
+from stand_in_server import load_pages, read_fixture, start_stand_in_server
+
+# The least number of times each parse case parses its page, and the least time it spends
+# parsing it, so that the quickest pages are timed over enough runs to be steady.
+parse_repeats = 20
+parse_min_seconds = 0.5
+
+# For each metric, whether a larger value is better.
+metric_directions = {
+    "seconds" : False,
+    "pages_per_sec" : True,
+    "peak_rss_mb" : False,
+    "parse_ms" : False,
+    "peak_rss_kb_per_page" : False,
+}
+
+def get_peak_rss_kb():
+    # ru_maxrss is in kilobytes on Linux, and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024
+    return peak
+
+# The end-to-end cases, each given the directory to write to.
+def run_nrlstats_season_2015(scraper, out_dir):
+    scraper.extract_nrlstats_season(2015, out_dir=out_dir)
+
+def run_nrlstats_season_2015_workers(scraper, out_dir):
+    scraper.extract_nrlstats_season(2015, workers=4, out_dir=out_dir)
+
+def run_nrlstats_season_2015_streaming(scraper, out_dir):
+    scraper.extract_nrlstats_season(2015, workers=4, streaming=True, out_dir=out_dir)
+
+def run_nrlstats_season_2015_pipeline(scraper, out_dir):
+    scraper.extract_nrlstats_season(2015, workers=4, out_dir=out_dir, parsers=2)
+
+def run_wayback_season_2007(scraper, out_dir):
+    scraper.extract_nrlstats_season(2007, out_dir=out_dir)
+
+def run_wayback_season_2007_resolved(scraper, out_dir):
+    from wayback import WaybackIndex, read_snapshots
+    wayback = WaybackIndex(os.path.join(out_dir, "wayback.sqlite3"),
+                           read_snapshots(os.path.join(os.path.dirname(bench_dir), "links.txt")))
+    scraper.extract_nrlstats_season(2007, out_dir=out_dir, wayback=wayback)
+    wayback.close()
+
+def run_wayback_season_2008(scraper, out_dir):
+    scraper.extract_nrlstats_season(2008, out_dir=out_dir)
+
+def run_nrlstats_live(scraper, out_dir):
+    # Every match of the season polled at once, where only the first poll finds changes.
+    matches = scraper.get_nrlstats_season_matches(2015)
+    scraper.follow_nrlstats_matches(matches, os.path.join(out_dir, "deltas.jsonl"), interval=0, polls=5)
+
+def run_box_scores_range(scraper, out_dir):
+    scraper.extract_box_scores_range(datetime.date(2013, 5, 14), datetime.date(2013, 5, 16), out_dir=out_dir)
+
+def run_box_scores_range_discover(scraper, out_dir):
+    scraper.extract_box_scores_range(datetime.date(2013, 5, 14), datetime.date(2013, 5, 16), out_dir=out_dir,
+                                     discover=True)
+
+def run_pbp(scraper, out_dir):
+    scraper.extract_pbp_data_from_url("http://www.basketball-reference.com/boxscores/pbp/201305140SAS.html",
+                                      out_dir=out_dir)
+
+def run_pbp_events_range(scraper, out_dir):
+    scraper.extract_pbp_events_range(datetime.date(2013, 5, 14), datetime.date(2013, 5, 16),
+                                     os.path.join(out_dir, "pbp_events.csv"))
+
+# The parse cases, each given the page to parse, and returning what was extracted from it.
+def parse_nrlstats_match(scraper, html):
+    match = scraper.make_nrlstats_match("http://live.nrlstats.com/nrl/match0000.html", "6_Mar",
+                                        ["Wests", "Parramatta"], 2015)
+    return list(scraper.iter_nrlstats_tables(match, html))
+
+def parse_nrlstats_match_streaming(scraper, html):
+    match = scraper.make_nrlstats_match("http://live.nrlstats.com/nrl/match0000.html", "6_Mar",
+                                        ["Wests", "Parramatta"], 2015)
+    return list(scraper.iter_nrlstats_tables(match, html, streaming=True))
+
+def parse_nrlstats_season(scraper, html):
+    return scraper.parse_nrlstats_season_matches(html, 2015, scraper.nrlstats_season_base_url(2015))
+
+def parse_box_score(scraper, html):
+    return list(scraper.iter_stats_tables("http://www.basketball-reference.com/boxscores/201305140SAS.html", html))
+
+def parse_box_score_index(scraper, html):
+    return scraper.get_box_score_links(scraper.form_date_url(datetime.date(2013, 5, 14)), html)
+
+def parse_pbp(scraper, html):
+    return list(scraper.iter_pbp_tables("http://www.basketball-reference.com/boxscores/pbp/201305140SAS.html", html))
+
+def parse_schedule(scraper, html):
+    return scraper.parse_schedule_page(html)
+
+end_to_end_cases = {
+    "nrlstats_season_2015" : run_nrlstats_season_2015,
+    "nrlstats_season_2015_workers" : run_nrlstats_season_2015_workers,
+    "nrlstats_season_2015_streaming" : run_nrlstats_season_2015_streaming,
+    "nrlstats_season_2015_pipeline" : run_nrlstats_season_2015_pipeline,
+    "nrlstats_season_2015_throttled" : run_nrlstats_season_2015_workers,
+    "nrlstats_live" : run_nrlstats_live,
+    "wayback_season_2007" : run_wayback_season_2007,
+    "wayback_season_2007_resolved" : run_wayback_season_2007_resolved,
+    "wayback_season_2008" : run_wayback_season_2008,
+    "box_scores_range" : run_box_scores_range,
+    "box_scores_range_discover" : run_box_scores_range_discover,
+    "pbp" : run_pbp,
+    "pbp_events_range" : run_pbp_events_range,
+}
+
+parse_cases = {
+    "parse_nrlstats_match" : (parse_nrlstats_match, "nrlstats_match_a.html"),
+    "parse_nrlstats_match_streaming" : (parse_nrlstats_match_streaming, "nrlstats_match_a.html"),
+    "parse_nrlstats_season" : (parse_nrlstats_season, "nrlstats_season2015.html"),
+    "parse_box_score" : (parse_box_score, "bbref_boxscore_a.html"),
+    "parse_box_score_index" : (parse_box_score_index, "bbref_index_2013-05-14.html"),
+    "parse_pbp" : (parse_pbp, "bbref_pbp.html"),
+    "parse_schedule" : (parse_schedule, "bbref_schedule_2013.html"),
+}
+
+def run_case_here(name, port):
+    """
+    Runs one case in this process, returning its measurements.
+    """
+    import scraper
+    for url in load_pages().keys():
+        scraper.default_client.resolve[urlsplit(url).netloc] = "127.0.0.1:" + str(port)
+
+    start_rss = get_peak_rss_kb()
+    if name in parse_cases:
+        parse, fixture = parse_cases[name]
+        html = read_fixture(fixture)
+        # Parse once first, so that imports and caches warmed on first use aren't counted.
+        start = time.perf_counter()
+        parse(scraper, html)
+        repeats = max(parse_repeats, int(parse_min_seconds / max(time.perf_counter() - start, 1e-6)))
+        start_rss = get_peak_rss_kb()
+        start = time.perf_counter()
+        for i in range(repeats):
+            parse(scraper, html)
+        seconds = time.perf_counter() - start
+        # Per page, since the number of runs depends on how quick the page is.
+        return {"seconds" : seconds / repeats, "parse_ms" : seconds * 1000 / repeats,
+                "peak_rss_kb_per_page" : get_peak_rss_kb() - start_rss,
+                "peak_rss_mb" : get_peak_rss_kb() / 1024.0}
+
+    out_dir = tempfile.mkdtemp(prefix="nrl-bench-")
+    try:
+        start = time.perf_counter()
+        end_to_end_cases[name](scraper, out_dir)
+        seconds = time.perf_counter() - start
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return {"seconds" : seconds, "peak_rss_mb" : get_peak_rss_kb() / 1024.0}
+
+def check_parsers(repeat):
+    """
+    Checks that each of the parsers in html_parsers extracts the same as the reference
+    parser from the page of each parse case, timing them, and prints the results. Returns
+    1 if the parser used by default isn't the fastest of those that were correct.
+    """
+    import html_parsers
+    import scraper
+    default = scraper.default_parser.backend.name
+    pages = [(parse, read_fixture(fixture)) for parse, fixture in parse_cases.values()]
+
+    def extract(parser, page):
+        scraper.default_parser.backend = parser
+        parse, html = page
+        return parse(scraper, html)
+    results = html_parsers.check_parsers(extract, pages, repeat)
+    for name, result in results.items():
+        print("%-12s %10.1f ms  %s" % (name, result["seconds"] * 1000, "ok" if result["correct"] else "DIFFERENT"))
+    chosen = html_parsers.choose_parser(results)
+    print("Fastest correct parser:", chosen, "(default: %s)" % default)
+    return 0 if chosen == default else 1
+
+def run_case(name, server, repeat):
+    """
+    Runs a case in fresh processes, repeat times, keeping the best time and the highest RSS.
+    """
+    best = None
+    server.throttle = name.endswith("_throttled")
+    for i in range(repeat):
+        requests_before = server.requests
+        throttled_before = server.throttled
+        process = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-case", name,
+                                  "--port", str(server.server_address[1])],
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        if process.returncode != 0:
+            lines = process.stderr.strip().splitlines()
+            return {"error" : lines[-1] if lines else "exit status %d" % process.returncode}
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        pages = server.requests - requests_before
+        if pages > 0:
+            result["pages"] = pages
+            result["pages_per_sec"] = pages / result["seconds"]
+        if server.throttle:
+            result["throttled"] = server.throttled - throttled_before
+        if best is None:
+            best = result
+            continue
+        for metric, value in result.items():
+            if metric not in metric_directions:
+                continue
+            if metric == "peak_rss_mb" or metric == "peak_rss_kb_per_page":
+                best[metric] = max(best[metric], value)
+            elif metric_directions[metric] == (value > best[metric]):
+                best[metric] = value
+    return best
+
+def compare_results(results, baseline, tolerance):
+    """
+    Compares each metric of the results with the baseline, printing a line for each, and
+    returns the list of regressions. A case that failed, or that isn't in the baseline, is
+    a regression too.
+    """
+    regressions = []
+    for name, result in sorted(results["cases"].items()):
+        if "error" in result:
+            print("%-34s error: %s" % (name, result["error"]))
+            regressions.append(name + " error")
+            continue
+        base = baseline["cases"].get(name)
+        if base is None:
+            print("%-34s not in the baseline" % name)
+            regressions.append(name + " no baseline")
+            continue
+        for metric in sorted(metric_directions.keys()):
+            if metric not in result or metric not in base or base[metric] == 0:
+                continue
+            change = (result[metric] - base[metric]) / float(base[metric])
+            worse = -change if metric_directions[metric] else change
+            flag = ""
+            if worse > tolerance:
+                flag = "  REGRESSION"
+                regressions.append(name + " " + metric)
+            print("%-34s %-22s %12.3f %12.3f %+7.1f%%%s" % (name, metric, base[metric], result[metric],
+                                                            change * 100, flag))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the scraper against local fixture pages.")
+    parser.add_argument("--case", action="append", help="run only this case (may be repeated)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each case (default 3)")
+    parser.add_argument("--output", default=os.path.join(bench_dir, "results.json"))
+    parser.add_argument("--baseline", default=os.path.join(bench_dir, "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="the fraction by which a metric may be worse than the baseline (default 0.2)")
+    parser.add_argument("--check-parsers", action="store_true",
+                        help="check that every HTML parser extracts the same from the fixtures, and time them")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case_here(args.run_case, args.port)))
+        return 0
+    if args.check_parsers:
+        return check_parsers(args.repeat)
+
+    names = args.case or (list(end_to_end_cases.keys()) + list(parse_cases.keys()))
+    server = start_stand_in_server()
+    results = {
+        "created" : datetime.datetime.now().isoformat(timespec="seconds"),
+        "python" : platform.python_version(),
+        "machine" : platform.platform(),
+        "cases" : {},
+    }
+    for name in names:
+        results["cases"][name] = run_case(name, server, args.repeat)
+        print(name, json.dumps(results["cases"][name], sort_keys=True))
+    server.shutdown()
+
+    with open(args.output, 'w') as f:
+        f.write(json.dumps(results, indent=1, sort_keys=True) + "\n")
+    print("Results written to", args.output)
+
+    errors = [name for name, result in sorted(results["cases"].items()) if "error" in result]
+    if args.save_baseline:
+        if len(errors) > 0:
+            print("Not saving a baseline with failed cases:", ", ".join(errors))
+            return 1
+        baseline = results
+        if args.case and os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            baseline["cases"].update(results["cases"])
+        with open(args.baseline, 'w') as f:
+            f.write(json.dumps(baseline, indent=1, sort_keys=True) + "\n")
+        print("Baseline written to", args.baseline)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare with. Run with --save-baseline to make one.")
+        return 1
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare_results(results, baseline, args.tolerance)
+    if len(regressions) > 0:
+        print("Regressions:", ", ".join(regressions))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+# The upper bounds, in seconds, of the buckets of the latency histograms. The last bucket
+# takes everything slower.
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# The prefix of the names of the metrics in the Prometheus textfile.
+prometheus_prefix = "nrl_scraper_"
+
+# The number of allocation sites kept for each stage when tracing memory.
+memory_top_lines = 10
+
+def make_key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+def format_prometheus_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if len(pairs) == 0:
+        return ""
+    escaped = [(name, str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n"))
+               for name, value in pairs]
+    return "{" + ",".join('%s="%s"' % pair for pair in escaped) + "}"
+
+def format_bound(bound):
+    if bound is None:
+        return "+Inf"
+    return repr(float(bound))
+
+class Histogram:
+    """
+    Counts the values observed in each of a fixed set of buckets, with their count and sum.
+    """
+    def __init__(self, bounds=latency_buckets):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        bucket = len(self.bounds)
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                bucket = i
+                break
+        self.counts[bucket] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Estimates a quantile as the upper bound of the bucket it falls in, or None if it is
+        in the last bucket, which has no bound.
+        """
+        if self.count == 0:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                if i < len(self.bounds):
+                    return self.bounds[i]
+                return None
+        return None
+
+class CrawlMetrics:
+    """
+    Collects the metrics of a crawl: latency histograms of each stage (such as "fetch",
+    "parse" and "write") and counters (such as "fetch_bytes", "cache_hits", "retries" and
+    "rows_written"), each kept separately for every set of labels it is recorded with, such
+    as the host or the table type. It is safe to share between threads.
+
+    The metrics can be written as a JSON summary with write_json, or as a textfile for the
+    Prometheus node exporter with write_prometheus.
+
+    Stages named in profile_stages are also run under cProfile, and when trace_memory is
+    set, the peak memory allocated while they run is traced with tracemalloc. Only one stage
+    is profiled at a time, so a stage that starts while another is being profiled in a
+    different thread isn't profiled. Traced memory also counts what other threads allocate
+    meanwhile. Both slow the crawl down, so they are off by default. Write the results with
+    write_profiles.
+    """
+    def __init__(self):
+        self.profile_stages = set()
+        self.trace_memory = False
+        self.reset()
+
+    def reset(self):
+        """
+        Drops all of the metrics recorded so far.
+        """
+        self.lock = threading.Lock()
+        self.profile_lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.profiles = {}
+        self.memory_peaks = {}
+
+    def observe(self, stage, seconds, **labels):
+        """
+        Records the time taken by one run of a stage.
+        """
+        key = make_key(stage, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name, amount=1, **labels):
+        """
+        Adds the given amount to a counter.
+        """
+        key = make_key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    @contextlib.contextmanager
+    def timer(self, stage, **labels):
+        """
+        Times the block it wraps as a run of the given stage, profiling it if the stage is
+        in profile_stages and tracing its memory if trace_memory is set.
+        """
+        profiling = ((stage in self.profile_stages or self.trace_memory)
+                     and self.profile_lock.acquire(blocking=False))
+        profiler = None
+        start_memory = 0
+        if profiling:
+            if stage in self.profile_stages:
+                profiler = cProfile.Profile()
+            if self.trace_memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                tracemalloc.reset_peak()
+                start_memory = tracemalloc.get_traced_memory()[0]
+            if profiler is not None:
+                profiler.enable()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, **labels)
+            if profiling:
+                if profiler is not None:
+                    profiler.disable()
+                    self.add_profile(stage, profiler)
+                if self.trace_memory:
+                    self.add_memory_peak(stage, tracemalloc.get_traced_memory()[1] - start_memory)
+                self.profile_lock.release()
+
+    def add_profile(self, stage, profiler):
+        with self.lock:
+            if stage in self.profiles:
+                self.profiles[stage].add(profiler)
+            else:
+                self.profiles[stage] = pstats.Stats(profiler)
+
+    def add_memory_peak(self, stage, peak):
+        with self.lock:
+            worst = self.memory_peaks.get(stage)
+            if worst is not None and worst["peak_bytes"] >= peak:
+                return
+        # The allocations still held at the end of the worst run, by where they were made.
+        statistics = tracemalloc.take_snapshot().statistics("lineno")[:memory_top_lines]
+        with self.lock:
+            self.memory_peaks[stage] = {"peak_bytes" : peak,
+                                        "top_allocations" : [str(statistic) for statistic in statistics]}
+
+    def get_total(self, name):
+        """
+        Gets the value of a counter summed over all of its labels.
+        """
+        with self.lock:
+            return sum(value for (key_name, labels), value in self.counters.items() if key_name == name)
+
+    def to_dict(self):
+        """
+        Gets the metrics as a dict that can be written as JSON, or merged into other metrics
+        with merge.
+        """
+        with self.lock:
+            histograms = []
+            for (stage, labels), histogram in sorted(self.histograms.items()):
+                histograms.append({
+                    "stage" : stage,
+                    "labels" : dict(labels),
+                    "bounds" : list(histogram.bounds),
+                    "counts" : list(histogram.counts),
+                    "count" : histogram.count,
+                    "sum" : histogram.sum,
+                    "mean" : histogram.sum / histogram.count,
+                    "p50" : histogram.quantile(0.5),
+                    "p95" : histogram.quantile(0.95),
+                })
+            counters = [{"name" : name, "labels" : dict(labels), "value" : value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            return {"histograms" : histograms, "counters" : counters, "memory_peaks" : dict(self.memory_peaks)}
+
+    def take(self):
+        """
+        Gets the metrics as a dict, as to_dict does, and starts again from nothing. A worker
+        process returns these with its result, so that the parent can merge them.
+        """
+        with self.lock:
+            histograms, counters = self.histograms, self.counters
+            self.histograms, self.counters = {}, {}
+        taken = CrawlMetrics()
+        taken.histograms, taken.counters = histograms, counters
+        return taken.to_dict()
+
+    def merge(self, metrics):
+        """
+        Adds in metrics given as a dict from to_dict or take.
+        """
+        with self.lock:
+            for entry in metrics["histograms"]:
+                key = make_key(entry["stage"], entry["labels"])
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram(entry["bounds"])
+                histogram.counts = [a + b for a, b in zip(histogram.counts, entry["counts"])]
+                histogram.count += entry["count"]
+                histogram.sum += entry["sum"]
+            for entry in metrics["counters"]:
+                key = make_key(entry["name"], entry["labels"])
+                self.counters[key] = self.counters.get(key, 0) + entry["value"]
+
+    def write_json(self, path):
+        """
+        Writes a summary of the metrics to the given path as JSON.
+        """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps(self.to_dict(), indent=1, sort_keys=True) + "\n")
+        os.replace(tmp_path, path)
+
+    def format_prometheus(self):
+        """
+        Formats the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            stages = sorted(set(stage for stage, labels in self.histograms.keys()))
+            for stage in stages:
+                name = prometheus_prefix + stage + "_seconds"
+                lines.append("# HELP %s Time taken by each run of the %s stage." % (name, stage))
+                lines.append("# TYPE %s histogram" % name)
+                for (key_stage, labels), histogram in sorted(self.histograms.items()):
+                    if key_stage != stage:
+                        continue
+                    cumulative = 0
+                    bounds = list(histogram.bounds) + [None]
+                    for bound, count in zip(bounds, histogram.counts):
+                        cumulative += count
+                        lines.append("%s_bucket%s %d" % (name, format_prometheus_labels(labels, [("le", format_bound(bound))]),
+                                                         cumulative))
+                    lines.append("%s_sum%s %r" % (name, format_prometheus_labels(labels), histogram.sum))
+                    lines.append("%s_count%s %d" % (name, format_prometheus_labels(labels), histogram.count))
+
+            names = sorted(set(name for name, labels in self.counters.keys()))
+            for counter in names:
+                name = prometheus_prefix + counter + "_total"
+                lines.append("# TYPE %s counter" % name)
+                for (key_name, labels), value in sorted(self.counters.items()):
+                    if key_name == counter:
+                        lines.append("%s%s %s" % (name, format_prometheus_labels(labels), value))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """
+        Writes the metrics to the given path as a Prometheus textfile. The file is replaced
+        in one step, as the node exporter's textfile collector needs.
+        """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.format_prometheus())
+        os.replace(tmp_path, path)
+
+    def write_profiles(self, directory):
+        """
+        Writes the cProfile results of each profiled stage to <stage>.prof in the given
+        directory, readable with pstats or snakeviz, with the slowest functions listed in
+        <stage>.txt. The traced memory peaks are written to memory.json.
+        """
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        with self.lock:
+            profiles = dict(self.profiles)
+            memory_peaks = dict(self.memory_peaks)
+        for stage, stats in profiles.items():
+            stats.dump_stats(os.path.join(directory, stage + ".prof"))
+            text = io.StringIO()
+            stats.stream = text
+            stats.sort_stats("cumulative").print_stats(30)
+            with open(os.path.join(directory, stage + ".txt"), 'w') as f:
+                f.write(text.getvalue())
+        if len(memory_peaks) > 0:
+            with open(os.path.join(directory, "memory.json"), 'w') as f:
+                f.write(json.dumps(memory_peaks, indent=1, sort_keys=True) + "\n")
+
+# The metrics recorded by scraper.py and the shared HTTP client.
+default_metrics = CrawlMetrics()
+
+# A forked worker process starts with a copy of its parent's metrics. Drop them, so that the
+# parent doesn't count them twice when it merges the metrics the worker returns.
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=default_metrics.reset)
@@ -0,0 +1,236 @@
+import logging
+import time
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml.etree
+    import lxml.html
+except ImportError:
+    # Without lxml, the pages are parsed with html.parser (or html5lib).
+    lxml = None
+
+try:
+    import html5lib
+except ImportError:
+    html5lib = None
+
+from html_stream import get_span, guess_charset
+
+logger = logging.getLogger(__name__)
+
+# The parsers, fastest first, as measured on the fixture pages by
+# benchmarks/run_benchmarks.py --check-parsers, which also checks that they all extract the
+# same tables. The first of them that is installed is used by default.
+parser_preference = ["fast", "lxml", "html.parser", "html5lib"]
+
+# The parser whose output the others are checked against. html5lib parses a page the way
+# a browser does, so it copes with broken markup the same way the site was seen.
+reference_parser = "html5lib"
+
+def get_row_cells(row):
+    """
+    Gets the cells of a soup table row as (tag name, strings, colspan, rowspan) tuples, the
+    same form in which html_stream reports the cells of a streamed row.
+    """
+    cells = []
+    for cell in row.find_all(["th", "td"]):
+        # Plain strings, so that the rows don't keep the whole tree alive (or pickle it).
+        cells.append((cell.name, [str(s) for s in cell.strings],
+                      get_span(cell.attrs, "colspan"), get_span(cell.attrs, "rowspan")))
+    return cells
+
+def get_table_rows(element):
+    """
+    Gets the cells of every row of the tables in the given soup element.
+    """
+    return [get_row_cells(row) for row in element.find_all("tr")]
+
+def get_attr_strings(attrs):
+    """
+    Gets the attributes of a soup element as strings, joining the values of multi-valued
+    attributes such as class, as html_stream gives them to find_container.
+    """
+    return dict((name, " ".join(value) if isinstance(value, list) else value) for name, value in attrs.items())
+
+class SoupParser:
+    """
+    Parses pages with BeautifulSoup, using one of its tree builders ("lxml", "html5lib" or
+    "html.parser").
+    """
+    def __init__(self, name, features=None):
+        self.name = name
+        self.features = features or name
+
+    def make_soup(self, html, parse_only=None):
+        if self.features == "html5lib":
+            # html5lib always builds the whole page, and warns if asked not to.
+            parse_only = None
+        return BeautifulSoup(html, self.features, parse_only=parse_only)
+
+    def get_tables(self, html, tag, find_container, parse_only=None):
+        """
+        Gets the rows of the tables inside the elements of a page that find_container
+        selects, as (key, rows) pairs in page order. find_container is called as for
+        html_stream.iter_table_rows, with the tag name and attributes of each element with
+        the given tag name that isn't inside a selected one. parse_only can limit the
+        elements that are built to those that might be selected.
+        """
+        soup = self.make_soup(html, parse_only or SoupStrainer(tag))
+        tables = []
+        selected = None
+        for element in soup.find_all(tag):
+            if selected is not None and any(parent is selected for parent in element.parents):
+                continue
+            key = find_container(element.name, get_attr_strings(element.attrs))
+            if key is None:
+                continue
+            selected = element
+            tables.append((key, get_table_rows(element)))
+        return tables
+
+    def get_links(self, html, text):
+        """
+        Gets the targets of the links on a page whose text is the given text.
+        """
+        soup = self.make_soup(html, SoupStrainer("a"))
+        return [link["href"] for link in soup.find_all("a", href=True, string=text)]
+
+def get_lxml_strings(element):
+    """
+    Gets the strings inside an lxml element, as soup's strings would be, leaving out
+    comments and processing instructions.
+    """
+    strings = []
+    if element.text:
+        strings.append(element.text)
+    for child in element:
+        if isinstance(child.tag, str):
+            strings.extend(get_lxml_strings(child))
+        if child.tail:
+            strings.append(child.tail)
+    return strings
+
+def get_lxml_row_cells(row):
+    """
+    Gets the cells of an lxml table row in the same form as get_row_cells.
+    """
+    return [(cell.tag, get_lxml_strings(cell), get_span(cell.attrib, "colspan"), get_span(cell.attrib, "rowspan"))
+            for cell in row.iter("th", "td")]
+
+class FastParser(SoupParser):
+    """
+    Gets the tables and links of a page from a tree that lxml builds directly, which is
+    several times faster than building a soup, selecting the elements while walking the
+    tree. Pages that are searched in other ways are parsed into a soup with lxml.
+    """
+    def __init__(self, name="fast"):
+        SoupParser.__init__(self, name, "lxml")
+
+    def make_tree(self, html):
+        if isinstance(html, bytes):
+            html = html.decode(guess_charset(html), errors="replace")
+        if html.strip() == "":
+            return None
+        return lxml.html.document_fromstring(html)
+
+    def get_tables(self, html, tag, find_container, parse_only=None):
+        root = self.make_tree(html)
+        if root is None:
+            return []
+        tables = []
+        selected = None
+        for element in root.iter(tag):
+            if selected is not None and any(parent is selected for parent in element.iterancestors()):
+                continue
+            key = find_container(element.tag, dict(element.attrib))
+            if key is None:
+                continue
+            selected = element
+            tables.append((key, [get_lxml_row_cells(row) for row in element.iter("tr")]))
+        return tables
+
+    def get_links(self, html, text):
+        root = self.make_tree(html)
+        if root is None:
+            return []
+        return [link.get("href") for link in root.iter("a")
+                if link.get("href") is not None and len(link) == 0 and link.text == text]
+
+def get_parsers():
+    """
+    Gets the parsers that can be used here, by name, in order of preference.
+    """
+    parsers = {}
+    for name in parser_preference:
+        if name in ("fast", "lxml") and lxml is None:
+            continue
+        if name == "html5lib" and html5lib is None:
+            continue
+        parsers[name] = FastParser() if name == "fast" else SoupParser(name)
+    return parsers
+
+class HtmlParser:
+    """
+    Parses pages with the chosen parser, which is by default the first in
+    parser_preference that is installed. Set backend to another of get_parsers() to change
+    it, such as with use("html5lib").
+    """
+    def __init__(self, backend=None):
+        if backend is None:
+            backend = next(iter(get_parsers().values()))
+        self.backend = backend
+
+    def use(self, name):
+        """
+        Changes the parser to the one with the given name. Raises ValueError if it isn't
+        installed.
+        """
+        parsers = get_parsers()
+        if name not in parsers:
+            raise ValueError("Unknown or uninstalled parser: %s (have %s)" % (name, ", ".join(parsers)))
+        self.backend = parsers[name]
+
+    def make_soup(self, html, parse_only=None):
+        return self.backend.make_soup(html, parse_only)
+
+    def get_tables(self, html, tag, find_container, parse_only=None):
+        return self.backend.get_tables(html, tag, find_container, parse_only)
+
+    def get_links(self, html, text):
+        return self.backend.get_links(html, text)
+
+def check_parsers(extract, pages, repeat=3):
+    """
+    Runs extract(parser, page) on each of the pages with each parser, timing it (the best of
+    repeat runs) and checking that its output is the same as the reference parser's.
+    Returns {name : {"seconds" : seconds, "correct" : whether it matched}}.
+    """
+    parsers = get_parsers()
+    reference = parsers.get(reference_parser) or next(iter(parsers.values()))
+    expected = [extract(reference, page) for page in pages]
+    results = {}
+    for name, parser in parsers.items():
+        best = None
+        for i in range(repeat):
+            start = time.perf_counter()
+            output = [extract(parser, page) for page in pages]
+            seconds = time.perf_counter() - start
+            best = seconds if best is None else min(best, seconds)
+        results[name] = {"seconds" : best, "correct" : output == expected}
+        if output != expected:
+            logger.warning("The %s parser doesn't extract the same tables as %s", name, reference.name)
+    return results
+
+def choose_parser(results):
+    """
+    Gets the name of the fastest parser that was correct in the results of check_parsers,
+    or None if none were.
+    """
+    correct = [name for name, result in results.items() if result["correct"]]
+    if len(correct) == 0:
+        return None
+    return min(correct, key=lambda name: results[name]["seconds"])
+
+# The parser used throughout.
+default_parser = HtmlParser()
@@ -0,0 +1,195 @@
+import codecs
+import re
+from html.parser import HTMLParser
+
+charset_pattern = re.compile(rb'charset\s*=\s*["\']?([-\w.:]+)', re.IGNORECASE)
+
+def get_span(attrs, name):
+    """
+    Gets the colspan or rowspan of a cell from its attributes. If there isn't a valid one
+    specified, it is 1.
+    """
+    try:
+        return max(int(attrs.get(name, 1)), 1)
+    except (TypeError, ValueError):
+        return 1
+
+class TableRowStream(HTMLParser):
+    """
+    An event-driven HTML parser that reports the rows of the tables inside selected elements,
+    without building a tree of the page. find_container is called with the tag name and
+    attributes of each start tag outside of a selected element, and returns a key for the
+    elements to select and None for the rest.
+
+    Each row is reported as a ("row", key, cells) event, where each cell is a (tag name,
+    strings, colspan, rowspan) tuple, and an ("end", key) event follows the last row of a selected
+    element. A row is forgotten as soon as it has been reported, so the memory used is bounded
+    by the largest row rather than the page.
+    """
+    def __init__(self, find_container):
+        HTMLParser.__init__(self, convert_charrefs=True)
+        self.find_container = find_container
+        self.events = []
+        self.container_key = None
+        self.container_tag = None
+        self.container_depth = 0
+        self.row = None
+        self.cell = None
+
+    def finish_cell(self):
+        if self.cell is not None:
+            self.row.append(self.cell)
+            self.cell = None
+
+    def finish_row(self):
+        self.finish_cell()
+        if self.row is not None:
+            self.events.append(("row", self.container_key, self.row))
+            self.row = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.container_key is None:
+            key = self.find_container(tag, dict(attrs))
+            if key is not None:
+                self.container_key = key
+                self.container_tag = tag
+                self.container_depth = 1
+            return
+
+        if tag == self.container_tag:
+            self.container_depth += 1
+        if tag == "tr":
+            self.finish_row()
+            self.row = []
+        elif tag in ("td", "th"):
+            if self.row is None:
+                self.row = []
+            self.finish_cell()
+            attrs = dict(attrs)
+            self.cell = (tag, [], get_span(attrs, "colspan"), get_span(attrs, "rowspan"))
+
+    def handle_startendtag(self, tag, attrs):
+        # A self-closing tag such as <br/> has no content and never changes the nesting.
+        if self.container_key is None:
+            self.handle_starttag(tag, attrs)
+            if self.container_key is not None:
+                self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self.container_key is None:
+            return
+        if tag in ("td", "th"):
+            self.finish_cell()
+        elif tag in ("tr", "table"):
+            self.finish_row()
+        if tag == self.container_tag:
+            self.container_depth -= 1
+            if self.container_depth == 0:
+                self.finish_row()
+                self.events.append(("end", self.container_key))
+                self.container_key = None
+                self.container_tag = None
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell[1].append(data)
+
+    def close(self):
+        HTMLParser.close(self)
+        if self.container_key is not None:
+            self.finish_row()
+            self.events.append(("end", self.container_key))
+            self.container_key = None
+
+    def take_events(self):
+        events = self.events
+        self.events = []
+        return events
+
+def guess_charset(data, default="utf-8"):
+    """
+    Guesses the character set of a page from the start of its bytes.
+    """
+    match = charset_pattern.search(data[:4096])
+    if match is not None:
+        try:
+            return codecs.lookup(match.group(1).decode("ascii")).name
+        except LookupError:
+            pass
+    return default
+
+def iter_table_rows(chunks, find_container, charset=None):
+    """
+    Parses a page that arrives as an iterable of byte (or text) chunks, yielding the row and
+    end events of TableRowStream as soon as each row has been read.
+    """
+    parser = TableRowStream(find_container)
+    decoder = None
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder(charset or guess_charset(chunk))(errors="replace")
+            chunk = decoder.decode(chunk)
+        parser.feed(chunk)
+        for event in parser.take_events():
+            yield event
+    if decoder is not None:
+        parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    for event in parser.take_events():
+        yield event
+
+def iter_chunks(data, chunk_size=64 * 1024):
+    """
+    Splits a page that is already in memory into chunks for iter_table_rows.
+    """
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+# The patterns that find_element_spans uses for each tag, compiled as they are first needed.
+element_patterns = {}
+
+def get_element_patterns(tag, binary):
+    key = (tag, binary)
+    patterns = element_patterns.get(key)
+    if patterns is None:
+        # The id attribute follows a space or the quote of another attribute, so that
+        # attributes such as data-id aren't taken for it.
+        start = r"<%s\b[^>]*?[\s\"']id\s*=\s*[\"']?([^\"'\s>]+)[^>]*>" % tag
+        nested = r"<(/?)%s\b[^>]*>" % tag
+        if binary:
+            start, nested = start.encode("ascii"), nested.encode("ascii")
+        patterns = element_patterns[key] = (re.compile(start, re.IGNORECASE), re.compile(nested, re.IGNORECASE))
+    return patterns
+
+def find_element_spans(data, tag, ids):
+    """
+    Finds the elements with the given tag and one of the given IDs in a page, held as
+    bytes or text, without parsing it. Returns the (start, end) span of each element, from
+    its start tag to the end of its end tag, keyed by ID. Elements of the same tag nested
+    inside are counted, so that the span ends where the element does. An element that isn't
+    closed runs to the end of the page.
+    """
+    binary = isinstance(data, bytes)
+    start_pattern, nested_pattern = get_element_patterns(tag, binary)
+    spans = {}
+    pos = 0
+    while True:
+        match = start_pattern.search(data, pos)
+        if match is None:
+            return spans
+        element_id = match.group(1)
+        if binary:
+            element_id = element_id.decode("ascii", "replace")
+        if element_id not in ids:
+            pos = match.end()
+            continue
+        depth = 1
+        end = len(data)
+        for nested in nested_pattern.finditer(data, match.end()):
+            depth += -1 if nested.group(1) else 1
+            if depth == 0:
+                end = nested.end()
+                break
+        spans[element_id] = (match.start(), end)
+        pos = end
@@ -0,0 +1,453 @@
+import datetime
+import email.utils
+import gzip
+import http.client
+import random
+import threading
+import time
+import zlib
+from urllib.parse import urljoin, urlsplit
+
+from crawl_metrics import default_metrics
+from rate_limit import HostLimits
+
+# The errors that mean a kept-alive connection was closed by the server while it sat idle
+# in the pool. A request that fails this way on a reused connection is sent again on a new one.
+stale_connection_errors = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+redirect_statuses = (301, 302, 303, 307, 308)
+
+# The statuses that mean the server is overloaded or throttling us, so the request is worth
+# trying again after a pause.
+retry_statuses = (429, 500, 502, 503, 504)
+
+# The errors on which a request is tried again, such as timeouts and refused connections.
+retry_errors = (OSError, http.client.HTTPException)
+
+# Headers that describe the encoding on the wire. They no longer apply once the body has been
+# decoded, so they are not kept with cached responses.
+transfer_headers = ("content-encoding", "content-length", "transfer-encoding", "connection")
+
+class HttpResponse:
+    """
+    A downloaded page. The body has already been read and decoded.
+    """
+    def __init__(self, url, status, headers, body, from_cache=False):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.from_cache = from_cache
+
+class HttpError(Exception):
+    """
+    Raised when a server answers with an error status.
+    """
+    def __init__(self, url, status, reason, headers=None):
+        Exception.__init__(self, "HTTP %d %s: %s" % (status, reason, url))
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+
+def decode_body(body, encoding):
+    """
+    Undoes the gzip or deflate content encoding of a response body.
+    """
+    encoding = (encoding or "").strip().lower()
+    if encoding in ("gzip", "x-gzip"):
+        return gzip.decompress(body)
+    if encoding == "deflate":
+        # Servers disagree on whether deflate means a zlib stream or a raw one.
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
+
+class StreamDecoder:
+    """
+    Undoes the gzip or deflate content encoding of a response body that arrives in pieces.
+    """
+    def __init__(self, encoding):
+        encoding = (encoding or "").strip().lower()
+        self.raw_fallback = False
+        if encoding in ("gzip", "x-gzip"):
+            self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == "deflate":
+            self.decompressor = zlib.decompressobj()
+            self.raw_fallback = True
+        else:
+            self.decompressor = None
+
+    def decode(self, data):
+        if self.decompressor is None:
+            return data
+        try:
+            decoded = self.decompressor.decompress(data)
+        except zlib.error:
+            if not self.raw_fallback:
+                raise
+            # The first piece had no zlib header, so this is a raw deflate stream.
+            self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            decoded = self.decompressor.decompress(data)
+        self.raw_fallback = False
+        return decoded
+
+    def flush(self):
+        if self.decompressor is None:
+            return b""
+        return self.decompressor.flush()
+
+def make_headers(pairs):
+    """
+    Builds a header object, like the one on a live response, from a list of (name, value) pairs.
+    """
+    headers = http.client.HTTPMessage()
+    for name, value in pairs:
+        headers[name] = value
+    return headers
+
+def get_retry_after(headers):
+    """
+    Gets the number of seconds a Retry-After header asks for, given as a number of seconds
+    or as a date, or None if there isn't one.
+    """
+    value = headers.get("Retry-After") if headers is not None else None
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+def cached_response(entry):
+    return HttpResponse(entry.final_url, 200, make_headers(entry.headers), entry.body, from_cache=True)
+
+class HttpClient:
+    """
+    An HTTP client that keeps connections alive and reuses them for later requests to the
+    same host, so a crawl only pays for the TCP and TLS handshakes once per connection.
+    It is safe to share between threads; each thread takes its own connection from the pool.
+    If a cache (see response_cache.ResponseCache) is given, responses are served from it
+    while they are fresh, and revalidated with the server once they are stale.
+
+    Requests to a host in resolve, a dict of host (with port, if any) to address, are sent
+    over plain HTTP to that address instead, with the original Host header, so a local
+    stand-in server can answer for a real site (as the benchmarks do).
+
+    Requests that time out, can't connect, or get a status in retry_statuses are tried again
+    up to max_retries times, after an exponential backoff with full jitter (a random wait of
+    up to backoff_base * 2 ** attempt seconds, at most max_backoff), or after the wait the
+    server asks for with Retry-After (at most max_retry_after). If limits (a
+    rate_limit.HostLimits) are given, the requests to each host are limited by its
+    rate_limit.HostLimiter, which adapts to how the host responds.
+
+    If a crawl_metrics.CrawlMetrics is given, the requests retried are counted in it.
+    """
+    def __init__(self, timeout=30, max_idle_per_host=8, max_redirects=10,
+                 user_agent="Mozilla/5.0 (compatible; nrl-scraper)", cache=None, metrics=None,
+                 limits=None, max_retries=5, backoff_base=0.5, max_backoff=60, max_retry_after=300):
+        self.cache = cache
+        self.metrics = metrics
+        self.limits = limits
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self.max_redirects = max_redirects
+        self.user_agent = user_agent
+        self.resolve = {}
+        self.idle_connections = {}
+        self.lock = threading.Lock()
+
+    def get_connection(self, scheme, netloc):
+        """
+        Takes an idle connection to the given host from the pool, or opens a new one.
+        Returns the connection and whether it was reused.
+        """
+        key = (scheme, netloc)
+        with self.lock:
+            idle = self.idle_connections.get(key)
+            if idle:
+                return idle.pop(), True
+        if netloc in self.resolve:
+            conn = http.client.HTTPConnection(self.resolve[netloc], timeout=self.timeout)
+        elif scheme == "https":
+            conn = http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        else:
+            conn = http.client.HTTPConnection(netloc, timeout=self.timeout)
+        return conn, False
+
+    def release_connection(self, scheme, netloc, conn):
+        """
+        Returns a connection to the pool so the next request to the host can reuse it.
+        """
+        key = (scheme, netloc)
+        with self.lock:
+            idle = self.idle_connections.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def open_response(self, parts, headers):
+        """
+        Sends a GET request for the given split URL and waits for the response headers.
+        Returns the connection and the response, whose body hasn't been read yet.
+        """
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        request_headers = {
+            "User-Agent": self.user_agent,
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        }
+        if parts.netloc in self.resolve:
+            request_headers["Host"] = parts.netloc
+        if headers:
+            request_headers.update(headers)
+
+        while True:
+            conn, reused = self.get_connection(parts.scheme, parts.netloc)
+            try:
+                conn.request("GET", path, headers=request_headers)
+                response = conn.getresponse()
+            except stale_connection_errors:
+                conn.close()
+                if reused:
+                    # The server dropped the idle connection. Try again on a fresh one.
+                    if self.metrics is not None:
+                        self.metrics.increment("retries", host=parts.netloc)
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+            return conn, response
+
+    def finish_response(self, parts, conn, response):
+        """
+        Returns the connection of a fully read response to the pool, unless the server is
+        closing it.
+        """
+        if response.will_close:
+            conn.close()
+        else:
+            self.release_connection(parts.scheme, parts.netloc, conn)
+
+    def get_limiter(self, netloc):
+        if self.limits is None:
+            return None
+        return self.limits.get(netloc)
+
+    def count_retry(self, netloc):
+        if self.metrics is not None:
+            self.metrics.increment("retries", host=netloc)
+
+    def get_retry_delay(self, attempt, headers=None):
+        """
+        Gets how long to wait before trying a request again, for the given attempt (0 for
+        the first retry).
+        """
+        retry_after = get_retry_after(headers)
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return random.uniform(0, min(self.max_backoff, self.backoff_base * 2 ** attempt))
+
+    def wait_to_retry(self, netloc, attempt, headers=None):
+        delay = self.get_retry_delay(attempt, headers)
+        limiter = self.get_limiter(netloc)
+        if limiter is not None and get_retry_after(headers) is not None:
+            # The host asked for a pause, so hold back the other requests to it too.
+            limiter.pause(delay)
+        self.count_retry(netloc)
+        time.sleep(delay)
+
+    def request_once(self, url, headers):
+        """
+        Makes a single GET request, without following redirects, within the limits of the
+        host.
+        """
+        parts = urlsplit(url)
+        limiter = self.get_limiter(parts.netloc)
+        if limiter is not None:
+            limiter.acquire()
+        start = time.perf_counter()
+        throttled = True
+        try:
+            conn, response = self.open_response(parts, headers)
+            try:
+                body = response.read()
+            except Exception:
+                conn.close()
+                raise
+            self.finish_response(parts, conn, response)
+            throttled = response.status in retry_statuses
+        finally:
+            if limiter is not None:
+                limiter.release(time.perf_counter() - start, throttled)
+
+        body = decode_body(body, response.getheader("Content-Encoding"))
+        return HttpResponse(url, response.status, response.msg, body), response.reason
+
+    def request(self, url, headers):
+        """
+        Makes a GET request, without following redirects, trying again after errors and
+        statuses in retry_statuses (see HttpClient).
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                response, reason = self.request_once(url, headers)
+            except retry_errors:
+                if attempt == self.max_retries:
+                    raise
+                self.wait_to_retry(urlsplit(url).netloc, attempt)
+                continue
+            if response.status not in retry_statuses or attempt == self.max_retries:
+                return response, reason
+            self.wait_to_retry(urlsplit(url).netloc, attempt, response.headers)
+
+    def fetch(self, url, headers=None):
+        """
+        Downloads the given URL, following redirects. Raises HttpError for error statuses.
+        """
+        for i in range(self.max_redirects + 1):
+            response, reason = self.request(url, headers)
+            if response.status in redirect_statuses and response.headers.get("Location"):
+                url = urljoin(url, response.headers["Location"])
+                continue
+            if response.status >= 400:
+                raise HttpError(url, response.status, reason, response.headers)
+            return response
+        raise HttpError(url, response.status, "Too many redirects", response.headers)
+
+    def get(self, url, headers=None):
+        """
+        Gets the given URL, from the cache if there is a fresh copy and otherwise from the
+        server. Stale cached copies are revalidated with If-None-Match and If-Modified-Since.
+        """
+        cache = self.cache
+        if cache is None or headers:
+            return self.fetch(url, headers)
+
+        entry = cache.get(url)
+        if entry is None:
+            response = self.fetch(url)
+        elif entry.is_fresh():
+            return cached_response(entry)
+        else:
+            conditions = {}
+            if entry.etag:
+                conditions["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                conditions["If-Modified-Since"] = entry.last_modified
+            response = self.fetch(entry.final_url, conditions)
+            if response.status == 304:
+                cache.touch(url)
+                return cached_response(entry)
+
+        if response.status == 200:
+            pairs = [(name, value) for name, value in response.headers.items()
+                     if name.lower() not in transfer_headers]
+            cache.put(url, response.url, pairs, response.body)
+        return response
+
+    def stream(self, url, chunk_size=64 * 1024, headers=None):
+        """
+        Downloads the given URL, following redirects, and yields the decoded body in pieces as
+        it arrives, so the whole page never has to be held in memory. The cache isn't used.
+        Requests are retried as fetch retries them, until the body starts to arrive.
+        """
+        attempt = 0
+        redirects = 0
+        while True:
+            parts = urlsplit(url)
+            limiter = self.get_limiter(parts.netloc)
+            if limiter is not None:
+                limiter.acquire()
+            start = time.perf_counter()
+            try:
+                conn, response = self.open_response(parts, headers)
+            except retry_errors:
+                if limiter is not None:
+                    limiter.release(time.perf_counter() - start, True)
+                if attempt == self.max_retries:
+                    raise
+                self.wait_to_retry(parts.netloc, attempt)
+                attempt += 1
+                continue
+            # The time to the headers is what the limiter goes by, since the body arrives as
+            # fast as the caller takes it.
+            latency = time.perf_counter() - start
+
+            redirect = response.status in redirect_statuses and response.getheader("Location")
+            if redirect or response.status >= 400:
+                response.read()
+                self.finish_response(parts, conn, response)
+                if limiter is not None:
+                    limiter.release(latency, response.status in retry_statuses)
+                if response.status in retry_statuses and attempt < self.max_retries:
+                    self.wait_to_retry(parts.netloc, attempt, response.msg)
+                    attempt += 1
+                    continue
+                if redirect:
+                    redirects += 1
+                    if redirects > self.max_redirects:
+                        raise HttpError(url, response.status, "Too many redirects", response.msg)
+                    url = urljoin(url, response.getheader("Location"))
+                    continue
+                if response.status >= 400:
+                    raise HttpError(url, response.status, response.reason, response.msg)
+
+            decoder = StreamDecoder(response.getheader("Content-Encoding"))
+            finished = False
+            try:
+                while True:
+                    data = response.read(chunk_size)
+                    if not data:
+                        break
+                    data = decoder.decode(data)
+                    if data:
+                        yield data
+                data = decoder.flush()
+                if data:
+                    yield data
+                finished = True
+            finally:
+                if finished:
+                    self.finish_response(parts, conn, response)
+                else:
+                    # The caller stopped early, so the rest of the body is still on the wire.
+                    conn.close()
+                if limiter is not None:
+                    limiter.release(latency)
+            return
+
+    def close(self):
+        """
+        Closes all the idle connections in the pool.
+        """
+        with self.lock:
+            for idle in self.idle_connections.values():
+                for conn in idle:
+                    conn.close()
+            self.idle_connections = {}
+
+# The client shared by all of the fetchers in scraper.py.
+default_client = HttpClient(metrics=default_metrics, limits=HostLimits())
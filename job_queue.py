@@ -0,0 +1,235 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+# A job claimed from the queue. payload is the dict given when the job was added, and
+# attempts counts this claim.
+Job = namedtuple('Job', ['id', 'kind', 'url', 'payload', 'attempts', 'worker'])
+
+schema = [
+    "CREATE TABLE IF NOT EXISTS jobs ("
+    " id INTEGER PRIMARY KEY, kind TEXT, url TEXT UNIQUE, payload TEXT,"
+    " status TEXT, attempts INTEGER, worker TEXT, lease_expires REAL,"
+    " error TEXT, added REAL, finished REAL)",
+
+    "CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, lease_expires)",
+
+    "CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value REAL)",
+]
+
+# The settings of a queue that hasn't been given any.
+default_settings = {
+    "lease_seconds" : 300,
+    "max_attempts" : 5,
+}
+
+def make_worker_id():
+    """
+    Makes an ID for a worker that is unique across the hosts sharing a queue.
+    """
+    return "%s:%d:%d" % (socket.gethostname(), os.getpid(), threading.get_ident())
+
+class JobQueue:
+    """
+    A durable queue of crawl jobs (such as the match and box score pages to extract) in an
+    SQLite database, so that many worker processes, on one host or on several sharing a
+    filesystem, can work through a crawl together without any other service.
+
+    Each URL is queued only once. A worker claims a job under a lease of lease_seconds, and
+    must renew it with heartbeat while it works on the job. If the worker dies, the lease
+    runs out and the job is claimed again by another worker. A job that fails is tried
+    again, up to max_attempts times in all, after which it is marked as failed. Jobs that
+    finish are marked as done, with the time they finished.
+
+    The lease and the number of attempts are stored with the queue when they are given, so
+    that the workers, which open the queue without them, all keep to the same ones.
+
+    The database uses SQLite's default rollback journal rather than WAL, since WAL doesn't
+    work when the file is shared between hosts.
+    """
+    def __init__(self, path, lease_seconds=None, max_attempts=None):
+        self.path = os.path.abspath(path)
+        self.lock = threading.Lock()
+        # Transactions are begun explicitly, so that a claim holds the write lock from the
+        # moment it looks for a job until it has taken it.
+        self.db = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+        for statement in schema:
+            self.db.execute(statement)
+
+        given = {"lease_seconds" : lease_seconds, "max_attempts" : max_attempts}
+        for name, value in given.items():
+            if value is not None:
+                self.db.execute("INSERT OR REPLACE INTO settings VALUES (?, ?)", (name, value))
+        settings = dict(default_settings)
+        settings.update(self.db.execute("SELECT name, value FROM settings").fetchall())
+        self.lease_seconds = settings["lease_seconds"]
+        self.max_attempts = int(settings["max_attempts"])
+
+    def transaction(self):
+        """
+        Begins a transaction that takes the database's write lock at once. Must be called
+        with self.lock held.
+        """
+        self.db.execute("BEGIN IMMEDIATE")
+
+    def add(self, kind, url, payload=None):
+        """
+        Queues a job of the given kind for a URL, unless the URL has been queued before.
+        Returns whether it was queued.
+        """
+        return self.add_many(kind, [(url, payload)]) == 1
+
+    def add_many(self, kind, jobs):
+        """
+        Queues jobs of the given kind, given as (url, payload) pairs, in one transaction,
+        skipping the URLs that have been queued before. Returns how many were queued.
+        """
+        now = time.time()
+        with self.lock:
+            self.transaction()
+            try:
+                added = 0
+                for url, payload in jobs:
+                    cursor = self.db.execute(
+                        "INSERT OR IGNORE INTO jobs (kind, url, payload, status, attempts, added)"
+                        " VALUES (?, ?, ?, 'pending', 0, ?)", (kind, url, json.dumps(payload), now))
+                    added += cursor.rowcount
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return added
+
+    def claim(self, worker, kinds=None):
+        """
+        Claims the oldest job that is waiting, or whose lease has run out, for the given
+        worker. Only jobs of the given kinds are claimed, if any are given. Returns the Job,
+        or None if there are none to claim.
+        """
+        now = time.time()
+        query = ("SELECT id, kind, url, payload, attempts FROM jobs"
+                 " WHERE (status = 'pending' OR (status = 'leased' AND lease_expires < ?))")
+        params = [now]
+        if kinds is not None:
+            query += " AND kind IN (" + ", ".join("?" * len(kinds)) + ")"
+            params.extend(kinds)
+        query += " ORDER BY id LIMIT 1"
+
+        with self.lock:
+            self.transaction()
+            try:
+                while True:
+                    row = self.db.execute(query, params).fetchone()
+                    if row is None:
+                        self.db.execute("COMMIT")
+                        return None
+                    job_id, kind, url, payload, attempts = row
+                    if attempts < self.max_attempts:
+                        break
+                    # The last worker to claim it died on its final attempt.
+                    self.db.execute("UPDATE jobs SET status = 'failed', worker = NULL, lease_expires = NULL,"
+                                    " error = 'lease expired' WHERE id = ?", (job_id,))
+                self.db.execute("UPDATE jobs SET status = 'leased', attempts = ?, worker = ?, lease_expires = ?"
+                                " WHERE id = ?", (attempts + 1, worker, now + self.lease_seconds, job_id))
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return Job(job_id, kind, url, json.loads(payload), attempts + 1, worker)
+
+    def update_leased(self, job, assignments, params):
+        """
+        Updates a job that the given claim still holds. Returns False if the lease has been
+        lost to another worker.
+        """
+        with self.lock:
+            cursor = self.db.execute(
+                "UPDATE jobs SET " + assignments + " WHERE id = ? AND status = 'leased' AND worker = ?",
+                list(params) + [job.id, job.worker])
+        return cursor.rowcount == 1
+
+    def heartbeat(self, job):
+        """
+        Renews the lease on a job. Returns False if the lease has been lost, in which case
+        the worker should give the job up.
+        """
+        return self.update_leased(job, "lease_expires = ?", [time.time() + self.lease_seconds])
+
+    def complete(self, job):
+        """
+        Marks a job as done.
+        """
+        return self.update_leased(job, "status = 'done', lease_expires = NULL, error = NULL, finished = ?",
+                                  [time.time()])
+
+    def fail(self, job, error):
+        """
+        Gives up a job after an error, leaving it to be tried again unless it has used all
+        of its attempts.
+        """
+        status = "pending"
+        if job.attempts >= self.max_attempts:
+            status = "failed"
+        return self.update_leased(job, "status = ?, worker = NULL, lease_expires = NULL, error = ?",
+                                  [status, str(error)])
+
+    def counts(self):
+        """
+        Gets the number of jobs in each status ("pending", "leased", "done" and "failed").
+        """
+        counts = {"pending" : 0, "leased" : 0, "done" : 0, "failed" : 0}
+        with self.lock:
+            for status, count in self.db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+                counts[status] = count
+        return counts
+
+    def is_finished(self):
+        """
+        Whether every job is done or has failed.
+        """
+        counts = self.counts()
+        return counts["pending"] == 0 and counts["leased"] == 0
+
+    def failed_jobs(self):
+        """
+        Gets the URLs of the jobs that failed, with their last errors.
+        """
+        with self.lock:
+            return self.db.execute("SELECT url, error FROM jobs WHERE status = 'failed' ORDER BY id").fetchall()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+class LeaseKeeper:
+    """
+    Renews the lease on a job from a background thread while the job runs. Use as a context
+    manager around the work. lost is set if the lease was lost to another worker.
+    """
+    def __init__(self, queue, job, interval=None):
+        self.queue = queue
+        self.job = job
+        if interval is None:
+            interval = queue.lease_seconds / 3.0
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.lost = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            if not self.queue.heartbeat(self.job):
+                self.lost = True
+                return
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stopped.set()
+        self.thread.join()
@@ -0,0 +1,242 @@
+import glob
+import hashlib
+import logging
+import os
+import pickle
+import re
+
+try:
+    import numpy
+    import pandas
+except ImportError:
+    # pandas is only needed to load the match dataset.
+    numpy = None
+    pandas = None
+
+from team_names import normalise_team_name
+
+logger = logging.getLogger(__name__)
+
+# Where the scraped tables and the betting data are kept.
+default_data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sportsbetting_data")
+
+# The files read from the data directory: the match and team tables written from the
+# scraped seasons, the results and odds from aussportsbetting.com (nrl_<date>.csv, which
+# has a line of headings above the column names), and the results without odds
+# (scores_<date>.csv).
+match_table_name = "season-match-data-table.csv"
+team_table_name = "season-team-data-table.csv"
+odds_pattern = "nrl_[0-9]*.csv"
+scores_pattern = "scores_*.csv"
+
+# Bumped whenever the loader changes what it makes, so that older cached datasets are
+# made again.
+cache_version = 1
+
+# The compound cells of the team table, each of which holds several stats, such as
+# "14 (318m) | 0 | 2", with the pattern of the cell and the columns its parts go to. The
+# scraped table repeats the whole cell in each of the columns.
+compound_columns = [
+    (r"^\s*(\d+)\s*\((\d+)m\)\s*\|\s*(\d+)\s*\|\s*(\d+)\s*$",
+     ["kicks", "kicks_metres", "forty_twenty_kicks", "line_dropouts"]),
+    (r"^\s*(\d+)\s*\|\s*(\d+)\s*\|\s*(\d+)\s*\|\s*(\d+)\s*$",
+     ["play_the_balls_total", "play_the_balls_slow", "play_the_balls_neutral", "play_the_balls_fast"]),
+    (r"^\s*(\d+)%\s*\|\s*(\d+)\s*\|\s*(\d+)\s*\|\s*(\d+)%\s*$",
+     ["possession_percent", "used_plays", "unused_plays", "possession_efficiency_percent"]),
+]
+
+# The columns of the team table that aren't stats.
+team_key_columns = ["date", "time", "round", "period", "team"]
+
+def require_pandas():
+    if pandas is None:
+        raise ImportError("pandas is needed to load the match dataset (pip install pandas)")
+
+def make_column_name(name):
+    """
+    Makes a column name such as "Home Odds Close" or "Play Off Game?" into home_odds_close
+    or play_off_game.
+    """
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+def normalise_team_column(column):
+    """
+    Normalises the team names in a column, looking up each distinct name only once.
+    """
+    names = column.unique()
+    return column.map(dict(zip(names, [normalise_team_name(name) for name in names])))
+
+def to_numeric_columns(frame, columns):
+    for column in columns:
+        values = frame[column]
+        if values.dtype == object or pandas.api.types.is_string_dtype(values):
+            values = values.str.strip()
+        frame[column] = pandas.to_numeric(values, errors="coerce")
+
+def read_match_table(path):
+    """
+    Reads the scraped match table, with one row for each match, naming the first team the
+    home team.
+    """
+    require_pandas()
+    frame = pandas.read_csv(path, index_col=0, dtype=str, keep_default_na=False)
+    frame = frame.rename(columns={"team_1" : "home", "team_2" : "away",
+                                  "team_score_1" : "home_score", "team_score_2" : "away_score"})
+    frame["date"] = pandas.to_datetime(frame["date"], format="%Y-%m-%d")
+    frame["home"] = normalise_team_column(frame["home"])
+    frame["away"] = normalise_team_column(frame["away"])
+    to_numeric_columns(frame, ["round", "home_score", "away_score", "crowd"])
+    return frame.reset_index(drop=True)
+
+def read_team_table(path):
+    """
+    Reads the scraped team table, with a row of stats for each team in each period of each
+    match, splitting its compound cells into their stats.
+    """
+    require_pandas()
+    frame = pandas.read_csv(path, index_col=0, dtype=str, keep_default_na=False)
+    frame["date"] = pandas.to_datetime(frame["date"], format="%Y-%m-%d")
+    frame["team"] = normalise_team_column(frame["team"])
+    for pattern, columns in compound_columns:
+        parts = frame[columns[0]].str.extract(pattern)
+        for part_num, column in enumerate(columns):
+            # Cells that aren't compound already hold the one stat.
+            frame[column] = parts[part_num].fillna(frame[column])
+    stat_columns = [column for column in frame.columns if column not in team_key_columns]
+    to_numeric_columns(frame, stat_columns + ["round"])
+    return frame.reset_index(drop=True)
+
+def read_betting_table(path, skip_rows=0):
+    """
+    Reads a table of results, with or without odds, from the betting data.
+    """
+    require_pandas()
+    frame = pandas.read_csv(path, skiprows=skip_rows, dtype=str, keep_default_na=False, encoding="latin-1")
+    frame = frame.rename(columns=make_column_name)
+    frame = frame.rename(columns={"home_team" : "home", "away_team" : "away"})
+    frame = frame.loc[frame["date"].str.strip() != ""]
+    frame["date"] = pandas.to_datetime(frame["date"].str.strip(), format="%d-%b-%y")
+    frame["home"] = normalise_team_column(frame["home"])
+    frame["away"] = normalise_team_column(frame["away"])
+    for column in ["play_off_game", "over_time"]:
+        if column in frame.columns:
+            frame[column] = frame[column].str.strip().str.upper() == "Y"
+    text_columns = ["date", "kick_off_local", "home", "away", "play_off_game", "over_time", "notes"]
+    to_numeric_columns(frame, [column for column in frame.columns if column not in text_columns])
+    return frame.reset_index(drop=True)
+
+def read_odds(data_dir):
+    """
+    Reads the results and odds of every match in the betting data, one row per match. A
+    match in more than one file is taken from the one that sorts last, which is the latest;
+    the files of results without odds only fill in the matches the odds files don't have.
+    """
+    tables = [read_betting_table(path, skip_rows=1)
+              for path in sorted(glob.glob(os.path.join(data_dir, odds_pattern)), reverse=True)]
+    tables += [read_betting_table(path)
+               for path in sorted(glob.glob(os.path.join(data_dir, scores_pattern)), reverse=True)]
+    if len(tables) == 0:
+        return None
+    odds = pandas.concat(tables, ignore_index=True)
+    return odds.drop_duplicates(["date", "home", "away"], keep="first").reset_index(drop=True)
+
+def join_team_stats(matches, teams, period="match"):
+    """
+    Adds the stats of each team for the given period of each match, as home_<stat> and
+    away_<stat> columns.
+    """
+    stats = teams.loc[teams["period"] == period].drop(columns=["time", "round", "period"])
+    stats = stats.drop_duplicates(["date", "team"])
+    for side in ["home", "away"]:
+        side_stats = stats.rename(columns=lambda column: column if column in ("date", "team") else side + "_" + column)
+        side_stats = side_stats.rename(columns={"team" : side})
+        # The scores are already in the match table.
+        side_stats = side_stats.drop(columns=[side + "_score"], errors="ignore")
+        matches = matches.merge(side_stats, on=["date", side], how="left")
+    return matches
+
+def join_matches(matches, teams, odds):
+    """
+    Joins the scraped matches with their team stats, and with their results and odds in
+    the betting data, on the date and the home and away teams. Every scraped match is kept,
+    with missing values where the betting data doesn't have it. The columns from the
+    betting data are prefixed with "betting_".
+    """
+    dataset = join_team_stats(matches, teams)
+    if odds is not None:
+        odds = odds.rename(columns=lambda column: column if column in ("date", "home", "away") else "betting_" + column)
+        dataset = dataset.merge(odds, on=["date", "home", "away"], how="left")
+    return dataset.sort_values(["date", "home"], kind="stable").reset_index(drop=True)
+
+def get_input_paths(data_dir):
+    paths = [os.path.join(data_dir, match_table_name), os.path.join(data_dir, team_table_name)]
+    paths += sorted(glob.glob(os.path.join(data_dir, odds_pattern)))
+    paths += sorted(glob.glob(os.path.join(data_dir, scores_pattern)))
+    return paths
+
+def hash_inputs(paths):
+    """
+    Hashes the contents of the input files, along with their names and the cache version,
+    into the key that a cached dataset is valid for.
+    """
+    digest = hashlib.sha256(("match_loader %d\n" % cache_version).encode("utf-8"))
+    for path in paths:
+        with open(path, 'rb') as f:
+            file_digest = hashlib.sha256(f.read()).hexdigest()
+        digest.update(("%s %s\n" % (os.path.basename(path), file_digest)).encode("utf-8"))
+    return digest.hexdigest()
+
+def read_cached_dataset(cache_path, key):
+    """
+    Reads the dataset cached at the given path, or returns None if there isn't one, or it
+    was made from different inputs.
+    """
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'rb') as f:
+            # The key is pickled first, so that a stale dataset isn't read at all.
+            if pickle.load(f) != key:
+                return None
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError) as e:
+        logger.warning("Couldn't read the cached dataset %s: %s", cache_path, e)
+        return None
+
+def write_cached_dataset(cache_path, key, dataset):
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(key, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(dataset, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+
+def load_match_dataset(data_dir=default_data_dir, cache_path=None):
+    """
+    Loads the scraped matches joined with their team stats and their betting odds, as a
+    pandas DataFrame with one row per match (see join_matches), with every team named as
+    team_names.normalise_team_name names it.
+
+    The dataset is cached in match_dataset.pkl in the data directory (or at cache_path),
+    keyed by the hashes of the files it was made from, so that it is only made again when
+    one of them changes.
+    """
+    require_pandas()
+    if cache_path is None:
+        cache_path = os.path.join(data_dir, "match_dataset.pkl")
+    key = hash_inputs(get_input_paths(data_dir))
+    dataset = read_cached_dataset(cache_path, key)
+    if dataset is not None:
+        return dataset
+
+    logger.info("Making the match dataset from %s", data_dir)
+    matches = read_match_table(os.path.join(data_dir, match_table_name))
+    teams = read_team_table(os.path.join(data_dir, team_table_name))
+    dataset = join_matches(matches, teams, read_odds(data_dir))
+    write_cached_dataset(cache_path, key, dataset)
+    return dataset
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    dataset = load_match_dataset()
+    print(dataset.shape)
+    print("Matches with odds:", int(dataset["betting_home_odds"].notna().sum()))
@@ -0,0 +1,184 @@
+import datetime
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import threading
+import uuid
+
+from http_client import HttpResponse, make_headers, transfer_headers
+
+revisit_profile = "http://netpreserve.org/warc/1.0/revisit/identical-payload-digest"
+
+def make_http_header_block(response):
+    """
+    Forms the status line and headers of a response, as they would be sent by the server for
+    the decoded body. The headers that described the encoding on the wire are replaced.
+    """
+    lines = ["HTTP/1.1 %d %s" % (response.status, http.client.responses.get(response.status, ""))]
+    for name, value in response.headers.items():
+        if name.lower() not in transfer_headers:
+            lines.append(name + ": " + value)
+    lines.append("Content-Length: " + str(len(response.body)))
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8", "surrogateescape")
+
+def make_warc_record(headers, block):
+    """
+    Forms a WARC record from its headers, a list of (name, value) pairs, and its block.
+    """
+    lines = ["WARC/1.0"]
+    for name, value in headers:
+        lines.append(name + ": " + value)
+    lines.append("Content-Length: " + str(len(block)))
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8") + block + b"\r\n\r\n"
+
+def parse_warc_record(data):
+    """
+    Splits a WARC record into a dict of its headers and its block.
+    """
+    head, rest = data.split(b"\r\n\r\n", 1)
+    headers = {}
+    for line in head.decode("utf-8").split("\r\n")[1:]:
+        name, value = line.split(":", 1)
+        headers[name.strip()] = value.strip()
+    return headers, rest[:int(headers["Content-Length"])]
+
+def parse_http_block(block):
+    """
+    Splits the block of a response record into the status, headers and body.
+    """
+    head, body = block.split(b"\r\n\r\n", 1)
+    lines = head.decode("utf-8", "surrogateescape").split("\r\n")
+    status = int(lines[0].split(" ")[1])
+    pairs = []
+    for line in lines[1:]:
+        name, value = line.split(":", 1)
+        pairs.append((name.strip(), value.strip()))
+    return status, make_headers(pairs), body
+
+class PageArchive:
+    """
+    A compressed archive of the raw pages downloaded for a season, in the WARC format. Each
+    record is a separate gzip member, so the file can be read with standard WARC tools and
+    any one record can be read on its own. The bodies are stored exactly as they were
+    decoded, with their status and headers.
+
+    Pages are deduplicated. A page that is already archived under its URL with the same
+    content isn't added again, and a page whose content is archived under another URL is
+    added as a small revisit record that refers to the earlier one.
+
+    An index of the records, with their offsets, is kept next to the archive in a file with
+    .idx appended to its name, one JSON object per line.
+    """
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.index_path = self.path + ".idx"
+        self.lock = threading.Lock()
+        self.records = []
+        self.latest = {}
+        self.by_digest = {}
+
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as index_file:
+                for line in index_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # The last line was cut short by an interrupted run.
+                        break
+                    self.index_record(record)
+
+        # Drop anything after the last indexed record, left by an interrupted write.
+        end = 0
+        if len(self.records) > 0:
+            end = self.records[-1]["offset"] + self.records[-1]["length"]
+        if os.path.exists(self.path) and os.path.getsize(self.path) > end:
+            with open(self.path, 'r+b') as archive_file:
+                archive_file.truncate(end)
+        with open(self.index_path, 'w') as index_file:
+            for record in self.records:
+                index_file.write(json.dumps(record) + "\n")
+
+    def index_record(self, record):
+        self.records.append(record)
+        self.latest[record["url"]] = record
+        if record["type"] == "response":
+            self.by_digest.setdefault(record["digest"], record)
+
+    def add(self, response, url=None):
+        """
+        Adds a downloaded page (an http_client.HttpResponse) to the archive. If the page was
+        asked for at another URL (url) and redirected, it is also archived under that URL,
+        as a revisit record, so that it can be found by the URL that was asked for.
+        """
+        digest = "sha256:" + hashlib.sha256(response.body).hexdigest()
+        with self.lock:
+            self.add_record(response.url, response, digest)
+            if url is not None and url != response.url:
+                self.add_record(url, response, digest)
+
+    def add_record(self, url, response, digest):
+        latest = self.latest.get(url)
+        if latest is not None and latest["digest"] == digest:
+            return
+
+        headers = [
+            ("WARC-Record-ID", "<urn:uuid:" + str(uuid.uuid4()) + ">"),
+            ("WARC-Date", datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")),
+            ("WARC-Target-URI", url),
+            ("WARC-Payload-Digest", digest),
+        ]
+        original = self.by_digest.get(digest)
+        if original is None:
+            record_type = "response"
+            block = make_http_header_block(response) + response.body
+        else:
+            record_type = "revisit"
+            headers.append(("WARC-Profile", revisit_profile))
+            headers.append(("WARC-Refers-To-Target-URI", original["url"]))
+            block = make_http_header_block(response)
+        headers.insert(0, ("WARC-Type", record_type))
+        headers.append(("Content-Type", "application/http; msgtype=response"))
+
+        data = gzip.compress(make_warc_record(headers, block))
+        with open(self.path, 'ab') as archive_file:
+            offset = archive_file.tell()
+            archive_file.write(data)
+        record = {"url" : url, "type" : record_type, "digest" : digest,
+                  "offset" : offset, "length" : len(data)}
+        with open(self.index_path, 'a') as index_file:
+            index_file.write(json.dumps(record) + "\n")
+        self.index_record(record)
+
+    def read_record(self, record):
+        with open(self.path, 'rb') as archive_file:
+            archive_file.seek(record["offset"])
+            data = gzip.decompress(archive_file.read(record["length"]))
+        return parse_warc_record(data)
+
+    def get(self, url):
+        """
+        Gets the latest archived copy of the page at the given URL as an
+        http_client.HttpResponse, or None if it isn't archived.
+        """
+        with self.lock:
+            record = self.latest.get(url)
+            original = None
+            if record is not None and record["type"] == "revisit":
+                original = self.by_digest[record["digest"]]
+        if record is None:
+            return None
+
+        warc_headers, block = self.read_record(record)
+        status, headers, body = parse_http_block(block)
+        if original is not None:
+            body = parse_http_block(self.read_record(original)[1])[2]
+        return HttpResponse(url, status, headers, body, from_cache=True)
+
+    def urls(self):
+        """
+        Gets the URLs of the archived pages, in the order they were first archived.
+        """
+        with self.lock:
+            return list(dict.fromkeys(record["url"] for record in self.records))
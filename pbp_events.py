@@ -0,0 +1,85 @@
+import logging
+import re
+
+from records import PbpEvent
+from table_extract import get_raw_cell_text
+
+logger = logging.getLogger(__name__)
+
+# The columns of the CSV files of events, in the order of PbpEvent.
+pbp_event_columns = list(PbpEvent._fields)
+
+# The game clock of an event, such as "11:45.0".
+pbp_clock_re = re.compile(r"^(\d+):(\d+(?:\.\d+)?)$")
+
+# The heading that starts a period, such as "2nd Quarter" or "1st Overtime" ("1st OT").
+pbp_period_re = re.compile(r"^(\d+)(?:st|nd|rd|th)\s+(quarter|q|overtime|ot)\b", re.IGNORECASE)
+
+# The score after an event, such as "12-10".
+pbp_score_re = re.compile(r"^(\d+)-(\d+)$")
+
+def parse_pbp_clock(text):
+    """
+    Gets the seconds left in the period from a game clock such as "11:45.0", or None if it
+    isn't one.
+    """
+    match = pbp_clock_re.match(text)
+    if match is None:
+        return None
+    return int(match.group(1)) * 60 + float(match.group(2))
+
+def parse_pbp_period(text):
+    """
+    Gets the number of the period that a heading such as "2nd Quarter" starts, counting the
+    overtimes on from 5, or None if it isn't one.
+    """
+    match = pbp_period_re.match(text)
+    if match is None:
+        return None
+    number = int(match.group(1))
+    if match.group(2).lower() in ("overtime", "ot"):
+        return 4 + number
+    return number
+
+def parse_pbp_points(text):
+    return int(text.lstrip("+")) if text.lstrip("+").isdigit() else 0
+
+def iter_pbp_row_events(game, rows):
+    """
+    Yields the events of a play-by-play table as PbpEvents, given its rows of cells one at
+    a time, such as from html_stream as the page is parsed, so no more than a row is held.
+    An event row has the clock, the first team's event, its points, the score, the second
+    team's points and the second team's event, or the clock and an event that spans the
+    rest of the row. The headings of the periods and the rows naming the teams set the
+    period and teams of the events after them, and other rows are skipped.
+    """
+    period = 1
+    teams = (None, None)
+    score = (0, 0)
+    for cells in rows:
+        values = [get_raw_cell_text(cell) for cell in cells]
+        if len(values) == 0:
+            continue
+        if len(values) == 1:
+            period = parse_pbp_period(values[0]) or period
+            continue
+        if values[0] == "Time" and len(values) == 6:
+            teams = (values[1], values[5])
+            continue
+        clock = parse_pbp_clock(values[0])
+        if clock is None:
+            logger.debug("Skipped play-by-play row %s", values)
+            continue
+        if len(values) == 2:
+            yield PbpEvent(game, period, clock, None, 0, score[0], score[1], values[1])
+        elif len(values) == 6:
+            match = pbp_score_re.match(values[3])
+            if match is not None:
+                score = (int(match.group(1)), int(match.group(2)))
+            if values[1] != "":
+                team, points, text = teams[0], parse_pbp_points(values[2]), values[1]
+            else:
+                team, points, text = teams[1], parse_pbp_points(values[4]), values[5]
+            yield PbpEvent(game, period, clock, team, points, score[0], score[1], text)
+        else:
+            logger.debug("Skipped play-by-play row %s", values)
@@ -0,0 +1,173 @@
+import collections
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Marks the end of the items put on a queue by a stage.
+end_of_stage = object()
+
+class PipelineStopped(Exception):
+    """
+    Raised inside a stage when another stage has failed, so that it stops waiting.
+    """
+    pass
+
+def map_window(executor, function, items, window):
+    """
+    Calls function on each item in the executor, as executor.map does, yielding the results
+    in order. Only window calls are submitted ahead of the result being yielded, so that a
+    slow consumer holds back the calls rather than letting their results pile up. The calls
+    not yet started are cancelled if the consumer stops early.
+    """
+    in_flight = collections.deque()
+    try:
+        for item in items:
+            if len(in_flight) >= window:
+                yield in_flight.popleft().result()
+            in_flight.append(executor.submit(function, item))
+        while len(in_flight) > 0:
+            yield in_flight.popleft().result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+def run_pipeline(items, fetch, parse, write, fetchers=4, parsers=None, queue_size=8, batch_size=8):
+    """
+    Runs each item through three stages that work at the same time, connected by bounded
+    queues:
+
+    - fetch(item) is called by a pool of fetchers threads, and returns the page of the item.
+    - parse(item, page) is called in a pool of parsers processes (by default, one for each
+      core), and returns whatever is to be written. It must be a module-level function, and
+      its arguments and result must be picklable.
+    - write(batch) is called in this thread with a list of up to batch_size
+      (item, parsed) pairs.
+
+    When a stage falls behind, the queue in front of it fills up and the stages before it
+    wait, so only about queue_size pages are held between any two stages, and the pipeline
+    runs at the speed of its slowest stage. The items are written in the order they are
+    given. If any stage raises an exception, the pipeline stops and it is raised here.
+    """
+    items = list(items)
+    todo = queue.Queue()
+    for item_num, item in enumerate(items):
+        todo.put((item_num, item))
+    fetched = queue.Queue(queue_size)
+    parsed = queue.Queue(queue_size)
+    failures = []
+    stopped = threading.Event()
+
+    # Limits the pages that have been fetched but not yet handed to the parsers, so that a
+    # slow page holds back the fetchers rather than letting them run ahead without limit.
+    fetch_window = threading.Semaphore(queue_size + fetchers)
+
+    def put(target, entry):
+        while True:
+            if stopped.is_set():
+                raise PipelineStopped()
+            try:
+                target.put(entry, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def get(source):
+        while True:
+            if stopped.is_set():
+                raise PipelineStopped()
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+    def fail(e):
+        if not isinstance(e, PipelineStopped):
+            failures.append(e)
+        stopped.set()
+
+    def run_fetcher():
+        try:
+            while True:
+                while not fetch_window.acquire(timeout=0.1):
+                    if stopped.is_set():
+                        raise PipelineStopped()
+                try:
+                    item_num, item = todo.get_nowait()
+                except queue.Empty:
+                    break
+                put(fetched, (item_num, item, fetch(item)))
+            put(fetched, end_of_stage)
+        except Exception as e:
+            fail(e)
+
+    # The fetched pages arrive in any order. They are parsed in the order they were given,
+    # so that they are written in that order.
+    def run_parsers():
+        try:
+            with ProcessPoolExecutor(max_workers=parsers) as executor:
+                waiting = {}
+                in_flight = collections.deque()
+                next_num = 0
+                fetchers_done = 0
+                while next_num < len(items):
+                    while next_num in waiting and len(in_flight) < queue_size:
+                        item, page = waiting.pop(next_num)
+                        in_flight.append((item, executor.submit(parse, item, page)))
+                        fetch_window.release()
+                        next_num += 1
+
+                    # Hand on the parses that are done, or the oldest one if the pool is full.
+                    while len(in_flight) > 0 and (in_flight[0][1].done() or len(in_flight) >= queue_size):
+                        item, future = in_flight.popleft()
+                        put(parsed, (item, future.result()))
+
+                    if next_num in waiting or next_num == len(items):
+                        continue
+                    if fetchers_done == fetchers:
+                        raise PipelineStopped()
+                    if stopped.is_set():
+                        raise PipelineStopped()
+                    try:
+                        entry = fetched.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    if entry is end_of_stage:
+                        fetchers_done += 1
+                    else:
+                        waiting[entry[0]] = entry[1:]
+
+                while len(in_flight) > 0:
+                    item, future = in_flight.popleft()
+                    put(parsed, (item, future.result()))
+            put(parsed, end_of_stage)
+        except Exception as e:
+            fail(e)
+
+    threads = [threading.Thread(target=run_fetcher) for i in range(fetchers)]
+    threads.append(threading.Thread(target=run_parsers))
+    for thread in threads:
+        thread.start()
+
+    try:
+        batch = []
+        while True:
+            entry = get(parsed)
+            if entry is end_of_stage:
+                break
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                write(batch)
+                batch = []
+        if len(batch) > 0:
+            write(batch)
+    except PipelineStopped:
+        pass
+    except Exception as e:
+        fail(e)
+    finally:
+        stopped.set()
+        for thread in threads:
+            thread.join()
+
+    if len(failures) > 0:
+        raise failures[0]
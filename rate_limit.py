@@ -0,0 +1,163 @@
+import collections
+import threading
+import time
+
+class TokenBucket:
+    """
+    Lets requests through at an average of rate per second, with bursts of up to burst
+    requests. A rate of None lets everything through.
+    """
+    def __init__(self, rate=None, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        if self.rate is not None:
+            self.tokens = min(float(self.burst), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now):
+        """
+        Takes a token if there is one. Returns how long to wait for the next one otherwise.
+        """
+        self.refill(now)
+        if self.rate is None:
+            return 0.0
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class HostLimiter:
+    """
+    Limits the requests to one host, adapting to what the host will take.
+
+    The number of requests in flight is limited to limit, which grows by one for each round
+    of requests that succeed quickly (additive increase), up to max_concurrency. It is cut
+    by a fraction when responses slow down to more than latency_factor times the host's
+    usual latency, and halved when the host throttles or fails (multiplicative decrease).
+
+    The rate of requests isn't limited until the host first throttles or fails. From then
+    on, requests are spaced by a token bucket, whose rate starts at half the rate the host
+    was being sent and grows back slowly while requests succeed, up to max_rate. When the
+    host asks for a pause with Retry-After, no requests are sent to it until it is over.
+    """
+    def __init__(self, max_concurrency=4, min_concurrency=1, max_rate=50.0, min_rate=0.2,
+                 latency_factor=3.0):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.latency_factor = latency_factor
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.bucket = TokenBucket()
+        self.paused_until = 0.0
+        # The usual latency, which follows drops at once and rises slowly, and a smoothed
+        # recent latency to compare with it.
+        self.usual_latency = None
+        self.recent_latency = None
+        self.last_decrease = 0.0
+        self.recent_starts = collections.deque()
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Waits until a request may be sent to the host.
+        """
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    self.condition.wait(self.paused_until - now)
+                    continue
+                if self.in_flight >= max(int(self.limit), self.min_concurrency):
+                    self.condition.wait()
+                    continue
+                wait = self.bucket.take(now)
+                if wait > 0:
+                    self.condition.wait(wait)
+                    continue
+                self.in_flight += 1
+                self.recent_starts.append(now)
+                while self.recent_starts[0] < now - 10:
+                    self.recent_starts.popleft()
+                return
+
+    def get_recent_rate(self, now):
+        if len(self.recent_starts) < 2:
+            return self.min_rate
+        return len(self.recent_starts) / max(now - self.recent_starts[0], 1.0)
+
+    def decrease(self, now, factor):
+        # Decrease at most once per round trip, so that the requests already in flight when
+        # the host became slow don't cut the limit many times over.
+        if self.recent_latency is not None and now - self.last_decrease < self.recent_latency:
+            return
+        self.last_decrease = now
+        self.limit = max(float(self.min_concurrency), self.limit * factor)
+
+    def release(self, latency, throttled=False):
+        """
+        Records the end of a request that took latency seconds, and whether the host
+        throttled it or failed.
+        """
+        with self.condition:
+            now = time.monotonic()
+            self.in_flight -= 1
+            if throttled:
+                self.decrease(now, 0.5)
+                if self.bucket.rate is None:
+                    self.bucket.rate = self.get_recent_rate(now)
+                self.bucket.rate = max(self.min_rate, self.bucket.rate * 0.5)
+                self.bucket.tokens = min(self.bucket.tokens, 1.0)
+            else:
+                if self.usual_latency is None or latency < self.usual_latency:
+                    self.usual_latency = latency
+                else:
+                    self.usual_latency += (latency - self.usual_latency) * 0.01
+                if self.recent_latency is None:
+                    self.recent_latency = latency
+                else:
+                    self.recent_latency += (latency - self.recent_latency) * 0.2
+
+                if self.recent_latency > self.latency_factor * self.usual_latency:
+                    self.decrease(now, 0.9)
+                else:
+                    self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+                    if self.bucket.rate is not None:
+                        self.bucket.rate = min(self.max_rate, self.bucket.rate + 1.0 / self.bucket.rate)
+            self.condition.notify_all()
+
+    def pause(self, seconds):
+        """
+        Sends nothing more to the host for the given number of seconds.
+        """
+        with self.condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def get_state(self):
+        """
+        Gets the current limits, for logging.
+        """
+        with self.condition:
+            return {"limit" : self.limit, "in_flight" : self.in_flight, "rate" : self.bucket.rate,
+                    "usual_latency" : self.usual_latency, "recent_latency" : self.recent_latency}
+
+class HostLimits:
+    """
+    The HostLimiter of each host, made as they are first needed with the given settings.
+    """
+    def __init__(self, **settings):
+        self.settings = settings
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def get(self, host):
+        with self.lock:
+            limiter = self.limiters.get(host)
+            if limiter is None:
+                limiter = self.limiters[host] = HostLimiter(**self.settings)
+            return limiter
@@ -0,0 +1,35 @@
+from collections import namedtuple
+
+# The records returned by the extraction functions in scraper.py. None of the functions
+# that produce them change the working directory or write files, so they can be used as a
+# library and called from many threads at once. The CSV writers in scraper.py, the columnar
+# output of season_dataset and the database of stats_store are the ways of storing them.
+
+# A match listed on a season page. date is a datetime.date, teams holds the two team names
+# (see team_names.normalise_team_name), and name is the match's key, such as 20150306_Wests_Parramatta.
+NrlstatsMatch = namedtuple('NrlstatsMatch', ['year', 'round', 'date', 'teams', 'url', 'name', 'score', 'status'])
+
+# A table from a match page. kind is "player", "team", "game" or "scorecard", and period is
+# "total", "first_half" or "second_half" (None for the scorecard). Each row is a list of
+# (tag name, strings, colspan, rowspan) cells, as html_parsers.get_row_cells returns them.
+NrlstatsTable = namedtuple('NrlstatsTable', ['match', 'id', 'kind', 'period', 'category', 'rows'])
+
+# One player's stats from a player stats table. stats maps each column heading to its value.
+NrlstatsPlayerStats = namedtuple('NrlstatsPlayerStats', ['match', 'period', 'category', 'team', 'player', 'stats'])
+
+# One stat from a team or game stats table, with the values for the two teams.
+NrlstatsTeamStat = namedtuple('NrlstatsTeamStat', ['match', 'kind', 'period', 'stat', 'values'])
+
+# One row of the scorecard.
+NrlstatsScorecardRow = namedtuple('NrlstatsScorecardRow', ['match', 'values'])
+
+# A stats table from a basketball-reference box score or play-by-play page.
+StatsTable = namedtuple('StatsTable', ['url', 'id', 'rows'])
+
+# An event from a basketball-reference play-by-play table. period is 1 to 4 for the
+# quarters and 5 on for the overtimes, and clock is the seconds left in the period. team is
+# the team whose column the event is in (None for events such as the start of a period,
+# which span the columns), and points are the points it scored. score_1 and score_2 are the
+# scores after the event of the teams in the table's first and second team columns, which
+# are the visitors and the home team.
+PbpEvent = namedtuple('PbpEvent', ['game', 'period', 'clock', 'team', 'points', 'score_1', 'score_2', 'text'])
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+# How long a cached response stays fresh, by host. The longest matching host suffix wins.
+# None means the response never changes, so it is never fetched again (Wayback captures are
+# immutable). Zero means the response is always revalidated with the server before use.
+cache_policies = {
+    "archive.org" : None,
+    "live.nrlstats.com" : 0,
+    "basketball-reference.com" : 7 * 24 * 60 * 60,
+}
+
+# The freshness lifetime of hosts that have no policy.
+default_ttl = 24 * 60 * 60
+
+def get_cache_ttl(url):
+    """
+    Gets the freshness lifetime, in seconds, of a cached response from the given URL.
+    """
+    host = urlsplit(url).hostname or ""
+    best = None
+    for suffix in cache_policies.keys():
+        if host == suffix or host.endswith("." + suffix):
+            if best is None or len(suffix) > len(best):
+                best = suffix
+    if best is None:
+        return default_ttl
+    return cache_policies[best]
+
+class CacheEntry:
+    """
+    A response read back from the cache.
+    """
+    def __init__(self, url, final_url, headers, body, etag, last_modified, fetched_at):
+        self.url = url
+        self.final_url = final_url
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+    def is_fresh(self, now=None):
+        ttl = get_cache_ttl(self.url)
+        if ttl is None:
+            return True
+        if now is None:
+            now = time.time()
+        return now - self.fetched_at < ttl
+
+class ResponseCache:
+    """
+    An on-disk cache of HTTP responses. Bodies are stored once per distinct content, under
+    their SHA-256 hash, and an SQLite index maps each URL to its body and validators. When
+    the bodies take more than max_bytes, the least recently used entries are evicted.
+    """
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        self.db = sqlite3.connect(os.path.join(self.cache_dir, "index.sqlite3"), check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " url TEXT PRIMARY KEY, final_url TEXT, body_hash TEXT, size INTEGER,"
+            " headers TEXT, etag TEXT, last_modified TEXT,"
+            " fetched_at REAL, accessed_at REAL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_body ON entries (body_hash)")
+        self.db.commit()
+
+    def body_path(self, body_hash):
+        return os.path.join(self.cache_dir, body_hash[:2], body_hash)
+
+    def get(self, url):
+        """
+        Gets the cached response for the given URL, or None if there isn't one.
+        """
+        with self.lock:
+            row = self.db.execute(
+                "SELECT final_url, body_hash, headers, etag, last_modified, fetched_at"
+                " FROM entries WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            final_url, body_hash, headers, etag, last_modified, fetched_at = row
+            try:
+                with open(self.body_path(body_hash), 'rb') as body_file:
+                    body = body_file.read()
+            except FileNotFoundError:
+                # The body was removed from under us. Forget the entry.
+                self.db.execute("DELETE FROM entries WHERE url = ?", (url,))
+                self.db.commit()
+                return None
+            self.db.execute("UPDATE entries SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            self.db.commit()
+        return CacheEntry(url, final_url, json.loads(headers), body, etag, last_modified, fetched_at)
+
+    def put(self, url, final_url, headers, body):
+        """
+        Stores a response. Headers is a list of (name, value) pairs.
+        """
+        body_hash = hashlib.sha256(body).hexdigest()
+        path = self.body_path(body_hash)
+        if not os.path.exists(path):
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + ".%d.%d.tmp" % (os.getpid(), threading.get_ident())
+            with open(tmp_path, 'wb') as body_file:
+                body_file.write(body)
+            os.replace(tmp_path, path)
+
+        header_map = dict((name.lower(), value) for name, value in headers)
+        now = time.time()
+        with self.lock:
+            old = self.db.execute("SELECT body_hash FROM entries WHERE url = ?", (url,)).fetchone()
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, final_url, body_hash, len(body), json.dumps(headers),
+                 header_map.get("etag"), header_map.get("last-modified"), now, now))
+            self.db.commit()
+            if old is not None and old[0] != body_hash:
+                self.remove_body_if_unused(old[0])
+            self.evict()
+
+    def touch(self, url):
+        """
+        Marks a cached response as fresh again, after the server said it hasn't changed.
+        """
+        now = time.time()
+        with self.lock:
+            self.db.execute("UPDATE entries SET fetched_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+            self.db.commit()
+
+    def remove_body_if_unused(self, body_hash):
+        in_use = self.db.execute("SELECT 1 FROM entries WHERE body_hash = ? LIMIT 1", (body_hash,)).fetchone()
+        if in_use is None:
+            try:
+                os.remove(self.body_path(body_hash))
+            except FileNotFoundError:
+                pass
+
+    def total_bytes(self):
+        """
+        Gets the size of the distinct bodies in the cache.
+        """
+        row = self.db.execute(
+            "SELECT SUM(size) FROM (SELECT DISTINCT body_hash, size FROM entries)").fetchone()
+        return row[0] or 0
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits in max_bytes.
+        Must be called with the lock held.
+        """
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        rows = self.db.execute("SELECT url, body_hash, size FROM entries ORDER BY accessed_at").fetchall()
+        for url, body_hash, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.db.execute("DELETE FROM entries WHERE url = ?", (url,))
+            in_use = self.db.execute("SELECT 1 FROM entries WHERE body_hash = ? LIMIT 1", (body_hash,)).fetchone()
+            if in_use is None:
+                total -= size
+                try:
+                    os.remove(self.body_path(body_hash))
+                except FileNotFoundError:
+                    pass
+        self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
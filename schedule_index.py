@@ -0,0 +1,164 @@
+import calendar
+import datetime
+import json
+import os
+import re
+from urllib.parse import parse_qs, urlsplit
+
+from bs4 import SoupStrainer
+
+from html_parsers import default_parser
+
+basketball_reference_url = "http://www.basketball-reference.com"
+
+month_names = ["january", "february", "march", "april", "may", "june", "july", "august",
+               "september", "october", "november", "december"]
+
+# The links to the month pages of a season's schedule, such as /leagues/NBA_2013_games-may.html.
+schedule_month_link_re = re.compile(r"/leagues/NBA_(\d+)_games-([a-z]+)\.html$")
+
+def nba_season(date):
+    """
+    Gets the NBA season that a date falls in, named by the year it ends, as the site names
+    them. Seasons start in October, so the months from August on count towards the next one.
+    """
+    if date.month >= 8:
+        return date.year + 1
+    return date.year
+
+def schedule_month_year(season, month):
+    """
+    Gets the calendar year of a month of the given season.
+    """
+    if month >= 8:
+        return season - 1
+    return season
+
+def form_schedule_url(season, month=None):
+    """
+    Forms the URL of the schedule of a season, or of one month of it.
+    """
+    url = basketball_reference_url + "/leagues/NBA_" + str(season) + "_games"
+    if month is not None:
+        url += "-" + month_names[month - 1]
+    return url + ".html"
+
+def get_schedule_row_date(cell):
+    """
+    Gets the date of a game from the date cell of its schedule row, using its sort key
+    (such as "201305140"), the daily index page it links to, or else its text (such as
+    "Tue, May 14, 2013").
+    """
+    csk = cell.get("csk", "")
+    if len(csk) >= 8 and csk[:8].isdigit():
+        return datetime.date(int(csk[:4]), int(csk[4:6]), int(csk[6:8]))
+    link = cell.find("a", href=True)
+    if link is not None:
+        query = parse_qs(urlsplit(link["href"]).query)
+        if "year" in query and "month" in query and "day" in query:
+            return datetime.date(int(query["year"][0]), int(query["month"][0]), int(query["day"][0]))
+    return datetime.datetime.strptime(cell.get_text().strip(), "%a, %b %d, %Y").date()
+
+def parse_schedule_page(html):
+    """
+    Parses a schedule page of basketball-reference. Returns the games listed on it, as
+    (date, box score URL) pairs where the URL is None for a game that hasn't been played,
+    and the numbers of the months of the season that the page links to.
+    """
+    soup = default_parser.make_soup(html, SoupStrainer(["table", "a"]))
+
+    months = []
+    for link in soup.find_all("a", href=schedule_month_link_re):
+        month_name = schedule_month_link_re.search(link["href"]).group(2)
+        if month_name in month_names and month_names.index(month_name) + 1 not in months:
+            months.append(month_names.index(month_name) + 1)
+
+    games = []
+    table = soup.find("table", id="schedule")
+    if table is None:
+        return games, months
+    for row in table.find_all("tr"):
+        # Skip the heading rows, including the one that starts the playoffs.
+        if "thead" in (row.get("class") or []) or row.find("td") is None:
+            continue
+        cell = row.find(["th", "td"], attrs={"data-stat" : "date_game"})
+        if cell is None:
+            cell = row.find(["th", "td"])
+        link = row.find("a", string="Box Score")
+        box_score_url = None
+        if link is not None:
+            box_score_url = basketball_reference_url + link["href"]
+        games.append((get_schedule_row_date(cell), box_score_url))
+    return games, months
+
+class ScheduleIndex:
+    """
+    A local index of the games played on each date, built from the season schedule pages of
+    basketball-reference and kept as JSON at the given path, so that a range of dates can
+    be extracted by fetching only the box scores of the days that had games.
+
+    A month is final once it has passed and all of its games have box scores. Final months
+    are never fetched again, while the others are fetched again whenever they are needed.
+    """
+    def __init__(self, path):
+        self.path = path
+        # The months linked from each season's schedule, by season.
+        self.seasons = {}
+        # Whether each month ("2013-05") is final.
+        self.months = {}
+        # The box score URLs of the games on each date ("2013-05-14").
+        self.games = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                index = json.load(f)
+            self.seasons = index["seasons"]
+            self.months = index["months"]
+            self.games = index["games"]
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps({"seasons" : self.seasons, "months" : self.months, "games" : self.games},
+                               indent=1, sort_keys=True))
+        os.replace(tmp_path, self.path)
+
+    def get_season_months(self, season):
+        """
+        Gets the months of the given season, or None if its schedule hasn't been read.
+        """
+        return self.seasons.get(str(season))
+
+    def set_season_months(self, season, months):
+        self.seasons[str(season)] = list(months)
+
+    def is_final(self, year, month):
+        return self.months.get("%04d-%02d" % (year, month), False)
+
+    def add_month(self, year, month, games):
+        """
+        Replaces the games of a month with those read from its schedule page, given as
+        (date, box score URL) pairs.
+        """
+        prefix = "%04d-%02d" % (year, month)
+        for date in [date for date in self.games if date.startswith(prefix)]:
+            del self.games[date]
+        complete = True
+        for date, box_score_url in games:
+            if box_score_url is None:
+                complete = False
+                continue
+            self.games.setdefault(date.isoformat(), []).append(box_score_url)
+        last_day = datetime.date(year, month, calendar.monthrange(year, month)[1])
+        self.months[prefix] = complete and last_day < datetime.date.today()
+
+    def get_game_days(self, start_date, end_date):
+        """
+        Gets the days between the given dates (inclusive) that had games, as (date, box
+        score URLs) pairs in date order.
+        """
+        days = []
+        for date in sorted(self.games):
+            day = datetime.date.fromisoformat(date)
+            if start_date <= day <= end_date:
+                days.append((day, list(self.games[date])))
+        return days
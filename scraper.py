@@ -1,20 +1,34 @@
-from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
 #import urllib
-from urllib.request import urlopen
+from urllib.parse import urlparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import datetime
+import hashlib
+import json
+import logging
 import os
+import time
 
-# Map for the team names that we don't support.
-nrl_team_map = {
-    "Canterbury-Bankstown" : "CanterburyBankstown",
-    "Gold Coast" : "GoldCoast",
-    "North Queensland" : "NorthQueensland",
-    "South Sydney" : "SouthSydney",
-    "St George Illawarra" : "StGeorgeIllawarra",
-    "Sydney Roosters" : "Sydney",
-    "Warriors" : "NewZealand",
-    "Wests Tigers" : "Wests"
-}
+from crawl_metrics import default_metrics
+from html_parsers import default_parser, get_table_rows
+from html_stream import find_element_spans, guess_charset, iter_chunks, iter_table_rows
+from http_client import default_client
+from job_queue import JobQueue, LeaseKeeper, make_worker_id
+from page_archive import PageArchive
+from pbp_events import iter_pbp_row_events, pbp_event_columns
+from pipeline import map_window, run_pipeline
+from records import NrlstatsMatch, NrlstatsTable, NrlstatsPlayerStats, NrlstatsTeamStat, NrlstatsScorecardRow, StatsTable
+from response_cache import ResponseCache
+from schedule_index import ScheduleIndex, form_schedule_url, nba_season, parse_schedule_page, schedule_month_year
+from season_dataset import SeasonDataset
+from stats_store import get_box_score_game
+from table_deltas import DeltaStream, diff_rows
+from table_extract import get_cell_text, get_raw_cell_text, get_table_values, write_csv_rows
+from team_names import normalise_team_name
+from team_ratings import results_from_nrlstats_matches
+from wayback import parse_cdx_response, parse_wayback_url
+
+logger = logging.getLogger(__name__)
 
 # Mapping between month name and number.
 month_map = {
@@ -32,131 +46,377 @@ month_map = {
     "dec" : 12
 }
 
+def fetch_url(url, archive=None):
+    """
+    Downloads the given URL and returns the page contents. All requests go through the
+    shared keep-alive client, which limits the requests to each host, adapting to how fast
+    the host responds and whether it throttles, and retries failed requests with backoff
+    (see http_client.HttpClient), so this can be called from many threads. Its timeout can
+    be changed with default_client.timeout. If a page_archive.PageArchive is given, the
+    response is added to it, under the URL asked for as well as the one it was redirected
+    to, so that it can be replayed by either. The time taken, the size of the page and whether it came from
+    the cache are recorded in default_metrics, by host.
+    """
+    host = urlparse(url).netloc
+    with default_metrics.timer("fetch", host=host):
+        response = default_client.get(url)
+    default_metrics.increment("pages_fetched", host=host)
+    default_metrics.increment("fetch_bytes", len(response.body), host=host)
+    if response.from_cache:
+        default_metrics.increment("cache_hits", host=host)
+    if archive is not None:
+        archive.add(response, url)
+    return response.body
+
+def stream_url(url):
+    """
+    Downloads the given URL, yielding the page in pieces as they arrive. Like fetch_url, it
+    keeps to the limits of the host, and records its metrics. The time recorded is only the
+    time spent waiting for the pieces, not the time the caller spends on them.
+    """
+    host = urlparse(url).netloc
+    seconds = 0.0
+    size = 0
+    try:
+        start = time.perf_counter()
+        for chunk in default_client.stream(url):
+            seconds += time.perf_counter() - start
+            size += len(chunk)
+            yield chunk
+            start = time.perf_counter()
+        seconds += time.perf_counter() - start
+    finally:
+        default_metrics.observe("fetch", seconds, host=host)
+        default_metrics.increment("pages_fetched", host=host)
+        default_metrics.increment("fetch_bytes", size, host=host)
+
+class AtomicFile:
+    """
+    A file that is written under a temporary name and only renamed to its real name when it
+    is closed, so an interrupted run never leaves a truncated file that looks complete.
+    """
+    def __init__(self, name, mode='w'):
+        self.name = name
+        self.tmp_name = name + ".tmp"
+        self.file = open(self.tmp_name, mode)
+
+    def write(self, data):
+        return self.file.write(data)
+
+    def close(self):
+        self.file.close()
+        os.replace(self.tmp_name, self.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.file.close()
+            os.remove(self.tmp_name)
+
+def open_atomic(name, mode='w'):
+    return AtomicFile(name, mode)
+
+def hash_file(path):
+    """
+    Gets the SHA-256 hash of the contents of the given file.
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+class SeasonManifest:
+    """
+    Records which matches of a season have been extracted, and the hashes of the files that
+    were written for each, so that a restarted crawl can skip the matches that are done.
+    """
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.matches = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.matches = json.load(f)
+
+    def save(self):
+        with open_atomic(self.path) as f:
+            f.write(json.dumps(self.matches, indent=1, sort_keys=True))
+
+    def is_complete(self, match_name, match_dir):
+        """
+        Checks that the match was completed, and that its files are still as they were written.
+        """
+        entry = self.matches.get(match_name)
+        if entry is None or entry["state"] != "complete":
+            return False
+        for name, file_hash in entry["files"].items():
+            path = os.path.join(match_dir, name)
+            if not os.path.exists(path) or hash_file(path) != file_hash:
+                return False
+        return True
+
+    def mark_started(self, match_name, url, save=True):
+        self.matches[match_name] = {"url" : url, "state" : "partial", "files" : {}}
+        if save:
+            self.save()
+
+    def mark_complete(self, match_name, match_dir, save=True):
+        files = {}
+        for name in sorted(os.listdir(match_dir)):
+            if name.endswith(".tmp"):
+                continue
+            files[name] = hash_file(os.path.join(match_dir, name))
+        self.matches[match_name]["state"] = "complete"
+        self.matches[match_name]["files"] = files
+        if save:
+            self.save()
+
+def iter_streamed_tables(events):
+    """
+    Gathers the row events of html_stream.iter_table_rows into whole tables, yielding the
+    key and rows of each table as soon as it ends. Only one table is held at a time.
+    """
+    rows = []
+    for event in events:
+        if event[0] == "row":
+            rows.append(event[2])
+        else:
+            yield event[1], rows
+            rows = []
+
+def find_stats_table(tag, attrs):
+    """
+    Selects the tables with the stats_table class and an ID, for html_stream.
+    """
+    if tag == "table" and "stats_table" in attrs.get("class", "").split() and attrs.get("id"):
+        return attrs["id"]
+    return None
+
+def iter_stats_tables(url, html=None, streaming=False):
+    """
+    Yields the stats tables, with their IDs, of a basketball-reference page. If the page
+    has already been downloaded, it can be given as html. In streaming mode, the page is
+    parsed as it downloads and only one table is held in memory at a time.
+    """
+    if streaming:
+        if html is None:
+            chunks = stream_url(url)
+        else:
+            chunks = iter_chunks(html)
+        for id, rows in iter_streamed_tables(iter_table_rows(chunks, find_stats_table)):
+            yield StatsTable(url, id, rows)
+        return
+
+    #f = urllib2.urlopen(url)
+    if html is None:
+        html = fetch_url(url)
+    with default_metrics.timer("parse", page="stats"):
+        tables = default_parser.get_tables(html, "table", find_stats_table)
+    for id, rows in tables:
+        logger.debug("Table %s", id)
+        yield StatsTable(url, id, rows)
+
+def find_pbp_table(tag, attrs):
+    """
+    Selects the stats tables of a play-by-play page. The play-by-play table itself has no
+    ID, and is given the ID "PBP".
+    """
+    if tag == "table" and "stats_table" in attrs.get("class", "").split():
+        return attrs.get("id") or "PBP"
+    return None
+
+def iter_pbp_tables(url, html=None):
+    """
+    Yields the tables of a basketball-reference play-by-play page, skipping the first three.
+    The play-by-play table itself has no ID, and is given the ID "PBP".
+    """
+    #f = urllib2.urlopen(url)
+    if html is None:
+        html = fetch_url(url)
+
+    # The page has quarter headings that open with <th> and close with </td>. Every parser
+    # in html_parsers closes the heading cell at the end of its row, so the tags no longer
+    # need to be rewritten first.
+    with default_metrics.timer("parse", page="pbp"):
+        tables = default_parser.get_tables(html, "table", find_pbp_table)
+    for id, rows in tables[3:]:
+        logger.debug("Table %s", id)
+        yield StatsTable(url, id, rows)
+
+def stats_table_row_values(cells):
+    """
+    Gets the values of a row of a stats table.
+    """
+    return [get_raw_cell_text(cell) for cell in cells]
+
+def stats_table_type(id):
+    """
+    Gets the type of a basketball-reference stats table from its ID, leaving out the team
+    that IDs such as "SAS_basic" start with.
+    """
+    team, sep, table_type = id.partition("_")
+    if sep and team.isupper():
+        return table_type
+    return id
+
+def write_table_csv(path, rows, row_values, table_type=None):
+    """
+    Writes the rows of a table to the CSV file at the given path, getting the values of
+    each row with row_values (see table_extract.get_table_values). The time taken and the
+    rows written are recorded in default_metrics under the table type, which is by default
+    the name of the file.
+    """
+    if table_type is None:
+        table_type = os.path.splitext(os.path.basename(path))[0]
+    with default_metrics.timer("write", table=table_type):
+        values = get_table_values(rows, row_values)
+        with open_atomic(path, 'w') as file:
+            write_csv_rows(file, values)
+    default_metrics.increment("rows_written", len(values), table=table_type)
+
 """
-Outputs the given soup table to a CSV file in the current working directory with the given name.
+Outputs the given soup table to a CSV file with the given name (which may include a directory).
 """
 def output_table_to_csv(table, name):
-    csv_file = open(name + ".csv", 'w')    
-
-    rows = table.find_all("tr")
-    print(len(rows))
-    #print table
-    for row in rows:
-        csv_str = ""
-        cells = row.find_all(["th", "td"])
-        for cell in cells:
-            # Get the colspan of the cell. If there isn't one specified, it is 0.
-            colspan = 1
-            try:
-                colspan = int(cell["colspan"])
-            except:
-                pass
-            
-            # Get the value of the cell.
-            cell_value = " "
-            if cell.string != None:
-                print(cell.get_text())
-                try:
-                    cell_value = str(cell.get_text())#string)
-                except:
-                    # This happens when the cell contains other HTML, such as links on the play-by-play pages.
-                    # Will need to recursively convert these to text.
-                    cell_value = "XXX"
-                    
-            cell_value = cell.get_text()
-            csv_str += cell_value + ", "
-            
-            # Output empty cells for the colspan.
-            #print colspan
-            for i in range(1, colspan):
-                csv_str += ", "
-            
-        csv_file.write(csv_str + "\n")
-    csv_file.close()
+    write_table_csv(name + ".csv", get_table_rows(table), stats_table_row_values)
+
+def write_stats_tables_csv(tables, out_dir):
+    """
+    Writes each of the given stats tables to a CSV file, named after its ID, in out_dir.
+    """
+    for table in tables:
+        write_table_csv(os.path.join(out_dir, table.id + ".csv"), table.rows, stats_table_row_values,
+                        stats_table_type(table.id))
 
-    
 """
-Extracts the data from the tables in the given URL, writing it to CSV files.
+Extracts the data from the tables in the given URL, writing it to CSV files in out_dir
+(by default, the current working directory). If the page has already been downloaded, it
+can be given as html, and nothing is fetched. See iter_stats_tables for streaming mode.
 """
-def extract_data_from_url(url):
-    #f = urllib2.urlopen(url)
-    f = urlopen(url)
-    html = f.read()
-    f.close()
-    soup = BeautifulSoup(html)
-    #print(soup.prettify())
-    #print soup.original_encoding
-
-    tables = soup.find_all("table", {"class" : "stats_table"})
-    for table in tables:
-        # Get the table ID, and skip over those that don't have one.
-        id = "None"
-        cls = "None"
-        try:
-            id = table["id"]
-            cls = table["class"]
-        except:
-            continue
-        print(id, cls)
-    
-        output_table_to_csv(table, id)
-        
-        
+def extract_data_from_url(url, streaming=False, out_dir=None, html=None):
+    if out_dir is None:
+        out_dir = os.getcwd()
+    write_stats_tables_csv(iter_stats_tables(url, html, streaming), out_dir)
+
+
 """
-Extracts the data from the tables in the given URL, writing it to CSV files.
+Extracts the data from the tables in the given URL, writing it to CSV files in out_dir
+(by default, the current working directory). If the page has already been downloaded, it
+can be given as html, and nothing is fetched.
 """
-def extract_pbp_data_from_url(url):
-    #f = urllib2.urlopen(url)
-    f = urlopen(url)
-    html = f.read()
-    
-    html = html.replace("<th", "<td")
-    html = html.replace("</th", "</td")
-    
-    # Replace all th tags with td, to avoid a mismatched tag in the page.
-    #html_new = ""#file("new_html")
-    #for line in html:
-    #    new_line = line.replace("<th", "<td")
-    #    new_line = new_line.replace("</th", "</td")
-    #    print new_line
-    #    html_new += new_line
-    
-    f.close()
-    soup = BeautifulSoup(html)
-    #print(soup.prettify())
-    #print soup.original_encoding
-
-    tables = soup.find_all("table", {"class" : "stats_table"})
-    for table in tables[3:]:
-        # Get the table ID, and skip over those that don't have one.
-        id = "None"
-        cls = "None"
-        try:
-            id = table["id"]
-        except:
-            # The table that doesn't have an ID is the play-by-play one.
-            id = "PBP"
-        print(id)
-    
-        output_table_to_csv(table, id)
-        
+def extract_pbp_data_from_url(url, out_dir=None, html=None):
+    if out_dir is None:
+        out_dir = os.getcwd()
+    write_stats_tables_csv(iter_pbp_tables(url, html), out_dir)
+
+def form_pbp_url(box_score_url):
+    """
+    Forms the URL of the play-by-play page of a game from the URL of its box score.
+    """
+    base, sep, name = box_score_url.rpartition("/")
+    return base + "/pbp/" + name
+
+def iter_pbp_events(url, html=None, archive=None):
+    """
+    Yields the events of a basketball-reference play-by-play page as records.PbpEvents (see
+    pbp_events.iter_pbp_row_events). The page is parsed as it downloads, or from html if it
+    has already been downloaded, and each event is yielded as soon as its row has been
+    read, so only one row is held in memory at a time. If a page_archive.PageArchive is
+    given, the page is downloaded whole first, so that it can be added to the archive.
+    """
+    if html is None and archive is not None:
+        html = fetch_url(url, archive)
+    if html is None:
+        chunks = stream_url(url)
+    else:
+        chunks = iter_chunks(html)
+    rows = (event[2] for event in iter_table_rows(chunks, find_pbp_table) if event[0] == "row" and event[1] == "PBP")
+    count = 0
+    for event in iter_pbp_row_events(get_box_score_game(url), rows):
+        count += 1
+        yield event
+    default_metrics.increment("pbp_events", count)
+
+def iter_pbp_events_range(start_date, end_date, archive=None, discover=False, index_path=None):
+    """
+    Yields the play-by-play events of the games played between the given dates, inclusive,
+    a game at a time, finding the games as extract_box_scores_range does. Each page is only
+    fetched once the events before it have been taken, so the events of a whole season can
+    be consumed, such as by write_pbp_events_csv, in constant memory. If a
+    page_archive.PageArchive is given, every page fetched is kept in it, so that the events
+    can be replayed with iter_archived_pbp_events.
+    """
+    for date, box_score_links in iter_box_score_days(start_date, end_date, None, archive, discover, index_path):
+        if box_score_links is None:
+            box_score_links = get_box_score_links(form_date_url(date), archive=archive)
+        logger.info("%s: %d games", date, len(box_score_links))
+        for box_score_link in box_score_links:
+            for event in iter_pbp_events(form_pbp_url(box_score_link), archive=archive):
+                yield event
+
+def iter_archived_pbp_events(start_date, end_date, archive, discover=False, index_path=None):
+    """
+    Yields the play-by-play events of the games between the given dates again from the
+    pages kept in the given page_archive.PageArchive by iter_pbp_events_range, without
+    downloading anything. The games are listed as replay_box_scores lists them.
+    """
+    for date, box_score_links in get_archived_box_score_days(start_date, end_date, archive, discover,
+                                                              index_path):
+        for box_score_link in box_score_links:
+            url = form_pbp_url(box_score_link)
+            response = archive.get(url)
+            if response is None:
+                logger.warning("Play-by-play page isn't archived: %s", url)
+                continue
+            for event in iter_pbp_events(url, response.body):
+                yield event
+
+def write_pbp_events_csv(events, path):
+    """
+    Writes play-by-play events to a CSV file as they are yielded, without holding them.
+    Returns the number of events written.
+    """
+    count = 0
+
+    def iter_rows():
+        nonlocal count
+        yield pbp_event_columns
+        for event in events:
+            count += 1
+            yield event
+    with open_atomic(path, 'w') as file:
+        write_csv_rows(file, iter_rows())
+    default_metrics.increment("rows_written", count, table="pbp_events")
+    return count
+
+def extract_pbp_events_range(start_date, end_date, path, archive=None, discover=False, index_path=None):
+    """
+    Extracts the play-by-play events of the games played between the given dates,
+    inclusive, to the CSV file at path, streaming them from each page to the file (see
+    iter_pbp_events_range). Returns the number of events written.
+    """
+    logger.info("Extracting play-by-play events from %s to %s", start_date, end_date)
+    return write_pbp_events_csv(iter_pbp_events_range(start_date, end_date, archive, discover, index_path), path)
+
+
+
         
         
-def get_box_score_links(url):
+def get_box_score_links(url, html=None, archive=None):
     #f = urllib2.urlopen(url)
-    f = urlopen(url)
-    html = f.read()
-    f.close()
-    soup = BeautifulSoup(html)
-    
-    # Find the links with display text "Box Score".
-    base_url = "http://www.basketball-reference.com"
-    
-    box_score_links = []
-    links = soup.find_all("a", text="Box Score")
-    for link in links:
-        box_score_links.append(base_url + link["href"])
-        #print link.text, link["href"]
+    if html is None:
+        html = fetch_url(url, archive)
+    with default_metrics.timer("parse", page="box_score_index"):
+        # Find the links with display text "Box Score".
+        base_url = "http://www.basketball-reference.com"
+
+        box_score_links = []
+        for href in default_parser.get_links(html, "Box Score"):
+            box_score_links.append(base_url + href)
     
     return box_score_links
     
@@ -165,52 +425,134 @@ def form_date_url(date):
     url = base_url + "/boxscores/index.cgi?month=" + str(date.month) + "&day=" + str(date.day) + "&year=" + str(date.year)
     return url
     
-def extract_box_scores(date):
-    date_url = form_date_url(date)
-    print(date_url)
-    
+def iter_box_scores(date, streaming=False, archive=None, box_score_links=None):
+    """
+    Yields the links to the box scores of the games played on the given date, each with a
+    list of the stats tables of the game. If a page_archive.PageArchive is given, the pages
+    are added to it, except for the box scores in streaming mode. If the links are already
+    known (see discover_box_scores), they can be given, and the date's page isn't fetched.
+    """
+    if box_score_links is None:
+        date_url = form_date_url(date)
+        logger.info("%s", date_url)
+
+        box_score_links = get_box_score_links(date_url, archive=archive)
+    logger.info("Found box score links: %s", box_score_links)
+
+    for box_score_link in box_score_links:
+        html = None
+        if not streaming:
+            html = fetch_url(box_score_link, archive)
+        yield box_score_link, list(iter_stats_tables(box_score_link, html, streaming))
+
+def extract_box_scores(date, streaming=False, out_dir=None, store=None, archive=None, box_score_links=None):
+    """
+    Extracts the box scores of the games played on the given date, into a directory named
+    after the date in out_dir (by default, the current working directory). Each game gets a
+    numbered sub-directory. If a stats_store.StatsStore is given, the box scores are stored
+    in it instead, and committed once the day is done. If a page_archive.PageArchive is
+    given, the pages are kept in it, so that they can be extracted again with
+    replay_box_scores. See iter_box_scores for box_score_links.
+    """
+    if store is not None:
+        for box_score_link, tables in iter_box_scores(date, streaming, archive, box_score_links):
+            with default_metrics.timer("write", table="store"):
+                store.add_box_score(box_score_link, date, tables)
+        store.commit()
+        return
+
+    if out_dir is None:
+        out_dir = os.getcwd()
+
     # Create a directory in which to store the files
-    date_dir = os.path.join(os.getcwd(), date.isoformat())
-    print(date_dir)
-    
-    old_cwd = os.getcwd()
-    if not os.path.exists(date_dir):
-        os.mkdir(date_dir)
-    os.chdir(date_dir)
-    
-    box_score_links = get_box_score_links(date_url)
-    print("Found box score links:", box_score_links)
+    date_dir = os.path.join(out_dir, date.isoformat())
+    logger.info("%s", date_dir)
+    os.makedirs(date_dir, exist_ok=True)
 
     game_num = 0
-    for box_score_link in box_score_links:
+    for box_score_link, tables in iter_box_scores(date, streaming, archive, box_score_links):
         game_dir = os.path.join(date_dir, str(game_num))
         if not os.path.exists(game_dir):
             os.mkdir(game_dir)
-        os.chdir(game_dir)
-            
-        extract_data_from_url(box_score_link)#"http://www.basketball-reference.com/boxscores/201305260IND.html")
-        
+
+        write_stats_tables_csv(tables, game_dir)#"http://www.basketball-reference.com/boxscores/201305260IND.html")
+
         game_num += 1
-        os.chdir(date_dir)
-        
-    os.chdir(old_cwd)
-        
-    
-def extract_box_scores_range(start_date, end_date):
+
+
+def discover_box_scores(start_date, end_date, index, archive=None):
+    """
+    Gets the days between the given dates that had games, with the links to their box
+    scores, as (date, links) pairs, from the season schedules of basketball-reference. The
+    given schedule_index.ScheduleIndex is filled in with the months in the range, fetching
+    only the schedule pages that it doesn't hold final copies of, so a whole season takes
+    about a dozen requests rather than one for each day.
+    """
+    current_season = nba_season(datetime.date.today())
+    first_month = (start_date.year, start_date.month)
+    last_month = (end_date.year, end_date.month)
+    for season in range(nba_season(start_date), nba_season(end_date) + 1):
+        months = index.get_season_months(season)
+        if months is None or season >= current_season:
+            html = fetch_url(form_schedule_url(season), archive)
+            with default_metrics.timer("parse", page="schedule"):
+                games, months = parse_schedule_page(html)
+            if len(months) == 0:
+                # The whole season is on the one page.
+                for year, month in sorted(set((date.year, date.month) for date, link in games)):
+                    index.add_month(year, month, [game for game in games
+                                                  if (game[0].year, game[0].month) == (year, month)])
+            index.set_season_months(season, months)
+
+        for month in months:
+            year = schedule_month_year(season, month)
+            if (year, month) < first_month or (year, month) > last_month or index.is_final(year, month):
+                continue
+            html = fetch_url(form_schedule_url(season, month), archive)
+            with default_metrics.timer("parse", page="schedule"):
+                games = parse_schedule_page(html)[0]
+            index.add_month(year, month, games)
+        index.save()
+    return index.get_game_days(start_date, end_date)
+
+def extract_box_scores_range(start_date, end_date, streaming=False, out_dir=None, store=None, archive=None,
+                             discover=False, index_path=None):
+    """
+    Extracts the box scores of the games played between the given dates, inclusive (see
+    extract_box_scores). By default, the page of each day is fetched to find its games.
+    With discover set, the games are found from the season schedules instead (see
+    discover_box_scores), and only the days with games are fetched. The schedule index is
+    kept at index_path, by default schedule_index.json in out_dir. The games of a day may
+    then be numbered in a different order than the day's page lists them.
+    """
     assert(start_date <= end_date)
-    print("Extracting box scores from", start_date, "to", end_date)
-    
+    logger.info("Extracting box scores from %s to %s", start_date, end_date)
+
+    for date, box_score_links in iter_box_score_days(start_date, end_date, out_dir, archive, discover, index_path):
+        logger.info("%s", date)
+        extract_box_scores(date, streaming, out_dir, store, archive, box_score_links)
+
+def iter_box_score_days(start_date, end_date, out_dir=None, archive=None, discover=False, index_path=None):
+    """
+    Yields the days between the given dates, inclusive, each with the links to its box
+    scores, or with None where the links are to be found from the day's page. With
+    discover set, only the days with games are yielded (see extract_box_scores_range).
+    """
+    if discover:
+        if index_path is None:
+            index_path = os.path.join(out_dir or os.getcwd(), "schedule_index.json")
+        for date, box_score_links in discover_box_scores(start_date, end_date, ScheduleIndex(index_path), archive):
+            yield date, box_score_links
+        return
+
     one_day = datetime.timedelta(days=1)
-    
+
     # Loop through the dates in the given range.
     current_date = start_date
     while current_date <= end_date:
-        print(current_date)
-        
-        extract_box_scores(current_date)
-        
+        yield current_date, None
         current_date += one_day
-    
+
 def nrlstats_form_season_url(year, base_url):
     
     if year == 2007:
@@ -225,445 +567,959 @@ def nrlstats_form_season_url(year, base_url):
     
     return url
     
-def get_nrlstats_row_values(row):
+def nrlstats_season_base_url(year):
     """
-    Gets the values from a row.
+    Gets the base URL of the site that holds the stats of the given season, or None if the
+    season isn't supported.
     """
-    cols = row.find_all('td')
-    cols_2 = row.find_all('th')
-    
-    if len(cols) == 0 and len(cols_2) == 0:
-        return (None, None, None)
-    
+    if year == 2007:
+        return "http://web.archive.org/web/20080718185646/http://www.nrlstats.com/season2007/"
+    elif year == 2008:
+        return "http://web.archive.org/web/20090916203853/http://live.nrlstats.com/"
+    elif year == 2015:
+        return "http://live.nrlstats.com"
+    return None
+
+def player_stats_row_values(cells):
+    """
+    Gets the values of a row of a player stats table. If the row has heading cells, only
+    those are used.
+    """
+    cols = [cell for cell in cells if cell[0] == 'th']
     if len(cols) == 0:
-        # There were no td tags, so get all values from th tags.
-        val_1_strings = cols_2[0].strings
-        val_2_strings = cols_2[2].strings
-        stat_strings = cols_2[1].strings
-    elif len(cols_2) > 0:
-        # There was a 'th' col.
-        val_1_strings = cols[0].strings
-        val_2_strings = cols[1].strings
-        stat_strings = cols_2[0].strings
-    elif len(cols_2) == 0: 
-       # There was no 'th' col.
-        val_1_strings = cols[0].strings
-        val_2_strings = cols[2].strings
-        stat_strings = cols[1].strings
-        
-    val_1 = ""
-    for x in val_1_strings:
-        val_1 = val_1 + x + " "
-    val_1 = val_1.strip()
-        
-    val_2 = ""
-    for x in val_2_strings:
-        val_2 = val_2 + x + " "
-    val_2 = val_2.strip()
-    
-    stat = ""
-    for x in stat_strings:
-        stat = stat + x + " "
-    stat = stat.strip()
-    
-    return (stat, val_1, val_2)     
+        cols = [cell for cell in cells if cell[0] == 'td']
+    return [get_cell_text(cell, " ") for cell in cols]
 
-    
-def get_nrlstats_game_stats(div, date, teams):
+def game_stats_row_values(cells):
+    """
+    Gets the values of a row of a game stats table. The separate strings within a cell
+    (such as the lines of a cell broken with <br>) are joined with " | ".
+    """
+    return [get_cell_text(cell) for cell in cells]
+
+def get_nrlstats_player_stats(div, date, teams, csv_name):
+    """
+    Extracts a player stats table.
+    """
+    write_table_csv(csv_name, get_table_rows(div), player_stats_row_values)
+
+def get_nrlstats_game_stats(div, date, teams, csv_name):
+    """
+    Extracts a game stats table.
+    """
+    write_table_csv(csv_name, get_table_rows(div), game_stats_row_values)
+
+# The tables on a match page, keyed by the id of the div that holds each one, with the
+# function that gets the values of each row of the table and the CSV file it is written to.
+nrlstats_match_tables = {}
+
+# The kind, period and category of each table, keyed the same way.
+nrlstats_table_kinds = {}
+
+# Player stats. Period 0 is the whole match, and periods 1 and 2 are the halves.
+nrlstats_periods = ["total", "first_half", "second_half"]
+for period_num, period_name in enumerate(nrlstats_periods):
+    for category in ["summary", "points", "runs", "tackles", "kicks"]:
+        div_id = "tab-ps-" + str(period_num) + "-" + category + "-data"
+        csv_name = "player_stats_" + category + "_" + period_name + ".csv"
+        nrlstats_match_tables[div_id] = (player_stats_row_values, csv_name)
+        nrlstats_table_kinds[div_id] = ("player", period_name, category)
+
+# Team stats.
+nrlstats_match_tables["tab-tsHalf-0-data"] = (game_stats_row_values, "team_stats_total.csv")
+nrlstats_match_tables["tab-tsHalf-1-data"] = (player_stats_row_values, "team_stats_first_half.csv")
+nrlstats_match_tables["tab-tsHalf-2-data"] = (player_stats_row_values, "team_stats_second_half.csv")
+
+# Game stats.
+nrlstats_match_tables["tab-mdHalf-0-data"] = (game_stats_row_values, "game_stats_total.csv")
+nrlstats_match_tables["tab-mdHalf-1-data"] = (game_stats_row_values, "game_stats_first_half.csv")
+nrlstats_match_tables["tab-mdHalf-2-data"] = (game_stats_row_values, "game_stats_second_half.csv")
+nrlstats_match_tables["page-scorecard-data"] = (game_stats_row_values, "game_scorecard.csv")
+
+for period_num, period_name in enumerate(nrlstats_periods):
+    nrlstats_table_kinds["tab-tsHalf-" + str(period_num) + "-data"] = ("team", period_name, None)
+    nrlstats_table_kinds["tab-mdHalf-" + str(period_num) + "-data"] = ("game", period_name, None)
+nrlstats_table_kinds["page-scorecard-data"] = ("scorecard", None, None)
+
+def nrlstats_match_date(date, year):
+    """
+    Converts the date of a fixture, such as 6_Mar, to a datetime.date in the given year.
+    """
+    day_of_month = int(date.split('_')[0])
+    month_str = date.split('_')[1]
+    month = month_map[month_str.lower()]
+    return datetime.date(year, month, day_of_month)
+
+def nrlstats_match_name(date, teams, year):
+    """
+    Forms the name of the directory of a match, such as 20150306_Wests_Parramatta.
+    """
+    date_str = nrlstats_match_date(date, year).strftime("%Y%m%d")
+    return date_str + "_" + teams[0] + "_" + teams[1]
+
+def make_nrlstats_match(url, date, teams, year, round=None, score=None, status=None):
+    """
+    Makes the record of a match, given its fixture date (such as 6_Mar) and team names.
+    """
+    return NrlstatsMatch(year, round, nrlstats_match_date(date, year), tuple(teams), url,
+                         nrlstats_match_name(date, teams, year), score, status)
+
+def find_nrlstats_table_div(tag, attrs):
     """
-    Extracts the game stats table, given the game stats div.
+    Selects the divs of a match page that hold the tables we want, for html_stream.
     """
-    table_divs = div.find_all('div')
-    for table_div in table_divs:
-        if 'id' not in table_div.attrs.keys():
+    if tag == 'div' and attrs.get('id') in nrlstats_match_tables:
+        return attrs['id']
+    return None
+
+def make_nrlstats_table(match, div_id, rows):
+    kind, period, category = nrlstats_table_kinds[div_id]
+    return NrlstatsTable(match, div_id, kind, period, category, rows)
+
+def get_nrlstats_tables(match, html):
+    """
+    Gets the tables of a match from its page, in page order, building only the divs that
+    hold the tables we want.
+    """
+    # Extract each of the tables, in a single pass over the divs that hold them.
+    tables = default_parser.get_tables(html, 'div', find_nrlstats_table_div,
+                                       SoupStrainer('div', id=list(nrlstats_match_tables.keys())))
+    return [make_nrlstats_table(match, div_id, rows) for div_id, rows in tables]
+
+def iter_nrlstats_tables(match, html=None, streaming=False):
+    """
+    Yields the tables of the given match. If the page has already been downloaded, it can
+    be given as html. In streaming mode, the page is parsed as it arrives and only one table
+    is held in memory at a time, so the memory used is bounded by the largest table rather
+    than the page.
+    """
+    if not streaming:
+        if html is None:
+            html = fetch_url(match.url)
+        with default_metrics.timer("parse", page="nrlstats_match"):
+            tables = get_nrlstats_tables(match, html)
+        for table in tables:
+            yield table
+        return
+
+    if html is None:
+        chunks = stream_url(match.url)
+    else:
+        chunks = iter_chunks(html)
+    for div_id, rows in iter_streamed_tables(iter_table_rows(chunks, find_nrlstats_table_div)):
+        yield make_nrlstats_table(match, div_id, rows)
+
+def iter_nrlstats_player_stats(table):
+    """
+    Yields the stats of each player in a player stats table. The first row holds the column
+    headings. The players of the first team follow, and the players of the second team come
+    after a row that names the team in capitals.
+    """
+    headings = None
+    team = table.match.teams[0]
+    for cells in table.rows:
+        values = [get_cell_text(cell, " ") for cell in cells]
+        if len(values) == 0:
             continue
-        print(table_div['id'])
-
-        if table_div['id'] == "tab-mdHalf-0-data":
-            # Total game stats.
-            file = open("game_stats_total.csv", 'w')
-        elif table_div['id'] == "tab-mdHalf-1-data":
-            # First half game stats.
-            file = open("game_stats_first_half.csv", 'w')
-        elif table_div['id'] == "tab-mdHalf-2-data":
-            # Second half game stats.
-            file = open("game_stats_second_half.csv", 'w')
-        else:
+        if headings is None:
+            headings = values
             continue
-            
-        rows = table_div.find_all('tr')
-        
-        # Each row (except the heading row) contains a stat.
-        for row in rows[0:]:
-            print(row)
-            
-            stat, val_1, val_2 = get_nrlstats_row_values(row)
-            
-            if stat == None:
-                continue
-            
-            string = stat + ", " + val_1 + ", " + val_2 + "\n"
-            file.write(string);
-        
-        file.close()
-        
-def get_nrlstats_team_stats(div, date, teams):
+        if values[0].isupper():
+            team = table.match.teams[1]
+            continue
+        stats = dict(zip(headings[1:], values[1:]))
+        yield NrlstatsPlayerStats(table.match, table.period, table.category, team, values[0], stats)
+
+def iter_nrlstats_team_stats(table):
     """
-    Extracts the team stats table, given the team stats div.
+    Yields each stat of a team or game stats table. Each row holds the first team's value,
+    the name of the stat and the second team's value, where the name is usually a heading cell.
+    A first row made only of heading cells names the teams, and is skipped.
     """
-    table_divs = div.find_all('div')
-    for table_div in table_divs:
-        if 'id' not in table_div.attrs.keys():
+    for row_num, cells in enumerate(table.rows):
+        tds = [cell for cell in cells if cell[0] == 'td']
+        ths = [cell for cell in cells if cell[0] == 'th']
+        if row_num == 0 and len(tds) == 0:
             continue
-        print(table_div['id'])
-
-        if table_div['id'] == "tab-tsHalf-0-data":
-            # Total game stats.
-            file = open("team_stats_total.csv", 'w')
-        elif table_div['id'] == "tab-tsHalf-1-data":
-            # First half game stats.
-            file = open("team_stats_first_half.csv", 'w')
-        elif table_div['id'] == "tab-tsHalf-2-data":
-            # Second half game stats.
-            file = open("team_stats_second_half.csv", 'w')
+        if len(tds) == 0 and len(ths) == 3:
+            # There were no td tags, so get all values from th tags.
+            values = (ths[0], ths[2])
+            stat = ths[1]
+        elif len(tds) >= 2 and len(ths) == 1:
+            # There was a 'th' col.
+            values = (tds[0], tds[1])
+            stat = ths[0]
+        elif len(tds) >= 3 and len(ths) == 0:
+            # There was no 'th' col.
+            values = (tds[0], tds[2])
+            stat = tds[1]
         else:
             continue
-            
-        rows = table_div.find_all('tr')
-        
-        # Each row (except the heading row) contains a stat.
-        for row in rows[0:]:
-            print(row)
-            
-            stat, val_1, val_2 = get_nrlstats_row_values(row)
-            
-            if stat == None:
-                continue
-            
-            string = stat + ", " + val_1 + ", " + val_2 + "\n"
-            file.write(string);
-        
-        file.close()
-        
-def get_nrlstats_player_stats(div, date, teams, csv_name):
+        yield NrlstatsTeamStat(table.match, table.kind, table.period, get_cell_text(stat, " "),
+                               (get_cell_text(values[0]), get_cell_text(values[1])))
+
+def iter_nrlstats_records(tables):
     """
-    Extracts a player stats table.
+    Yields the player stats, team stats and scorecard records of the given match tables.
     """
-    file = open(csv_name, 'w')
-                
-    
-    rows = div.find_all('tr')
-    
-    # Each row (except the heading row) contains a stat.
-    for row in rows[0:]:
-        cols = row.find_all('th')
-        if len(cols) == 0:
-            cols = row.find_all('td')
-    
-        for col in cols:
-            val_1 = ""
-            for x in col.strings:
-                val_1 = val_1 + x + " "
-            val_1 = val_1.strip()
-            file.write(val_1)
-            if col != cols[-1]:
-                file.write(', ')
-            
-        file.write('\n') 
-    
-    file.close()
-    
-def get_nrlstats_game_stats(div, date, teams, csv_name):
+    for table in tables:
+        if table.kind == "player":
+            records = iter_nrlstats_player_stats(table)
+        elif table.kind in ("team", "game"):
+            records = iter_nrlstats_team_stats(table)
+        else:
+            records = [NrlstatsScorecardRow(table.match, [get_cell_text(cell) for cell in cells])
+                       for cells in table.rows if len(cells) > 0]
+        for record in records:
+            yield record
+
+def write_nrlstats_tables_csv(tables, match_dir):
     """
-    Extracts a player stats table.
+    Writes each of the tables of a match to its own CSV file in match_dir.
     """
-    file = open(csv_name, 'w')
-                
-    
-    rows = div.find_all('tr')
-    
-    # Each row (except the heading row) contains a stat.
-    for row in rows[0:]:
-        cols = row.find_all(['th', 'td'])
-        #if len(cols) == 0:
-        #    cols = row.find_all('td')
-        #print cols
-        for col_num in range(len(cols)):
-            col = cols[col_num]
-        #for col in cols:
-            val_1 = ""
-            
-            col_strings = []
-            for x in col.strings:
-                col_strings.append(x)
-                
-            for string_num in range(len(col_strings)):
-            #for x in col.strings:
-                x = col_strings[string_num]
-                
-                # Replace commas with semi-colons, to avoid going to the next column.
-                x = x.replace(",", ";")
-                
-                val_1 = val_1 + x 
-                if string_num != (len(col_strings) - 1):
-                    val_1 += " | "
-            val_1 = val_1.strip()
-            file.write(val_1)
-            if col_num != (len(cols)-1):
-                file.write(', ')
-            
-        file.write('\n') 
-    
-    file.close()
-        
-def get_nrlstats_match(url, date, teams, year):
-    #f = urllib2.urlopen(url)
-    print(url)
-    f = urlopen(url)
-    html = f.read()
-    f.close()
-    soup = BeautifulSoup(html)
-    
+    for table in tables:
+        row_values, csv_name = nrlstats_match_tables[table.id]
+        write_table_csv(os.path.join(match_dir, csv_name), table.rows, row_values)
+
+def extract_nrlstats_match(match, out_dir, html=None, manifest=None, streaming=False, archive=None):
+    """
+    Extracts the stats of a single match to CSV files in a new directory in out_dir. If the
+    page has already been downloaded, it can be given as html. If a season manifest is
+    given, matches it records as complete are skipped. See iter_nrlstats_tables for
+    streaming mode. If a page_archive.PageArchive is given, the page is added to it when it
+    is downloaded here, except in streaming mode.
+    """
+    logger.info("%s", match.url)
+
     # Create a new directory for this match.
-    day_of_month = int(date.split('_')[0])
-    month_str = date.split('_')[1]
-    month = month_map[month_str.lower()]
-    date_str = str(year) + str("%02d" % month) + str("%02d" % day_of_month)
-    print(date_str)
-    
-    match_dir = os.path.join(os.getcwd(), date_str + "_" + teams[0] + "_" + teams[1])
-    print(match_dir)
-    
-    old_cwd = os.getcwd()
+    match_dir = os.path.join(out_dir, match.name)
+    logger.info("%s", match_dir)
+
+    if manifest is not None and manifest.is_complete(match.name, match_dir):
+        logger.info("Already extracted: %s", match.name)
+        return
+
+    if not streaming:
+        if html is None:
+            html = fetch_url(match.url, archive)
+        with default_metrics.timer("parse", page="nrlstats_match"):
+            tables = get_nrlstats_tables(match, html)
+
     if not os.path.exists(match_dir):
         os.mkdir(match_dir)
-    os.chdir(match_dir)
-    
-    tmp_file = open("webpage_pretty.txt", 'w')
-    tmp_file.write(soup.prettify())
-    tmp_file.close()
-   
-    # Write out the html to a file.
-    html_file = open("webpage.html", 'w')
-    html_file.write(str(html))
-    html_file.close()
-    
-    if False:
-        # Loop through the divs that contain tables.
-        divs = soup.find_all('div')
-        for div in divs:
-            if 'class' not in div.attrs.keys():
-                continue
-            if 'm_nrl' not in div['class']:
+
+    if manifest is not None:
+        manifest.mark_started(match.name, match.url)
+
+    if streaming:
+        write_nrlstats_tables_csv(iter_nrlstats_tables(match, html, streaming), match_dir)
+    else:
+        write_nrlstats_tables_csv(tables, match_dir)
+
+    if manifest is not None:
+        manifest.mark_complete(match.name, match_dir)
+
+def get_nrlstats_match(url, date, teams, year, html=None, manifest=None, streaming=False, out_dir=None, archive=None):
+    """
+    Extracts the stats of a single match into a new directory in out_dir (by default, the
+    current working directory). See extract_nrlstats_match.
+    """
+    if out_dir is None:
+        out_dir = os.getcwd()
+    match = make_nrlstats_match(url, date, teams, year)
+    extract_nrlstats_match(match, out_dir, html, manifest, streaming, archive)
+
+def fetch_url_if_changed(url, validators=None):
+    """
+    Downloads the given URL unless it hasn't changed since it was last downloaded, asking
+    the server with the ETag and Last-Modified validators of the last response, given as a
+    dict. Returns the page, or None if it hasn't changed, and the validators to send next
+    time. Metrics are recorded as in fetch_url, with the pages that hadn't changed counted
+    as not_modified.
+    """
+    host = urlparse(url).netloc
+    headers = {}
+    if validators is not None:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+    with default_metrics.timer("fetch", host=host):
+        response = default_client.fetch(url, headers)
+    default_metrics.increment("pages_fetched", host=host)
+    if response.status == 304:
+        default_metrics.increment("not_modified", host=host)
+        return None, validators
+    default_metrics.increment("fetch_bytes", len(response.body), host=host)
+    return response.body, {"etag" : response.headers.get("ETag"),
+                           "last_modified" : response.headers.get("Last-Modified")}
+
+class LiveMatch:
+    """
+    What is known of a match page that is being polled: the validators of the last
+    response, a hash of the page and of each table's div, and the values of each table.
+    """
+    def __init__(self, match):
+        self.match = match
+        self.validators = None
+        self.page_hash = None
+        self.div_hashes = {}
+        self.table_values = {}
+        self.last_change = time.time()
+
+def poll_nrlstats_match(live, stream):
+    """
+    Polls a match page once, with a conditional request, and appends the rows of its
+    tables that changed since the last poll to a table_deltas.DeltaStream. Only the divs
+    of the tables whose contents changed are parsed. The first poll adds every row. Returns
+    the number of tables that changed.
+    """
+    html, live.validators = fetch_url_if_changed(live.match.url, live.validators)
+    if html is None:
+        return 0
+    page_hash = hashlib.sha1(html).hexdigest()
+    if page_hash == live.page_hash:
+        # The server doesn't send validators, but the page is the same.
+        return 0
+    live.page_hash = page_hash
+
+    with default_metrics.timer("parse", page="nrlstats_live"):
+        charset = guess_charset(html)
+        changed = []
+        spans = find_element_spans(html, "div", nrlstats_match_tables)
+        for div_id, (start, end) in spans.items():
+            div_hash = hashlib.sha1(html[start:end]).hexdigest()
+            if live.div_hashes.get(div_id) == div_hash:
                 continue
-            
-            # For the div, find all the sub-divs and extract information.
-            table_divs = div.find_all('div')
-            for table_div in table_divs:
-                if 'class' not in table_div.attrs.keys():
-                    continue
-                if 'm_h' in table_div['class']:
-                    # This is the heading of the table.
-                    heading = table_div.span.string
-                    if heading == None:
-                        continue
-                    heading = heading.strip()
-                    print(heading)
-                    if heading == "Game Stats":
-                        pass#get_nrlstats_game_stats(div, date, teams)
-                    elif heading == "Team Stats":    
-                        pass#get_nrlstats_team_stats(div, date, teams)
-                    elif heading == "Player Stats":
-                        pass#get_nrlstats_player_stats(div, date, teams)
-        
-    divs = soup.find_all('div')
-    for div in divs:
-        if 'id' not in div.attrs.keys():
-            continue
-        #print div['id']
-        
-        # Summary data.
-        if div['id'] == "tab-ps-0-summary-data":
-            get_nrlstats_player_stats(div, date, teams, "player_stats_summary_total.csv")
-        if div['id'] == "tab-ps-1-summary-data":
-            get_nrlstats_player_stats(div, date, teams, "player_stats_summary_first_half.csv")
-        if div['id'] == "tab-ps-2-summary-data":
-            get_nrlstats_player_stats(div, date, teams, "player_stats_summary_second_half.csv")
-            
-        # Points data.
-        if div['id'] == "tab-ps-0-points-data":
-            get_nrlstats_player_stats(div, date, teams, "player_stats_points_total.csv")
-        if div['id'] == "tab-ps-1-points-data":
-            get_nrlstats_player_stats(div, date, teams, "player_stats_points_first_half.csv")
-        if div['id'] == "tab-ps-2-points-data":
-            get_nrlstats_player_stats(div, date, teams, "player_stats_points_second_half.csv")
-            
-        # Runs data.
-        if div['id'] == "tab-ps-0-runs-data":
-            get_nrlstats_player_stats(div, date, teams, "player_stats_runs_total.csv")
-        if div['id'] == "tab-ps-1-runs-data":
-            get_nrlstats_player_stats(div, date, teams, "player_stats_runs_first_half.csv")
-        if div['id'] == "tab-ps-2-runs-data":
-            get_nrlstats_player_stats(div, date, teams, "player_stats_runs_second_half.csv")
-            
-        # Tackles data.
-        if div['id'] == "tab-ps-0-tackles-data":
-            get_nrlstats_player_stats(div, date, teams, "player_stats_tackles_total.csv")
-        if div['id'] == "tab-ps-1-tackles-data":
-            get_nrlstats_player_stats(div, date, teams, "player_stats_tackles_first_half.csv")
-        if div['id'] == "tab-ps-2-tackles-data":
-            get_nrlstats_player_stats(div, date, teams, "player_stats_tackles_second_half.csv")
-            
-        # Kicks data.
-        if div['id'] == "tab-ps-0-kicks-data":
-            get_nrlstats_player_stats(div, date, teams, "player_stats_kicks_total.csv")
-        if div['id'] == "tab-ps-1-kicks-data":
-            get_nrlstats_player_stats(div, date, teams, "player_stats_kicks_first_half.csv")
-        if div['id'] == "tab-ps-2-kicks-data":
-            get_nrlstats_player_stats(div, date, teams, "player_stats_kicks_second_half.csv")
-    
-        # Team stats. 
-        if div['id'] == "tab-tsHalf-0-data":
-            get_nrlstats_game_stats(div, date, teams, "team_stats_total.csv")
-        if div['id'] == "tab-tsHalf-1-data":
-            get_nrlstats_player_stats(div, date, teams, "team_stats_first_half.csv")
-        if div['id'] == "tab-tsHalf-2-data":
-            get_nrlstats_player_stats(div, date, teams, "team_stats_second_half.csv")
-            
-        # Game stats. 
-        if div['id'] == "tab-mdHalf-0-data":
-            get_nrlstats_game_stats(div, date, teams, "game_stats_total.csv")
-        if div['id'] == "tab-mdHalf-1-data":
-            get_nrlstats_game_stats(div, date, teams, "game_stats_first_half.csv")
-        if div['id'] == "tab-mdHalf-2-data":
-            get_nrlstats_game_stats(div, date, teams, "game_stats_second_half.csv")
-            
-        if div['id'] == "page-scorecard-data":
-            get_nrlstats_game_stats(div, date, teams, "game_scorecard.csv")
-            
-def get_nrlstats_season_links(url, year, base_url):
-    print(url)
-    #f = urllib2.urlopen(url)
-    f = urlopen(url)
-    html = f.read()
-    f.close()
-    soup = BeautifulSoup(html)
-    
-    tmp_file = open("webpage_pretty.txt", 'w')
-    tmp_file.write(soup.prettify())
-    tmp_file.close()
-    
-    # Write out the html to a file.
-    html_file = open("webpage.html", 'wb')
-    html_file.write(html)
-    html_file.close()
-   
+            live.div_hashes[div_id] = div_hash
+            changed.append((start, end))
+        tables = []
+        for start, end in sorted(changed):
+            events = iter_table_rows(iter_chunks(html[start:end]), find_nrlstats_table_div, charset)
+            tables.extend(iter_streamed_tables(events))
+
+    for div_id, rows in tables:
+        values = get_table_values(rows, nrlstats_match_tables[div_id][0])
+        changes = diff_rows(live.table_values.get(div_id, []), values)
+        live.table_values[div_id] = values
+        stream.append(live.match.name, div_id, changes)
+        default_metrics.increment("live_deltas", len(changes), table=div_id)
+    if len(tables) > 0:
+        live.last_change = time.time()
+    default_metrics.increment("live_tables_parsed", len(tables))
+    default_metrics.increment("live_tables_skipped", len(spans) - len(tables))
+    return len(tables)
+
+def poll_live_match(live, stream):
+    """
+    Polls a match for follow_nrlstats_matches, logging the errors so that one match that
+    fails doesn't stop the others. Returns None if the poll failed.
+    """
+    try:
+        return poll_nrlstats_match(live, stream)
+    except Exception:
+        logger.exception("Error polling %s", live.match.url)
+        return None
+
+def follow_nrlstats_matches(matches, delta_path, interval=30, idle_timeout=30 * 60, workers=8, polls=None):
+    """
+    Follows matches in progress, polling each match page every interval seconds, and
+    appends the row-level changes to its tables to the JSON lines file at delta_path (see
+    poll_nrlstats_match and table_deltas.DeltaStream). The pages are polled concurrently by
+    the given number of threads. A match stops being followed once its page hasn't changed
+    for idle_timeout seconds, or after the given number of polls. Returns when no matches
+    are left.
+    """
+    live_matches = [LiveMatch(match) for match in matches]
+    stream = DeltaStream(delta_path)
+    poll_num = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while len(live_matches) > 0 and (polls is None or poll_num < polls):
+                started = time.monotonic()
+                for live, result in zip(live_matches, executor.map(poll_live_match, live_matches,
+                                                                   [stream] * len(live_matches))):
+                    if result is None:
+                        logger.warning("Couldn't poll %s", live.match.url)
+                poll_num += 1
+                now = time.time()
+                for live in live_matches:
+                    if now - live.last_change > idle_timeout:
+                        logger.info("No changes for a while, so no longer following: %s", live.match.name)
+                live_matches = [live for live in live_matches if now - live.last_change <= idle_timeout]
+                if len(live_matches) > 0 and (polls is None or poll_num < polls):
+                    time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    finally:
+        stream.close()
+    logger.info("Wrote %d deltas to %s", stream.count, delta_path)
+
+def follow_nrlstats_season(year, delta_path, date=None, **settings):
+    """
+    Follows the matches of the given season that are played on the given date (by default,
+    today), as follow_nrlstats_matches does with the given settings.
+    """
+    if date is None:
+        date = datetime.date.today()
+    matches = [match for match in get_nrlstats_season_matches(year) if match.date == date]
+    logger.info("Following %d matches", len(matches))
+    follow_nrlstats_matches(matches, delta_path, **settings)
+
+def parse_nrlstats_season_page(html):
+    """
+    Parses a season page, building only the divs that hold the fixture tables.
+    """
+    return default_parser.make_soup(html, SoupStrainer('div', class_=['m_nrl', 'm_5']))
+
+def get_nrlstats_season_matches_from_soup(soup, year, base_url):
+    """
+    Gets the records of the matches listed on a parsed season page, in fixture order.
+    """
     # Find all the divs that contain match tables.
-    divs = soup.find_all('div')
-    match_divs = []
-    for div in divs:
-        #print div
-        if 'class' not in div.attrs.keys():
-            continue
-        #print div['class']
-        if 'm_nrl' not in div['class'] and 'm_5' not in div['class']:
-            continue
-        print(div['class'])
-        match_divs.append(div)
-    
+    match_divs = soup.find_all('div', class_=['m_nrl', 'm_5'])
+    for div in match_divs:
+        logger.debug("%s", div['class'])
+
     # Extract the details from each match div.
+    matches = []
     for match_div in match_divs:
         #print(match_div)
-        
-        divs = match_div.find_all('div')
-        for div in divs:
-            #print div['class']
+
+        round = None
+        for div in match_div.find_all('div', class_=['m_h', 'm_b']):
             # The heading of each table, which names the round.
             if 'm_h' in div['class']:
                 round = div.string # Was div.span.string
+                if round is not None:
+                    round = round.strip()
             # The contents of each table.
             if 'm_b' in div['class']:
                 rows = div.find_all('tr')
                 # Each row (except the heading row) contains a game.
                 for row in rows[1:]:
-                    print(row)
-                    
+                    logger.debug("%s", row)
+
                     cols = row.find_all('td')
                     date = cols[0].string.replace(' ', '_')
                     teams = cols[1].string.split('v')
                     team_names = []
                     for team in teams:
-                        team = team.strip()
-                        if team in nrl_team_map.keys():
-                            team = nrl_team_map[team]
-                        team_names.append(team)
+                        team_names.append(normalise_team_name(team.strip()))
                     match_link = cols[1].a.attrs['href']
-                    score = cols[2]
-                    status = cols[3]
-                    report_links = cols[4]
-                    
-                    print("Date:", date)
-                    print("Team names:", team_names)
-                    print("Match link:", match_link)
-                    print("Score:", score)
-                    print("Status:", status)
-                    
-                    #continue
-                    
+                    score = cols[2].get_text().strip()
+                    status = cols[3].get_text().strip()
+
+                    logger.debug("Date: %s", date)
+                    logger.debug("Team names: %s", team_names)
+                    logger.debug("Match link: %s", match_link)
+                    logger.debug("Score: %s", score)
+                    logger.debug("Status: %s", status)
+
                     # Extract the match figures from the teams link.
-                    #base_url = ""                
+                    #base_url = ""
                     #base_url = "http://live.nrlstats.com"
                     match_url = base_url + match_link
-                    
-                    
-                    working_dir = os.getcwd()
-                    get_nrlstats_match(match_url, date, team_names, year)
-                    os.chdir(working_dir)                
-                    
-                    #return
-                    
-                #print rows[0]
-        #print divs
-        #return
-    return
-        
-def extract_nrlstats_season(year):
+                    matches.append(make_nrlstats_match(match_url, date, team_names, year, round, score, status))
+    return matches
+
+def parse_nrlstats_season_matches(html, year, base_url, wayback=None):
     """
-    Extracts the NRL stats for a given season (year).
+    Gets the records of the matches listed on a season page, in fixture order. If a
+    wayback.WaybackIndex is given, the URL of each match on the Wayback Machine is resolved
+    to its best capture from after the match.
     """
-    
-    if year == 2007:
-        base_url = "http://web.archive.org/web/20080718185646/http://www.nrlstats.com/season2007/"
-    elif year == 2008:
-        base_url = "http://web.archive.org/web/20090916203853/http://live.nrlstats.com/"
-    elif year == 2015:
-        base_url = "http://live.nrlstats.com"
-    else:
-        print("Year not supported.")
+    with default_metrics.timer("parse", page="nrlstats_season"):
+        matches = get_nrlstats_season_matches_from_soup(parse_nrlstats_season_page(html), year, base_url)
+    if wayback is not None:
+        matches = [match._replace(url=wayback.resolve(match.url, match.date + datetime.timedelta(days=1)))
+                   for match in matches]
+    return matches
+
+def load_wayback_captures(wayback, prefix):
+    """
+    Loads the captures of the URLs starting with the given prefix into a
+    wayback.WaybackIndex from its CDX server, a page at a time, unless they have been
+    loaded before.
+    """
+    if wayback.has_prefix(prefix):
         return
-    
+    captures = []
+    resume_key = None
+    while True:
+        page, resume_key = parse_cdx_response(fetch_url(wayback.form_cdx_query(prefix, resume_key)))
+        captures.extend(page)
+        if resume_key is None:
+            break
+    logger.info("Found %d captures of %s", len(captures), prefix)
+    wayback.add_captures(prefix, captures)
+
+def resolve_nrlstats_season_url(year, base_url, wayback=None):
+    """
+    Forms the URL of the season page. If a wayback.WaybackIndex is given and the season is
+    read from the Wayback Machine, the captures of the season's pages are loaded into it,
+    and the URL of the best capture of the season page is returned instead.
+    """
     season_url = nrlstats_form_season_url(year, base_url)
-    print("Season URL:", season_url)
-    
+    parsed = parse_wayback_url(base_url)
+    if wayback is None or parsed is None:
+        return season_url
+    load_wayback_captures(wayback, parsed[1])
+    return wayback.resolve(season_url)
+
+def get_nrlstats_season_matches(year, base_url=None, wayback=None):
+    """
+    Gets the records of the matches of the given season, in fixture order. See
+    resolve_nrlstats_season_url for wayback.
+    """
+    if base_url is None:
+        base_url = nrlstats_season_base_url(year)
+    html = fetch_url(resolve_nrlstats_season_url(year, base_url, wayback))
+    return parse_nrlstats_season_matches(html, year, base_url, wayback)
+
+def update_nrlstats_ratings(ratings, matches):
+    """
+    Updates a team_ratings.RatingEngine with the results of the finished matches among
+    those listed on a season page.
+    """
+    with default_metrics.timer("ratings"):
+        ratings.update(results_from_nrlstats_matches(matches))
+
+def iter_nrlstats_season(year, base_url=None, streaming=False, workers=1, wayback=None, ratings=None):
+    """
+    Yields each match of the given season with a list of its tables. Use
+    iter_nrlstats_records on the tables to get the player and team stats. When workers is
+    greater than one, the match pages are downloaded concurrently by that many threads.
+    See resolve_nrlstats_season_url for wayback. If a team_ratings.RatingEngine is given,
+    it is updated with the results on the season page before the match pages are
+    downloaded.
+    """
+    matches = get_nrlstats_season_matches(year, base_url, wayback)
+    if ratings is not None:
+        update_nrlstats_ratings(ratings, matches)
+    if workers <= 1:
+        for match in matches:
+            yield match, list(iter_nrlstats_tables(match, streaming=streaming))
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pages = map_window(executor, fetch_url, [match.url for match in matches], workers * 2)
+        for match, html in zip(matches, pages):
+            yield match, list(iter_nrlstats_tables(match, html, streaming))
+
+def make_nrlstats_season_dataset(season):
+    """
+    Collects the matches and stats of a season, given as (match, tables) pairs such as
+    those from iter_nrlstats_season, into a SeasonDataset.
+    """
+    dataset = SeasonDataset()
+    for match, tables in season:
+        dataset.add_match(match)
+        for record in iter_nrlstats_records(tables):
+            if isinstance(record, NrlstatsPlayerStats):
+                dataset.add_player_stats(record)
+            elif isinstance(record, NrlstatsTeamStat):
+                dataset.add_team_stat(record)
+    return dataset
+
+def parse_nrlstats_tables(match, html):
+    """
+    Gets the tables of a match from its page, in a parser process of the pipeline, with
+    the metrics recorded by the process since its last parse, for the pipeline to merge.
+    """
+    tables = list(iter_nrlstats_tables(match, html))
+    return tables, default_metrics.take()
+
+def get_nrlstats_season_links(url, year, base_url, workers=1, manifest=None, streaming=False, out_dir=None,
+                              archive=None, parsers=None, wayback=None, ratings=None):
+    """
+    Extracts every match listed on the season page at the given URL into out_dir (by
+    default, the current working directory). When workers is greater than one, the match
+    pages are downloaded concurrently by that many threads, while the matches are still
+    extracted one at a time in fixture order, so the files written are the same as for a
+    serial run. Matches that the manifest records as complete are skipped. The season
+    page and the match pages are added to the archive, if one is given. See
+    extract_nrlstats_match for streaming mode.
+
+    If a number of parsers is given, the matches go through a pipeline instead (see
+    pipeline.run_pipeline), where the pages are downloaded by the worker threads, parsed by
+    that many processes and written in batches, all at the same time. Streaming mode
+    doesn't apply to the pipeline.
+
+    If a wayback.WaybackIndex is given, the match URLs are resolved with it (see
+    parse_nrlstats_season_matches). If a team_ratings.RatingEngine is given, it is updated
+    with the results on the season page before the match pages are downloaded.
+    """
+    if out_dir is None:
+        out_dir = os.getcwd()
+
+    logger.info("%s", url)
+    #f = urllib2.urlopen(url)
+    html = fetch_url(url, archive)
+    matches = parse_nrlstats_season_matches(html, year, base_url, wayback)
+    if ratings is not None:
+        update_nrlstats_ratings(ratings, matches)
+
+    if manifest is not None:
+        # Leave out the matches that a previous run completed.
+        pending = []
+        for match in matches:
+            if manifest.is_complete(match.name, os.path.join(out_dir, match.name)):
+                logger.info("Already extracted: %s", match.name)
+                continue
+            pending.append(match)
+        matches = pending
+
+    def fetch_match_page(match_url):
+        return fetch_url(match_url, archive)
+
+    if parsers is not None:
+        def write_matches(batch):
+            for match, (tables, metrics) in batch:
+                default_metrics.merge(metrics)
+                match_dir = os.path.join(out_dir, match.name)
+                logger.info("%s", match_dir)
+                if not os.path.exists(match_dir):
+                    os.mkdir(match_dir)
+                if manifest is not None:
+                    manifest.mark_started(match.name, match.url, save=False)
+                write_nrlstats_tables_csv(tables, match_dir)
+                if manifest is not None:
+                    manifest.mark_complete(match.name, match_dir, save=False)
+            if manifest is not None:
+                manifest.save()
+
+        run_pipeline(matches, lambda match: fetch_match_page(match.url), parse_nrlstats_tables,
+                     write_matches, max(workers, 1), parsers)
+        return
+
+    if workers <= 1:
+        for match in matches:
+            extract_nrlstats_match(match, out_dir, manifest=manifest, streaming=streaming, archive=archive)
+        return
+
+    # Download the match pages in the background, extracting each one as it arrives. Only
+    # a few pages are downloaded ahead of the one being extracted, so that the pages of a
+    # long season don't pile up in memory when extracting is the slower part.
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pages = map_window(executor, fetch_match_page, [match.url for match in matches], workers * 2)
+        for match, html in zip(matches, pages):
+            extract_nrlstats_match(match, out_dir, html, manifest, streaming)
+    return
+
+def extract_nrlstats_season(year, workers=1, streaming=False, out_dir=None, output="csv", store=None,
+                            parsers=None, wayback=None, ratings=None):
+    """
+    Extracts the NRL stats for a given season (year) into a directory named after the year
+    in out_dir (by default, the current working directory). Match pages are downloaded by
+    the given number of worker threads. Progress is recorded in manifest.json in the season
+    directory, so if the extraction is interrupted, rerunning it carries on from where it
+    stopped. The pages downloaded are kept in the compressed archive pages.warc.gz in the
+    season directory (see page_archive.PageArchive). See extract_nrlstats_match for
+    streaming mode, and get_nrlstats_season_links for parsers.
+
+    With output set to "parquet" or "arrow", the season is instead written as a single
+    columnar dataset in the dataset directory of the season directory (see
+    season_dataset.SeasonDataset), rather than a directory of CSV files per match. If a
+    stats_store.StatsStore is given, the season is stored in it instead.
+
+    For the seasons read from the Wayback Machine, a wayback.WaybackIndex can be given, so
+    that each page is fetched raw from its best capture in one request (see
+    resolve_nrlstats_season_url). It is best made with the snapshots in links.txt (see
+    wayback.read_snapshots).
+
+    If a team_ratings.RatingEngine is given, the ratings of each new round of results are
+    fitted as soon as the season page lists them (see update_nrlstats_ratings), whatever
+    the output.
+    """
+
+    base_url = nrlstats_season_base_url(year)
+    if base_url is None:
+        logger.error("Year not supported: %s", year)
+        return
+
+    season_url = resolve_nrlstats_season_url(year, base_url, wayback)
+    logger.info("Season URL: %s", season_url)
+
+    if store is not None:
+        for match, tables in iter_nrlstats_season(year, base_url, streaming, workers, wayback, ratings):
+            with default_metrics.timer("write", table="store"):
+                store.add_nrlstats_match(match, iter_nrlstats_records(tables))
+        store.commit()
+        return
+
     # Create a directory in which to store the files
-    year_dir = os.path.join(os.getcwd(), str(year))
-    print("Year directory:", year_dir)
-    old_cwd = os.getcwd()
-    if not os.path.exists(year_dir):
-        os.mkdir(year_dir)
-    os.chdir(year_dir)
-    
+    if out_dir is None:
+        out_dir = os.getcwd()
+    year_dir = os.path.join(out_dir, str(year))
+    logger.info("Year directory: %s", year_dir)
+    os.makedirs(year_dir, exist_ok=True)
+
+    if output != "csv":
+        season = iter_nrlstats_season(year, base_url, streaming, workers, wayback, ratings)
+        dataset = make_nrlstats_season_dataset(season)
+        with default_metrics.timer("write", table="dataset"):
+            dataset.write(os.path.join(year_dir, "dataset"), output)
+        return
+
     # Get the statistics for the season.
-    get_nrlstats_season_links(season_url, year, base_url)
-    
+    manifest = SeasonManifest(os.path.join(year_dir, "manifest.json"))
+    archive = PageArchive(os.path.join(year_dir, "pages.warc.gz"))
+    get_nrlstats_season_links(season_url, year, base_url, workers, manifest, streaming, year_dir, archive,
+                              parsers, wayback, ratings)
+
     return
-    
-    box_score_links = get_box_score_links(date_url)
-    print("Found box score links:", box_score_links)
 
-        
+def replay_nrlstats_match(task):
+    """
+    Extracts a match from its stored page, in a process of the replay pool. The metrics
+    recorded by the process are returned with the match, for the pool's parent to merge.
+    """
+    match, html, out_dir = task
+    extract_nrlstats_match(match, out_dir, html)
+    return match, default_metrics.take()
+
+def replay_nrlstats_season(year, out_dir=None, processes=None, base_url=None, wayback=None):
+    """
+    Extracts a season again from the pages kept in its archive by extract_nrlstats_season,
+    without downloading anything, for example after fixing a parser bug. The CSV files of
+    each match are rewritten, and the manifest is updated to match. The pages are parsed by
+    a pool of processes, by default one for each core, since parsing is bound by the CPU.
+    A season extracted with a wayback.WaybackIndex must be given the same one, so that its
+    pages are looked up under the URLs they were fetched from.
+    """
+    if base_url is None:
+        base_url = nrlstats_season_base_url(year)
+    if base_url is None:
+        logger.error("Year not supported: %s", year)
+        return
+
+    if out_dir is None:
+        out_dir = os.getcwd()
+    year_dir = os.path.join(out_dir, str(year))
+    archive = PageArchive(os.path.join(year_dir, "pages.warc.gz"))
+
+    season_url = nrlstats_form_season_url(year, base_url)
+    if wayback is not None:
+        season_url = wayback.resolve(season_url)
+    response = archive.get(season_url)
+    if response is None:
+        logger.warning("Season page isn't archived: %s", season_url)
+        return
+    matches = parse_nrlstats_season_matches(response.body, year, base_url, wayback)
+
+    tasks = []
+    for match in matches:
+        response = archive.get(match.url)
+        if response is None:
+            logger.warning("Match page isn't archived: %s", match.url)
+            continue
+        tasks.append((match, response.body, year_dir))
+
+    manifest = SeasonManifest(os.path.join(year_dir, "manifest.json"))
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for match, metrics in executor.map(replay_nrlstats_match, tasks):
+            default_metrics.merge(metrics)
+            manifest.mark_started(match.name, match.url)
+            manifest.mark_complete(match.name, os.path.join(year_dir, match.name))
+
+def replay_box_score(task):
+    """
+    Extracts a box score from its stored page, in a process of the replay pool (see
+    replay_nrlstats_match).
+    """
+    url, html, game_dir = task
+    if not os.path.exists(game_dir):
+        os.makedirs(game_dir)
+    extract_data_from_url(url, out_dir=game_dir, html=html)
+    return url, default_metrics.take()
+
+def get_archived_box_score_days(start_date, end_date, archive, discover=False, index_path=None):
+    """
+    Gets the days between the given dates with the links to their box scores, as (date,
+    links) pairs, without downloading anything. The links are read from the pages of the
+    days kept in the given page_archive.PageArchive, or with discover set, from the schedule
+    index at index_path (by default schedule_index.json here), since the pages of the days
+    aren't fetched then (see extract_box_scores_range).
+    """
+    if discover:
+        if index_path is None:
+            index_path = os.path.join(os.getcwd(), "schedule_index.json")
+        return ScheduleIndex(index_path).get_game_days(start_date, end_date)
+
+    days = []
+    current_date = start_date
+    while current_date <= end_date:
+        date_url = form_date_url(current_date)
+        response = archive.get(date_url)
+        if response is None:
+            logger.warning("Date page isn't archived: %s", date_url)
+        else:
+            days.append((current_date, get_box_score_links(date_url, response.body)))
+        current_date += datetime.timedelta(days=1)
+    return days
+
+def replay_box_scores(start_date, end_date, archive, out_dir=None, processes=None, discover=False,
+                      index_path=None):
+    """
+    Extracts the box scores between the given dates again from the pages kept in the given
+    page_archive.PageArchive by extract_box_scores_range, without downloading anything.
+    The files are written as extract_box_scores writes them, by a pool of processes (see
+    replay_nrlstats_season). A range extracted with discover set must be replayed with it
+    set too, so that the games are listed from the schedule index (by default
+    schedule_index.json in out_dir) that the extraction filled in, since the pages of the
+    days weren't fetched.
+    """
+    if out_dir is None:
+        out_dir = os.getcwd()
+    if discover and index_path is None:
+        index_path = os.path.join(out_dir, "schedule_index.json")
+
+    tasks = []
+    for date, links in get_archived_box_score_days(start_date, end_date, archive, discover, index_path):
+        date_dir = os.path.join(out_dir, date.isoformat())
+        for game_num, box_score_link in enumerate(links):
+            response = archive.get(box_score_link)
+            if response is None:
+                logger.warning("Box score isn't archived: %s", box_score_link)
+                continue
+            tasks.append((box_score_link, response.body, os.path.join(date_dir, str(game_num))))
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for url, metrics in executor.map(replay_box_score, tasks):
+            default_metrics.merge(metrics)
+            logger.info("Replayed: %s", url)
+
+
+def nrlstats_match_payload(match):
+    """
+    Gets the record of a match as a dict that can be stored with a queued job.
+    """
+    payload = match._asdict()
+    payload["date"] = match.date.isoformat()
+    payload["teams"] = list(match.teams)
+    return payload
+
+def nrlstats_match_from_payload(payload):
+    payload = dict(payload)
+    payload["date"] = datetime.date.fromisoformat(payload["date"])
+    payload["teams"] = tuple(payload["teams"])
+    return NrlstatsMatch(**payload)
+
+def queue_nrlstats_season(year, queue, wayback=None):
+    """
+    Queues a job in the given job_queue.JobQueue to extract each match of the given season.
+    Returns the number of jobs queued; matches that were queued before aren't counted. See
+    resolve_nrlstats_season_url for wayback.
+    """
+    base_url = nrlstats_season_base_url(year)
+    if base_url is None:
+        logger.error("Year not supported: %s", year)
+        return 0
+    matches = get_nrlstats_season_matches(year, base_url, wayback)
+    return queue.add_many("nrlstats_match", [(match.url, nrlstats_match_payload(match)) for match in matches])
+
+def queue_box_scores_range(start_date, end_date, queue, index_path=None):
+    """
+    Queues a job in the given job_queue.JobQueue to extract each box score between the
+    given dates, found from the season schedules (see discover_box_scores). The schedule
+    index is kept at index_path, by default schedule_index.json next to the queue. Returns
+    the number of jobs queued.
+    """
+    if index_path is None:
+        index_path = os.path.join(os.path.dirname(queue.path), "schedule_index.json")
+    jobs = []
+    for date, box_score_links in discover_box_scores(start_date, end_date, ScheduleIndex(index_path)):
+        for game_num, box_score_link in enumerate(box_score_links):
+            jobs.append((box_score_link, {"date" : date.isoformat(), "game_num" : game_num}))
+    return queue.add_many("box_score", jobs)
+
+def run_nrlstats_match_job(job, out_dir):
+    """
+    Extracts a queued match into the directory of its season in out_dir, as
+    extract_nrlstats_season does.
+    """
+    match = nrlstats_match_from_payload(job.payload)
+    year_dir = os.path.join(out_dir, str(match.year))
+    if not os.path.exists(year_dir):
+        os.makedirs(year_dir, exist_ok=True)
+    extract_nrlstats_match(match, year_dir)
+
+def run_box_score_job(job, out_dir):
+    """
+    Extracts a queued box score into the directory of its game in out_dir, as
+    extract_box_scores does.
+    """
+    game_dir = os.path.join(out_dir, job.payload["date"], str(job.payload["game_num"]))
+    if not os.path.exists(game_dir):
+        os.makedirs(game_dir, exist_ok=True)
+    extract_data_from_url(job.url, out_dir=game_dir)
+
+# The function that runs each kind of queued job.
+job_runners = {
+    "nrlstats_match" : run_nrlstats_match_job,
+    "box_score" : run_box_score_job,
+}
+
+def run_worker(queue_path, out_dir=None, worker=None, poll_seconds=5):
+    """
+    Works through the jobs in the job_queue.JobQueue at queue_path, writing the files into
+    out_dir (by default, the current working directory), until none are left. Any number of
+    workers can share the queue, from this host or others that share the filesystem. While
+    other workers still hold jobs, it looks again every poll_seconds, so that it can take
+    over the jobs of a worker that dies. Returns the number of jobs it did.
+    """
+    if out_dir is None:
+        out_dir = os.getcwd()
+    if worker is None:
+        worker = make_worker_id()
+    queue = JobQueue(queue_path)
+    jobs_done = 0
+    while True:
+        job = queue.claim(worker, list(job_runners.keys()))
+        if job is None:
+            if queue.is_finished():
+                break
+            time.sleep(poll_seconds)
+            continue
+
+        logger.info("Job %d (attempt %d): %s", job.id, job.attempts, job.url)
+        try:
+            with LeaseKeeper(queue, job) as lease:
+                job_runners[job.kind](job, out_dir)
+        except Exception as e:
+            logger.warning("Job failed: %s: %s", job.url, e)
+            queue.fail(job, e)
+            continue
+        if lease.lost or not queue.complete(job):
+            logger.warning("Lost the lease on job: %s", job.url)
+            continue
+        jobs_done += 1
+    queue.close()
+    return jobs_done
+
+def run_workers(queue_path, processes=None, out_dir=None):
+    """
+    Runs a number of workers on the queue at queue_path in a pool of processes, by
+    default one for each core, until the queue is finished. Returns the number of jobs done.
+    """
+    if processes is None:
+        processes = os.cpu_count()
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        workers = [executor.submit(run_worker, queue_path, out_dir) for i in range(processes)]
+        return sum(worker.result() for worker in workers)
+
+
 if __name__ == "__main__":
 
+    # Progress is logged at the INFO level. Use DEBUG to see each table and row as it is read.
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    # Keep downloaded pages, so that reruns don't download them again.
+    default_client.cache = ResponseCache("http_cache")
+
+    # To find out where the time goes in a stage, profile it (and trace its memory).
+    #default_metrics.profile_stages = {"parse", "write"}
+    #default_metrics.trace_memory = True
+
     # This page gives the listings of games on a given date:
     # Link with two games: "http://www.basketball-reference.com/boxscores/index.cgi?month=5&day=16&year=2013"
     # Link with no games: "http://www.basketball-reference.com/boxscores/index.cgi?month=5&day=17&year=2013"
@@ -675,7 +1531,32 @@ if __name__ == "__main__":
     #extract_nrlstats_season(2008)
     #extract_nrlstats_season(2013)
     extract_nrlstats_season(2015)
+    #extract_nrlstats_season(2015, output="parquet")
+    #extract_nrlstats_season(2015, ratings=RatingEngine("ratings.json"))
+    #follow_nrlstats_season(2015, "live_deltas.jsonl", interval=15)
+    #replay_nrlstats_season(2015)
+    #extract_nrlstats_season(2015, workers=8, parsers=os.cpu_count())
+
+    # The old seasons are read from the Wayback Machine. Resolve their pages to the captures
+    # taken around the snapshots in links.txt, keeping the captures found in wayback.sqlite3.
+    #wayback = WaybackIndex("wayback.sqlite3", read_snapshots("links.txt"))
+    #extract_nrlstats_season(2007, wayback=wayback)
+    #extract_nrlstats_season(2008, wayback=wayback)
+    #wayback.close()
         
     #start_date = datetime.date(2013, 5, 14)
     #end_date = datetime.date(2013, 5, 16) # datetime.date.today()
-    #extract_box_scores_range(start_date, end_date)
\ No newline at end of file
+    #extract_box_scores_range(start_date, end_date)
+    #extract_box_scores_range(datetime.date(2012, 10, 30), datetime.date(2013, 6, 20), discover=True)
+
+    # A backfill spread across workers: queue the jobs once, then run workers on any hosts
+    # that share the queue's directory.
+    #queue = JobQueue("jobs.sqlite3")
+    #for year in [2013, 2014, 2015]:
+    #    queue_nrlstats_season(year, queue)
+    #queue_box_scores_range(datetime.date(2012, 10, 30), datetime.date(2013, 6, 20), queue)
+    #run_workers("jobs.sqlite3")
+    # Write out where the time went, by stage, host and table type.
+    default_metrics.write_json("metrics.json")
+    default_metrics.write_prometheus("metrics.prom")
+    #default_metrics.write_profiles("profiles")
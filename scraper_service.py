@@ -0,0 +1,355 @@
+import argparse
+import datetime
+import http.server
+import itertools
+import json
+import logging
+import os
+import re
+import signal
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import scraper
+from crawl_metrics import default_metrics
+from response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+# Runs scraper.py as a long-running service, so that the modules, the keep-alive connection
+# pool, the response cache and the season listings stay warm between jobs. Jobs are sent
+# to a local HTTP API, on a port or a Unix socket:
+#
+#   POST /jobs       queues a job, given as JSON such as {"kind": "season", "year": 2008},
+#                    or as a command such as "season 2008",
+#                    "box scores 2013-05-14..2013-05-16" or "match <match URL>"
+#   GET /jobs        lists the jobs, and GET /jobs/<id> gets one
+#   GET /status      the counts of jobs in each status, and the throughput since starting
+#   GET /metrics     default_metrics in the Prometheus text format
+#
+# For example:
+#
+#   python scraper_service.py --port 8765 &
+#   curl -d "season 2008" http://127.0.0.1:8765/jobs
+#   curl http://127.0.0.1:8765/status
+
+# The commands that can be sent as text instead of JSON.
+season_command_re = re.compile(r"^season\s+(\d{4})$", re.IGNORECASE)
+box_scores_command_re = re.compile(r"^box[\s_]*scores?\s+(\d{4}-\d{2}-\d{2})(?:\s*\.\.\s*(\d{4}-\d{2}-\d{2}))?$",
+                                   re.IGNORECASE)
+match_command_re = re.compile(r"^(?:match\s+)?(https?://\S+)$", re.IGNORECASE)
+
+def parse_job_command(text):
+    """
+    Parses a job given as a command, such as "season 2008", into its kind and parameters.
+    Raises ValueError if it isn't one.
+    """
+    text = text.strip()
+    match = season_command_re.match(text)
+    if match is not None:
+        return "season", {"year" : int(match.group(1))}
+    match = box_scores_command_re.match(text)
+    if match is not None:
+        return "box_scores", {"start" : match.group(1), "end" : match.group(2) or match.group(1)}
+    match = match_command_re.match(text)
+    if match is not None:
+        return "match", {"url" : match.group(1)}
+    raise ValueError("Unknown job: %s" % text)
+
+class ServiceJob:
+    """
+    A job sent to the service, with its status ("queued", "running", "done" or "failed").
+    """
+    def __init__(self, job_id, kind, params):
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.status = "queued"
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    def to_dict(self):
+        job = {"id" : self.id, "kind" : self.kind, "params" : self.params, "status" : self.status,
+               "submitted" : self.submitted, "started" : self.started, "finished" : self.finished}
+        if self.error is not None:
+            job["error"] = self.error
+        if self.started is not None:
+            job["seconds"] = (self.finished or time.time()) - self.started
+        return job
+
+def run_season_job(service, params):
+    year = int(params["year"])
+    with service.get_season_lock(year):
+        scraper.extract_nrlstats_season(year, workers=int(params.get("workers", service.fetch_workers)),
+                                        out_dir=service.out_dir)
+
+def run_box_scores_job(service, params):
+    start_date = datetime.date.fromisoformat(params["start"])
+    end_date = datetime.date.fromisoformat(params.get("end", params["start"]))
+    scraper.extract_box_scores_range(start_date, end_date, out_dir=service.out_dir,
+                                     discover=bool(params.get("discover", False)))
+
+def run_match_job(service, params):
+    match = service.find_match(params["url"], params.get("year"))
+    year_dir = os.path.join(service.out_dir, str(match.year))
+    with service.get_season_lock(match.year):
+        if not os.path.exists(year_dir):
+            os.makedirs(year_dir, exist_ok=True)
+        # Without a manifest, the match is extracted again even if it was before.
+        scraper.extract_nrlstats_match(match, year_dir)
+
+# The first season that scraper.py can extract.
+first_season = 2007
+
+# The function that runs each kind of job.
+service_job_runners = {
+    "season" : run_season_job,
+    "box_scores" : run_box_scores_job,
+    "match" : run_match_job,
+}
+
+class ScraperService:
+    """
+    Runs the jobs sent to the service on a pool of threads, keeping the jobs and their
+    statuses in memory. Matches are looked up on the season pages, which are kept once
+    fetched, so that a match can be extracted again given only its URL.
+
+    The jobs fetch with scraper.default_client, which is safe to share between threads, and
+    is set up (such as with a response cache) by the caller, as main does. The jobs of a
+    season, and the lookups of its matches, are run one at a time, since they share the
+    season's directory and page.
+    """
+    def __init__(self, out_dir=None, workers=2, fetch_workers=4):
+        if out_dir is None:
+            out_dir = os.getcwd()
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.fetch_workers = fetch_workers
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.job_ids = itertools.count(1)
+        self.season_locks = {}
+        self.season_matches = {}
+        self.started = time.time()
+
+    def submit(self, kind, params):
+        """
+        Queues a job of the given kind. Raises ValueError if the kind isn't known.
+        """
+        kinds = ", ".join(sorted(service_job_runners))
+        if kind is None:
+            raise ValueError("The job has no kind, which must be one of: %s" % kinds)
+        if kind not in service_job_runners:
+            raise ValueError("Unknown kind of job: %s (must be one of: %s)" % (kind, kinds))
+        with self.lock:
+            job = ServiceJob(next(self.job_ids), kind, params)
+            self.jobs[job.id] = job
+        logger.info("Queued job %d: %s %s", job.id, kind, json.dumps(params))
+        self.executor.submit(self.run_job, job)
+        return job
+
+    def run_job(self, job):
+        job.status = "running"
+        job.started = time.time()
+        try:
+            with default_metrics.timer("service_job", kind=job.kind):
+                service_job_runners[job.kind](self, job.params)
+            job.status = "done"
+        except Exception as e:
+            logger.exception("Job %d failed", job.id)
+            job.error = str(e)
+            job.status = "failed"
+        job.finished = time.time()
+        default_metrics.increment("service_jobs", status=job.status, kind=job.kind)
+        logger.info("Job %d %s in %.3f seconds", job.id, job.status, job.finished - job.started)
+
+    def get_job(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self):
+        with self.lock:
+            return [self.jobs[job_id] for job_id in sorted(self.jobs)]
+
+    def get_season_lock(self, year):
+        """
+        Gets the lock held while a season's page is fetched or its files are written.
+        """
+        with self.lock:
+            if year not in self.season_locks:
+                self.season_locks[year] = threading.Lock()
+            return self.season_locks[year]
+
+    def find_match(self, url, year=None):
+        """
+        Gets the record of the match at the given URL from the season pages, fetching the
+        season page again if the match isn't on the copy that is kept. Without a year, the
+        seasons whose sites the URL is on are searched. Raises ValueError if it isn't found.
+
+        A season page is only fetched by one job at a time, and a job waiting for another to
+        fetch it uses that copy rather than fetching it again.
+        """
+        if year is not None:
+            years = [int(year)]
+        else:
+            years = [season for season in range(first_season, datetime.date.today().year + 1)
+                     if url.startswith(scraper.nrlstats_season_base_url(season) or "//")]
+        fetched = set()
+        searched = {}
+        for refresh in [False, True]:
+            for season in years:
+                with self.get_season_lock(season):
+                    matches = self.season_matches.get(season)
+                    # On the second pass, the page is only fetched again if no other job has
+                    # fetched it since it was searched.
+                    if matches is None or (refresh and season not in fetched and matches is searched.get(season)):
+                        matches = scraper.get_nrlstats_season_matches(season)
+                        fetched.add(season)
+                        self.season_matches[season] = matches
+                searched[season] = matches
+                for match in matches:
+                    if match.url == url:
+                        return match
+        raise ValueError("Match isn't on the season pages: %s" % url)
+
+    def get_status(self):
+        """
+        Gets the counts of the jobs in each status, and the throughput since the service
+        started.
+        """
+        counts = {"queued" : 0, "running" : 0, "done" : 0, "failed" : 0}
+        for job in self.list_jobs():
+            counts[job.status] += 1
+        uptime = time.time() - self.started
+        pages = default_metrics.get_total("pages_fetched")
+        return {
+            "uptime" : uptime,
+            "jobs" : counts,
+            "pages_fetched" : pages,
+            "fetch_bytes" : default_metrics.get_total("fetch_bytes"),
+            "cache_hits" : default_metrics.get_total("cache_hits"),
+            "pages_per_sec" : pages / uptime if uptime > 0 else 0.0,
+            "jobs_per_min" : (counts["done"] + counts["failed"]) * 60.0 / uptime if uptime > 0 else 0.0,
+        }
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+class ServiceHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves the API of the ScraperService kept on the server.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def send_body(self, status, body, content_type="application/json"):
+        if not isinstance(body, bytes):
+            body = (json.dumps(body, indent=1) + "\n").encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        service = self.server.service
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/status":
+            self.send_body(200, service.get_status())
+        elif path == "/jobs":
+            self.send_body(200, [job.to_dict() for job in service.list_jobs()])
+        elif path.startswith("/jobs/") and path[len("/jobs/"):].isdigit():
+            job = service.get_job(int(path[len("/jobs/"):]))
+            if job is None:
+                self.send_body(404, {"error" : "No such job"})
+            else:
+                self.send_body(200, job.to_dict())
+        elif path == "/metrics":
+            self.send_body(200, default_metrics.format_prometheus().encode("utf-8"),
+                           "text/plain; version=0.0.4")
+        else:
+            self.send_body(404, {"error" : "Not found"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            self.send_body(404, {"error" : "Not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        text = self.rfile.read(length).decode("utf-8")
+        try:
+            if text.lstrip().startswith("{"):
+                params = json.loads(text)
+                kind = params.pop("kind", None)
+            else:
+                kind, params = parse_job_command(text)
+            job = self.server.service.submit(kind, params)
+        except ValueError as e:
+            self.send_body(400, {"error" : str(e)})
+            return
+        self.send_body(202, job.to_dict())
+
+    def log_message(self, format, *args):
+        logger.debug("%s", format % args)
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    An HTTP server on a Unix socket, which only local users with access to the socket file
+    can reach.
+    """
+    daemon_threads = True
+
+    def get_request(self):
+        request, client_address = socketserver.UnixStreamServer.get_request(self)
+        # BaseHTTPRequestHandler expects a (host, port) address.
+        return request, ("local", 0)
+
+def make_server(service, host="127.0.0.1", port=8765, socket_path=None):
+    """
+    Makes the HTTP server of the service, on a Unix socket if socket_path is given, and on
+    the given host and port otherwise.
+    """
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, ServiceHandler)
+    else:
+        server = http.server.ThreadingHTTPServer((host, port), ServiceHandler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the scraper as a service, taking jobs over a local API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="listen on this Unix socket instead of a port")
+    parser.add_argument("--out-dir", help="where the extracted stats are written (default: here)")
+    parser.add_argument("--workers", type=int, default=2, help="jobs run at once (default 2)")
+    parser.add_argument("--cache-dir", default="http_cache", help="the response cache (default http_cache)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    scraper.default_client.cache = ResponseCache(args.cache_dir)
+    service = ScraperService(args.out_dir, args.workers)
+    server = make_server(service, args.host, args.port, args.socket)
+    # Stop cleanly when the service manager asks, as on Ctrl-C.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    logger.info("Listening on %s", args.socket or "%s:%d" % (args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+        if args.socket is not None and os.path.exists(args.socket):
+            os.remove(args.socket)
+        default_metrics.write_json(os.path.join(service.out_dir, "metrics.json"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import os
+import re
+import shutil
+
+try:
+    import pyarrow
+    import pyarrow.dataset
+except ImportError:
+    # pyarrow is only needed to write and read the columnar output.
+    pyarrow = None
+
+# The file formats a season dataset can be written in, and the pyarrow name of each.
+dataset_formats = {
+    "parquet" : "parquet",
+    "arrow" : "ipc",
+}
+
+# Cell values that mean a stat wasn't recorded.
+null_values = ("", "-", "--", "n/a", "N/A")
+
+# A single number in a cell, such as 14, 86% or 14 (318m).
+number_pattern = re.compile(r"^(-?\d+(?:\.\d+)?)\s*(%)?(?:\s*\(\s*(-?\d+(?:\.\d+)?)\s*m\s*\))?$")
+
+# The separator between the parts of a compound cell, such as "25 (510m) | 1 | 3", which
+# table_extract.get_cell_text joins the lines of a cell with.
+compound_separator = " | "
+
+# A comma used as a thousands separator, such as in 1,307.
+thousands_pattern = re.compile(r"(?<=\d),(?=\d{3}(?!\d))")
+
+def to_number(text):
+    if "." in text:
+        return float(text)
+    return int(text)
+
+def parse_stat_value(text):
+    """
+    Parses the text of a stat cell into its numbers. Returns a list of (suffix, number)
+    pairs, where the suffix names the part of the cell the number came from, an empty list
+    if the stat wasn't recorded, or None if the cell isn't numeric.
+
+    A plain number has the suffix "", a percentage "_percent", and the metres of a cell such
+    as "14 (318m)" "_metres". The parts of a compound cell such as "14 (318m) | 0 | 2" are
+    numbered, giving "_1", "_1_metres", "_2" and "_3".
+    """
+    text = text.strip()
+    if text in null_values:
+        return []
+    text = thousands_pattern.sub("", text)
+    parts = text.split(compound_separator)
+
+    numbers = []
+    for part_num, part in enumerate(parts):
+        match = number_pattern.match(part)
+        if match is None:
+            return None
+        prefix = ""
+        if len(parts) > 1:
+            prefix = "_" + str(part_num + 1)
+        value, percent, metres = match.groups()
+        if percent:
+            numbers.append((prefix + "_percent", to_number(value)))
+        else:
+            numbers.append((prefix, to_number(value)))
+        if metres is not None:
+            numbers.append((prefix + "_metres", to_number(metres)))
+    return numbers
+
+def make_column_name(heading):
+    """
+    Converts the heading of a stat, such as "Line Breaks" or "Poss %", to a column name,
+    such as line_breaks or poss_percent.
+    """
+    name = heading.lower().replace("%", " percent")
+    name = re.sub(r"[^0-9a-z]+", "_", name).strip("_")
+    if name == "":
+        name = "stat"
+    if name[0].isdigit():
+        name = "stat_" + name
+    return name
+
+def make_stat_columns(stat_rows, names):
+    """
+    Turns the stats of each row (a dict of column name to cell text) into typed columns.
+    A stat whose cells are all numeric is split into a numeric column for each part of its
+    cells (see parse_stat_value), and any other stat is kept as a column of text.
+    """
+    columns = {}
+    for name in names:
+        texts = [stats.get(name) for stats in stat_rows]
+        parsed = []
+        for text in texts:
+            if text is None:
+                parsed.append([])
+                continue
+            numbers = parse_stat_value(text)
+            if numbers is None:
+                break
+            parsed.append(numbers)
+
+        if len(parsed) < len(texts):
+            # Some cell isn't numeric, so keep the text.
+            columns[name] = [text if text is None or text.strip() not in null_values else None
+                             for text in texts]
+            continue
+
+        suffixes = []
+        for numbers in parsed:
+            for suffix, number in numbers:
+                if suffix not in suffixes:
+                    suffixes.append(suffix)
+        for suffix in suffixes:
+            values = [dict(numbers).get(suffix) for numbers in parsed]
+            if any(isinstance(value, float) for value in values):
+                values = [float(value) if value is not None else None for value in values]
+            columns[name + suffix] = values
+    return columns
+
+class SeasonDataset:
+    """
+    Collects the stats of a season into three tables, and writes them as a columnar
+    dataset (Parquet or Arrow) that can be loaded in one read:
+
+    - match: one row per match, with its date, round, teams and score.
+    - player: one row per player per period of each match, with the stats of all of the
+      categories (summary, points, runs, tackles and kicks) side by side.
+    - team: one row per team per period of each match, with its team and game stats. The
+      two tables share their stat names, so the game stats are prefixed with game_.
+
+    The player and team tables are partitioned by period.
+    """
+    def __init__(self):
+        self.matches = []
+        self.player_stats = {}
+        self.player_names = []
+        self.team_stats = {}
+        self.team_names = []
+
+    def add_match(self, match):
+        score_1 = score_2 = None
+        if match.score:
+            scores = re.findall(r"\d+", match.score)
+            if len(scores) == 2:
+                score_1, score_2 = int(scores[0]), int(scores[1])
+        self.matches.append({
+            "match" : match.name,
+            "year" : match.year,
+            "date" : match.date,
+            "round" : match.round,
+            "team_1" : match.teams[0],
+            "team_2" : match.teams[1],
+            "score_1" : score_1,
+            "score_2" : score_2,
+            "status" : match.status,
+            "url" : match.url,
+        })
+
+    def add_stats(self, rows, names, key, heading, text):
+        if key not in rows:
+            rows[key] = {}
+        name = make_column_name(heading)
+        if name in ("match", "date", "period", "team", "player"):
+            name += "_stat"
+        if name not in names:
+            names.append(name)
+        # Stats such as Mins appear in more than one category. The first one is kept.
+        if name not in rows[key]:
+            rows[key][name] = text
+
+    def add_player_stats(self, record):
+        """
+        Adds the stats of an NrlstatsPlayerStats record.
+        """
+        key = (record.match.name, record.match.date, record.period, record.team, record.player)
+        for heading, text in record.stats.items():
+            self.add_stats(self.player_stats, self.player_names, key, heading, text)
+
+    def add_team_stat(self, record):
+        """
+        Adds the values of an NrlstatsTeamStat record to the rows of both teams.
+        """
+        heading = record.stat
+        if record.kind == "game":
+            heading = "Game " + heading
+        for team, text in zip(record.match.teams, record.values):
+            key = (record.match.name, record.match.date, record.period, team)
+            self.add_stats(self.team_stats, self.team_names, key, heading, text)
+
+    def get_columns(self, table):
+        """
+        Gets the given table ("match", "player" or "team") as a dict of column name to list
+        of values.
+        """
+        if table == "match":
+            columns = {}
+            for name in ["match", "year", "date", "round", "team_1", "team_2", "score_1", "score_2", "status", "url"]:
+                columns[name] = [row[name] for row in self.matches]
+            return columns
+
+        if table == "player":
+            rows, names = self.player_stats, self.player_names
+            key_names = ["match", "date", "period", "team", "player"]
+        else:
+            rows, names = self.team_stats, self.team_names
+            key_names = ["match", "date", "period", "team"]
+
+        keys = list(rows.keys())
+        columns = {}
+        for key_num, name in enumerate(key_names):
+            columns[name] = [key[key_num] for key in keys]
+        columns.update(make_stat_columns([rows[key] for key in keys], names))
+        return columns
+
+    def write(self, path, format="parquet"):
+        """
+        Writes the dataset to the directory at path, replacing any dataset already there,
+        with a subdirectory for each table.
+        """
+        if pyarrow is None:
+            raise ImportError("pyarrow is needed to write a season dataset (pip install pyarrow)")
+
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        for table in ["match", "player", "team"]:
+            partitioning = None
+            if table != "match":
+                partitioning = pyarrow.dataset.partitioning(
+                    pyarrow.schema([("period", pyarrow.string())]), flavor="hive")
+            pyarrow.dataset.write_dataset(
+                pyarrow.table(self.get_columns(table)), os.path.join(tmp_path, table),
+                format=dataset_formats[format], partitioning=partitioning,
+                basename_template="part-{i}." + format)
+            # Nothing is written for a table with no rows, but a reader expects its directory.
+            os.makedirs(os.path.join(tmp_path, table), exist_ok=True)
+
+        # Swap the new dataset in, so a reader never sees half of one.
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+def read_season_dataset(path, table, format="parquet"):
+    """
+    Reads a table ("match", "player" or "team") of a season dataset written by
+    SeasonDataset.write, returning a pyarrow Table. Call to_pandas on it for a DataFrame.
+    A table with no rows, such as the player table of a season without player stats, is
+    read as an empty table of its key columns.
+    """
+    if pyarrow is None:
+        raise ImportError("pyarrow is needed to read a season dataset (pip install pyarrow)")
+    table_path = os.path.join(path, table)
+    if os.path.isdir(table_path):
+        dataset = pyarrow.dataset.dataset(table_path, format=dataset_formats[format], partitioning="hive")
+        if dataset.files:
+            return dataset.to_table()
+    return pyarrow.table(SeasonDataset().get_columns(table))
@@ -0,0 +1,156 @@
+import hashlib
+import http.server
+import json
+import os
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+# A local server that stands in for the sites scraper.py reads, serving the fixture pages in
+# benchmarks/fixtures (see benchmarks/make_fixtures.py). The benchmarks and the tests point
+# http_client at it by resolving the hosts of the fixture pages to it.
+
+fixtures_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "fixtures")
+
+# The CDX server of the Wayback Machine, which the stand-in server also stands in for.
+cdx_url = "http://web.archive.org/cdx/search/cdx"
+
+# How the stand-in server throttles in the throttled cases.
+throttle_settings = {
+    "max_in_flight" : 2,
+    "retry_after" : 1,
+    "fail_every" : 7,
+    "latency_per_request" : 0.01,
+}
+
+def load_pages():
+    with open(os.path.join(fixtures_dir, "pages.json")) as f:
+        return json.load(f)
+
+def load_captures():
+    with open(os.path.join(fixtures_dir, "captures.json")) as f:
+        return json.load(f)
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves the fixture pages, choosing the page by the Host header and path of the request,
+    as http_client sends them for a resolved host.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        http.server.BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        url = "http://" + self.headers.get("Host", "") + self.path
+        location = self.server.redirects.get(url)
+        if location is not None:
+            self.send_response(302)
+            self.send_header("Location", location)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = self.server.bodies.get(url)
+        if body is None and url.startswith(cdx_url + "?"):
+            body = self.get_cdx_body(parse_qs(urlsplit(url).query))
+        if body is None:
+            self.send_error(404)
+            return
+        with self.server.lock:
+            self.server.in_flight += 1
+            self.server.received += 1
+            in_flight = self.server.in_flight
+            received = self.server.received
+        try:
+            if self.server.throttle and self.throttle(in_flight, received):
+                with self.server.lock:
+                    self.server.throttled += 1
+                return
+        finally:
+            with self.server.lock:
+                self.server.in_flight -= 1
+        with self.server.lock:
+            self.server.requests += 1
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            with self.server.lock:
+                self.server.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def get_cdx_body(self, query):
+        """
+        Lists the fixture captures of the URLs with the given prefix, a page at a time, as
+        the CDX server of the Wayback Machine does with output=json and showResumeKey.
+        """
+        from wayback import url_key
+        prefix = url_key(query["url"][0])
+        fields = query["fl"][0].split(",")
+        captures = sorted(capture for capture in load_captures() if url_key(capture[1]).startswith(prefix))
+        start = int(query.get("resumeKey", ["0"])[0])
+        limit = int(query.get("limit", [str(len(captures))])[0])
+        values = {"statuscode" : "200", "digest" : "", "length" : "0"}
+        rows = [fields]
+        for timestamp, original, name in captures[start:start + limit]:
+            values.update(timestamp=timestamp, original=original)
+            rows.append([values[field] for field in fields])
+        if start + limit < len(captures):
+            rows.extend([[], [str(start + limit)]])
+        return json.dumps(rows).encode("utf-8")
+
+    def throttle(self, in_flight, received):
+        """
+        Throttles the request as an overloaded site would, returning whether it was refused.
+        """
+        time.sleep(throttle_settings["latency_per_request"] * in_flight)
+        if in_flight > throttle_settings["max_in_flight"]:
+            self.send_response(429)
+            self.send_header("Retry-After", str(throttle_settings["retry_after"]))
+        elif received % throttle_settings["fail_every"] == 0:
+            self.send_response(503)
+        else:
+            return False
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        return True
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stand_in_server():
+    """
+    Starts the stand-in server on a free local port, in a background thread.
+    """
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.requests = 0
+    server.received = 0
+    server.in_flight = 0
+    server.throttled = 0
+    server.not_modified = 0
+    server.throttle = False
+    server.bodies = {}
+    # The URLs that are redirected, to the URL they are redirected to.
+    server.redirects = {}
+    for url, name in load_pages().items():
+        with open(os.path.join(fixtures_dir, name), 'rb') as f:
+            server.bodies[url] = f.read()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def read_fixture(name):
+    with open(os.path.join(fixtures_dir, name), 'rb') as f:
+        return f.read()
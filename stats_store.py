@@ -0,0 +1,209 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+
+from records import NrlstatsPlayerStats, NrlstatsTeamStat, NrlstatsScorecardRow
+from season_dataset import parse_stat_value
+
+# The rows returned by the queries of StatsStore. value is the text of the cell, and number
+# is its value when the cell holds a single number (None otherwise).
+PlayerStatRow = namedtuple('PlayerStatRow', ['match', 'season', 'date', 'period', 'category', 'team', 'player', 'stat', 'value', 'number'])
+TeamStatRow = namedtuple('TeamStatRow', ['match', 'season', 'date', 'kind', 'period', 'team', 'stat', 'value', 'number'])
+BoxScoreRow = namedtuple('BoxScoreRow', ['game', 'date', 'url', 'table_id', 'row_num', 'values'])
+
+schema = [
+    "CREATE TABLE IF NOT EXISTS matches ("
+    " match TEXT PRIMARY KEY, season INTEGER, date TEXT, round TEXT,"
+    " team_1 TEXT, team_2 TEXT, score TEXT, status TEXT, url TEXT)",
+
+    "CREATE TABLE IF NOT EXISTS player_stats ("
+    " match TEXT, season INTEGER, date TEXT, period TEXT, category TEXT, team TEXT,"
+    " player TEXT, stat TEXT, value TEXT, number REAL,"
+    " PRIMARY KEY (match, period, category, team, player, stat))",
+
+    "CREATE TABLE IF NOT EXISTS team_stats ("
+    " match TEXT, season INTEGER, date TEXT, kind TEXT, period TEXT, team TEXT,"
+    " stat TEXT, value TEXT, number REAL,"
+    " PRIMARY KEY (match, kind, period, team, stat))",
+
+    "CREATE TABLE IF NOT EXISTS scorecard ("
+    " match TEXT, row_num INTEGER, row_values TEXT,"
+    " PRIMARY KEY (match, row_num))",
+
+    "CREATE TABLE IF NOT EXISTS box_score_rows ("
+    " game TEXT, date TEXT, url TEXT, table_id TEXT, row_num INTEGER, row_values TEXT,"
+    " PRIMARY KEY (game, table_id, row_num))",
+
+    "CREATE INDEX IF NOT EXISTS player_stats_lookup ON player_stats (season, date, team, period, player)",
+    "CREATE INDEX IF NOT EXISTS player_stats_category ON player_stats (season, team, period, category)",
+    "CREATE INDEX IF NOT EXISTS team_stats_lookup ON team_stats (season, date, team, period)",
+    "CREATE INDEX IF NOT EXISTS box_score_rows_date ON box_score_rows (date, table_id)",
+]
+
+def get_number(value):
+    """
+    Gets the number in a cell that holds a single number, or None.
+    """
+    numbers = parse_stat_value(value)
+    if numbers is not None and len(numbers) == 1:
+        return numbers[0][1]
+    return None
+
+def get_box_score_game(url):
+    """
+    Gets the key of a basketball-reference game from its URL, such as 201305140SAS.
+    """
+    return os.path.splitext(url.rstrip("/").split("/")[-1])[0]
+
+def make_where(conditions):
+    """
+    Forms the WHERE clause and parameters that match the columns given in conditions, a
+    dict of column name to value. Columns whose value is None aren't matched on.
+    """
+    clauses = []
+    params = []
+    for name, value in conditions.items():
+        if value is None:
+            continue
+        if hasattr(value, "isoformat"):
+            # Dates are stored in ISO format.
+            value = value.isoformat()
+        clauses.append(name + " = ?")
+        params.append(value)
+    if len(clauses) == 0:
+        return "", params
+    return " WHERE " + " AND ".join(clauses), params
+
+class StatsStore:
+    """
+    An SQLite database of extracted stats, as an alternative to the CSV files. Each match
+    (or basketball-reference game) is stored under its key, and storing it again replaces
+    its rows, so extracting a season twice leaves the database as it was.
+
+    Matches are written in batches of batch_size per transaction. Call commit (or close)
+    when done, so the last batch is saved.
+    """
+    def __init__(self, path, batch_size=20):
+        self.path = os.path.abspath(path)
+        self.batch_size = batch_size
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        for statement in schema:
+            self.db.execute(statement)
+        self.db.commit()
+
+    def added(self):
+        # Must be called with the lock held.
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.db.commit()
+            self.pending = 0
+
+    def add_nrlstats_match(self, match, records):
+        """
+        Stores a match and its records (see scraper.iter_nrlstats_records), replacing
+        anything stored for the match before.
+        """
+        date = match.date.isoformat()
+        player_rows = []
+        team_rows = []
+        scorecard_rows = []
+        for record in records:
+            if isinstance(record, NrlstatsPlayerStats):
+                for stat, value in record.stats.items():
+                    player_rows.append((match.name, match.year, date, record.period, record.category,
+                                        record.team, record.player, stat, value, get_number(value)))
+            elif isinstance(record, NrlstatsTeamStat):
+                for team, value in zip(match.teams, record.values):
+                    team_rows.append((match.name, match.year, date, record.kind, record.period,
+                                      team, record.stat, value, get_number(value)))
+            elif isinstance(record, NrlstatsScorecardRow):
+                scorecard_rows.append((match.name, len(scorecard_rows), json.dumps(record.values)))
+
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO matches VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (match.name, match.year, date, match.round, match.teams[0], match.teams[1],
+                 match.score, match.status, match.url))
+            for table in ["player_stats", "team_stats", "scorecard"]:
+                self.db.execute("DELETE FROM " + table + " WHERE match = ?", (match.name,))
+            self.db.executemany(
+                "INSERT OR REPLACE INTO player_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", player_rows)
+            self.db.executemany(
+                "INSERT OR REPLACE INTO team_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", team_rows)
+            self.db.executemany(
+                "INSERT OR REPLACE INTO scorecard VALUES (?, ?, ?)", scorecard_rows)
+            self.added()
+
+    def add_box_score(self, url, date, tables):
+        """
+        Stores the stats tables (see scraper.iter_stats_tables) of a basketball-reference
+        game played on the given date, replacing anything stored for the game before.
+        """
+        game = get_box_score_game(url)
+        rows = []
+        for table in tables:
+            for row_num, cells in enumerate(table.rows):
+                values = ["".join(cell[1]) for cell in cells]
+                rows.append((game, date.isoformat(), url, table.id, row_num, json.dumps(values)))
+
+        with self.lock:
+            self.db.execute("DELETE FROM box_score_rows WHERE game = ?", (game,))
+            self.db.executemany("INSERT OR REPLACE INTO box_score_rows VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self.added()
+
+    def has_match(self, match_name):
+        with self.lock:
+            row = self.db.execute("SELECT 1 FROM matches WHERE match = ?", (match_name,)).fetchone()
+        return row is not None
+
+    def query_player_stats(self, season=None, date=None, team=None, period=None, player=None,
+                           category=None, stat=None):
+        """
+        Gets the player stats that match all of the given arguments. For example, all of the
+        second half tackle stats for Wests in 2015 are given by
+        query_player_stats(season=2015, team="Wests", period="second_half", category="tackles").
+        """
+        where, params = make_where({"season" : season, "date" : date, "team" : team, "period" : period,
+                                    "player" : player, "category" : category, "stat" : stat})
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT match, season, date, period, category, team, player, stat, value, number"
+                " FROM player_stats" + where + " ORDER BY date, match, team, player", params).fetchall()
+        return [PlayerStatRow(*row) for row in rows]
+
+    def query_team_stats(self, season=None, date=None, team=None, period=None, kind=None, stat=None):
+        """
+        Gets the team and game stats that match all of the given arguments.
+        """
+        where, params = make_where({"season" : season, "date" : date, "team" : team, "period" : period,
+                                    "kind" : kind, "stat" : stat})
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT match, season, date, kind, period, team, stat, value, number"
+                " FROM team_stats" + where + " ORDER BY date, match, team", params).fetchall()
+        return [TeamStatRow(*row) for row in rows]
+
+    def query_box_scores(self, date=None, game=None, table_id=None):
+        """
+        Gets the rows of the basketball-reference tables that match all of the given arguments.
+        """
+        where, params = make_where({"date" : date, "game" : game, "table_id" : table_id})
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT game, date, url, table_id, row_num, row_values FROM box_score_rows" + where +
+                " ORDER BY date, game, table_id, row_num", params).fetchall()
+        return [BoxScoreRow(*(row[:5] + (json.loads(row[5]),))) for row in rows]
+
+    def commit(self):
+        with self.lock:
+            self.db.commit()
+            self.pending = 0
+
+    def close(self):
+        with self.lock:
+            self.db.commit()
+            self.db.close()
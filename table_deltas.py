@@ -0,0 +1,80 @@
+import datetime
+import json
+import os
+import threading
+
+def get_row_keys(rows):
+    """
+    Gets a key for each row of a table, made from its first value, such as a player's name
+    or a stat, so that a row keeps its key when rows are added above it. Rows with the same
+    first value are told apart by a count, such as "Smith#2".
+    """
+    keys = []
+    seen = {}
+    for values in rows:
+        key = values[0] if len(values) > 0 else ""
+        count = seen.get(key, 0) + 1
+        seen[key] = count
+        if count > 1:
+            key += "#" + str(count)
+        keys.append(key)
+    return keys
+
+def diff_rows(old_rows, new_rows):
+    """
+    Compares two versions of a table, each a list of rows of values. Returns the changes,
+    as (op, key, values, previous values) tuples in the order of the new table, where op is
+    "add", "change" or "remove", and the previous values are None for an added row. The
+    removed rows come last.
+    """
+    old = dict(zip(get_row_keys(old_rows), old_rows))
+    new_keys = get_row_keys(new_rows)
+    changes = []
+    for key, values in zip(new_keys, new_rows):
+        previous = old.pop(key, None)
+        if previous is None:
+            changes.append(("add", key, values, None))
+        elif previous != values:
+            changes.append(("change", key, values, previous))
+    for key, previous in old.items():
+        changes.append(("remove", key, None, previous))
+    return changes
+
+class DeltaStream:
+    """
+    Appends the row changes of live tables to a file as JSON lines, one change to a line,
+    flushing after each batch so that a reader tailing the file sees them at once. It is
+    safe to share between threads.
+    """
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.f = open(path, 'a')
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def append(self, source, table, changes):
+        """
+        Appends the changes from diff_rows to a table of the given source, such as a match.
+        """
+        if len(changes) == 0:
+            return
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="milliseconds")
+        lines = []
+        for op, key, values, previous in changes:
+            delta = {"time" : now, "source" : source, "table" : table, "op" : op, "key" : key}
+            if values is not None:
+                delta["values"] = values
+            if previous is not None:
+                delta["previous"] = previous
+            lines.append(json.dumps(delta) + "\n")
+        with self.lock:
+            self.f.write("".join(lines))
+            self.f.flush()
+            self.count += len(lines)
+
+    def close(self):
+        with self.lock:
+            self.f.close()
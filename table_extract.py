@@ -0,0 +1,81 @@
+import csv
+import io
+
+# The cells of a table are (tag name, strings, colspan, rowspan) tuples, as made by the
+# parsers in html_parsers or by html_stream from a streamed page. The functions here turn
+# the rows of such cells into rows of values, and write them to CSV files.
+
+def get_cell_text(cell, separator=" | "):
+    """
+    Gets the text of a cell, joining its separate strings (such as lines broken with <br>)
+    with the given separator.
+    """
+    return separator.join([x.strip() for x in cell[1] if x.strip() != ""])
+
+def get_raw_cell_text(cell):
+    """
+    Gets the text of a cell with its strings run together, as they appear on the page.
+    """
+    return "".join(cell[1]).strip()
+
+def expand_spans(rows):
+    """
+    Lays the cells of a table out on a grid, so that each cell fills exactly one column of
+    one row. A cell that spans several columns is followed by empty cells of the same tag,
+    and a cell that spans several rows is repeated in the rows below it.
+    """
+    grid = []
+    # The cells spanning down into later rows, by column, with the number of rows left.
+    spanning = {}
+
+    def take_spanning(column):
+        cell, rows_left = spanning[column]
+        if rows_left == 1:
+            del spanning[column]
+        else:
+            spanning[column] = (cell, rows_left - 1)
+        return cell
+
+    for cells in rows:
+        row = []
+        column = 0
+        for tag, strings, colspan, rowspan in cells:
+            while column in spanning:
+                row.append(take_spanning(column))
+                column += 1
+            for i in range(colspan):
+                if i == 0:
+                    cell = (tag, strings, 1, 1)
+                else:
+                    cell = (tag, [], 1, 1)
+                row.append(cell)
+                if rowspan > 1:
+                    spanning[column] = (cell, rowspan - 1)
+                column += 1
+        while column in spanning:
+            row.append(take_spanning(column))
+            column += 1
+        grid.append(row)
+    return grid
+
+def get_table_values(rows, row_values):
+    """
+    Gets the values of each row of a table as a tuple, by laying the table out with
+    expand_spans and calling row_values on the cells of each row.
+    """
+    return [tuple(row_values(cells)) for cells in expand_spans(rows)]
+
+def write_csv_rows(file, rows, batch_size=256):
+    """
+    Writes rows of values to an open text file as CSV, quoting the values that need it.
+    The rows are formatted into a buffer and written batch_size rows at a time.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for row_num, row in enumerate(rows):
+        writer.writerow(row)
+        if (row_num + 1) % batch_size == 0:
+            file.write(buffer.getvalue())
+            buffer.seek(0)
+            buffer.truncate()
+    file.write(buffer.getvalue())
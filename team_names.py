@@ -0,0 +1,42 @@
+import re
+
+# The name each NRL club is known by in this project (the name nrlstats.com uses in its
+# match links), with every other name it goes by in the scraped pages and the betting data.
+team_name_aliases = {
+    "Brisbane" : ["Brisbane Broncos", "Broncos"],
+    "Canberra" : ["Canberra Raiders", "Raiders"],
+    "CanterburyBankstown" : ["Canterbury-Bankstown", "Canterbury Bankstown", "Canterbury",
+                             "Canterbury Bulldogs", "Canterbury-Bankstown Bulldogs", "Bulldogs"],
+    "Cronulla" : ["Cronulla Sharks", "Cronulla-Sutherland", "Cronulla-Sutherland Sharks", "Sharks"],
+    "GoldCoast" : ["Gold Coast", "Gold Coast Titans", "Titans"],
+    "Manly" : ["Manly Sea Eagles", "Manly-Warringah", "Manly-Warringah Sea Eagles", "Sea Eagles"],
+    "Melbourne" : ["Melbourne Storm", "Storm"],
+    "NewZealand" : ["Warriors", "New Zealand", "New Zealand Warriors"],
+    "Newcastle" : ["Newcastle Knights", "Knights"],
+    "NorthQueensland" : ["North Queensland", "North Queensland Cowboys", "North QLD", "North QLD Cowboys",
+                         "Cowboys"],
+    "Parramatta" : ["Parramatta Eels", "Eels"],
+    "Penrith" : ["Penrith Panthers", "Panthers"],
+    "SouthSydney" : ["South Sydney", "South Sydney Rabbitohs", "Rabbitohs", "Souths"],
+    "StGeorgeIllawarra" : ["St George Illawarra", "St. George Illawarra", "St George Illawarra Dragons",
+                           "St. George Illawarra Dragons", "St George Dragons", "St. George Dragons", "Dragons"],
+    "Sydney" : ["Sydney Roosters", "Roosters", "Eastern Suburbs"],
+    "Wests" : ["Wests Tigers", "Tigers"],
+}
+
+def make_team_name_key(name):
+    return re.sub(r"\s+", " ", name.strip()).lower()
+
+# The name of each club, by the key (see make_team_name_key) of each of its names.
+team_names = {}
+for team, aliases in team_name_aliases.items():
+    for alias in [team] + aliases:
+        team_names[make_team_name_key(alias)] = team
+
+def normalise_team_name(name):
+    """
+    Gets the name a club is known by in this project from any of its names, ignoring case
+    and spacing. Names that aren't known, such as those of representative sides, are
+    returned as they are, without the spaces around them.
+    """
+    return team_names.get(make_team_name_key(name), name.strip())
@@ -0,0 +1,287 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+from collections import namedtuple
+
+try:
+    import numpy
+except ImportError:
+    # numpy is only needed to fit the ratings.
+    numpy = None
+
+from team_names import normalise_team_name, team_name_aliases
+
+logger = logging.getLogger(__name__)
+
+# The result of a match. round is the label of the round it was played in, such as
+# "Round 1" or "25".
+MatchResult = namedtuple('MatchResult', ['season', 'round', 'date', 'home', 'away', 'home_score', 'away_score'])
+
+# The ratings fitted to the results up to the end of a round. attack and defence map each
+# team to its rating, and the expected score of a team at home is
+# exp(intercept + home + attack[team] + defence[opponent]), and away is the same without
+# home. games is the number of results the ratings were fitted to.
+TeamRatings = namedtuple('TeamRatings', ['season', 'round', 'date', 'intercept', 'home', 'attack', 'defence',
+                                         'log_likelihood', 'iterations', 'games'])
+
+# A score on the season page of nrlstats.com, such as "12 - 47".
+nrlstats_score_re = re.compile(r"^\s*(\d+)\s*-\s*(\d+)\s*$")
+
+# The statuses of a match on the season page once it has finished, in lower case. Any
+# other status, such as "Half Time" while a match is being played, means its score isn't
+# final.
+full_time_statuses = {"full time", "fulltime", "ft", "final"}
+
+# The largest score summed over when pricing a match.
+max_price_score = 120
+
+def require_numpy():
+    if numpy is None:
+        raise ImportError("numpy is needed to fit team ratings (pip install numpy)")
+
+def results_from_nrlstats_matches(matches):
+    """
+    Gets the results of the matches listed on an nrlstats season page (see
+    scraper.get_nrlstats_season_matches) that have finished, taking the first team as the
+    home team. Matches still being played are left out, although they have a score.
+    """
+    results = []
+    for match in matches:
+        if (match.status or "").strip().lower() not in full_time_statuses:
+            continue
+        score = nrlstats_score_re.match(match.score or "")
+        if score is None:
+            continue
+        home, away = [normalise_team_name(team) for team in match.teams]
+        results.append(MatchResult(match.year, str(match.round), match.date, home, away,
+                                   int(score.group(1)), int(score.group(2))))
+    return results
+
+def results_from_match_table(frame):
+    """
+    Gets the results in a match table read by match_loader.read_match_table.
+    """
+    results = []
+    for row in frame.itertuples(index=False):
+        if math.isnan(row.home_score) or math.isnan(row.away_score):
+            continue
+        date = row.date.date()
+        results.append(MatchResult(date.year, str(row.round), date, row.home, row.away,
+                                   int(row.home_score), int(row.away_score)))
+    return results
+
+def group_rounds(results):
+    """
+    Groups the results of club matches by round, in the order the rounds started. Matches
+    between sides that aren't NRL clubs, such as representative matches, are left out.
+    """
+    rounds = {}
+    for result in results:
+        if result.home not in team_name_aliases or result.away not in team_name_aliases:
+            continue
+        rounds.setdefault((result.season, result.round), []).append(result)
+    for round_results in rounds.values():
+        round_results.sort(key=lambda result: (result.date, result.home, result.away))
+    return sorted(rounds.items(), key=lambda item: (item[1][0].date, item[0][0], item[0][1]))
+
+def make_design(home_teams, away_teams, team_count):
+    """
+    Makes the design matrix of the model, with a row for the score of each team in each
+    match (all of the home scores, then all of the away scores) and columns for the
+    intercept, home advantage, and the attack and then defence rating of each team.
+    """
+    games = len(home_teams)
+    rows = numpy.arange(games)
+    design = numpy.zeros((2 * games, 2 + 2 * team_count))
+    design[:, 0] = 1.0
+    design[rows, 1] = 1.0
+    design[rows, 2 + home_teams] = 1.0
+    design[rows, 2 + team_count + away_teams] = 1.0
+    design[games + rows, 2 + away_teams] = 1.0
+    design[games + rows, 2 + team_count + home_teams] = 1.0
+    return design
+
+def fit_poisson_ratings(design, scores, start, ridge=0.01, tolerance=1e-8, max_iterations=50):
+    """
+    Fits the parameters of the Poisson model to the scores by Newton's method, starting
+    from the given parameters. The team ratings are given a small ridge penalty, which
+    makes them identifiable, with each set of ratings summing to zero. Returns the
+    parameters, the log-likelihood and the number of iterations.
+    """
+    penalty = numpy.full(design.shape[1], ridge)
+    penalty[:2] = 0.0
+    parameters = numpy.array(start, dtype=float)
+    iterations = 0
+    for iterations in range(1, max_iterations + 1):
+        rates = numpy.exp(design @ parameters)
+        gradient = design.T @ (scores - rates) - penalty * parameters
+        hessian = (design.T * rates) @ design + numpy.diag(penalty)
+        step = numpy.linalg.solve(hessian, gradient)
+        # Keep the first steps from a cold start from overshooting.
+        largest = numpy.abs(step).max()
+        if largest > 1.0:
+            step /= largest
+        parameters += step
+        if largest < tolerance:
+            break
+    linear = design @ parameters
+    log_factorials = sum(math.lgamma(score + 1) for score in scores)
+    log_likelihood = float(scores @ linear - numpy.exp(linear).sum() - log_factorials)
+    return parameters, log_likelihood, iterations
+
+def make_price(home_rate, away_rate):
+    """
+    Gets the probabilities of a home win, a draw and an away win, given the expected score
+    of each team.
+    """
+    require_numpy()
+    points = numpy.arange(max_price_score + 1)
+    log_factorials = numpy.array([math.lgamma(point + 1) for point in points])
+    home = numpy.exp(points * math.log(home_rate) - home_rate - log_factorials)
+    away = numpy.exp(points * math.log(away_rate) - away_rate - log_factorials)
+    joint = numpy.outer(home, away)
+    return float(numpy.tril(joint, -1).sum()), float(numpy.trace(joint)), float(numpy.triu(joint, 1).sum())
+
+class RatingEngine:
+    """
+    Fits the attack, defence and home advantage ratings of the Poisson model in
+    sportsbetting_data/model_Ypoisson.R by maximum likelihood, after each round of results.
+
+    Give update all of the results so far, such as each time a season is extracted. The
+    rounds are fitted in order, each to the results up to its end, and each fit starts from
+    the one before it, so it takes only a few Newton steps. The ratings of every round are
+    kept, keyed by round, with a hash of the results they were fitted to, so only the rounds
+    whose results are new or have changed (such as a round that is still being played) are
+    fitted again. If a path is given, the ratings are kept there as JSON between runs.
+    """
+    def __init__(self, path=None, ridge=0.01, tolerance=1e-8, max_iterations=50):
+        require_numpy()
+        self.path = path
+        self.ridge = ridge
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        # The fitted state of each round ("2015:Round 1"), in the order they were fitted.
+        self.states = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self.states = json.load(f)["rounds"]
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps({"rounds" : self.states}, indent=1))
+        os.replace(tmp_path, self.path)
+
+    def update(self, results):
+        """
+        Fits the ratings of each round of the given results that hasn't been fitted to the
+        same results before. Returns the TeamRatings of the rounds that were fitted.
+        """
+        fitted = []
+        included = []
+        digest = hashlib.sha256()
+        previous = None
+        for (season, round), round_results in group_rounds(results):
+            included.extend(round_results)
+            for result in round_results:
+                digest.update(repr(tuple(result)).encode("utf-8"))
+            key = "%s:%s" % (season, round)
+            state = self.states.get(key)
+            if state is not None and state["digest"] == digest.hexdigest():
+                previous = state
+                continue
+            state = self.fit_round(season, round, included, previous)
+            state["digest"] = digest.hexdigest()
+            self.states[key] = state
+            previous = state
+            fitted.append(make_ratings(state))
+        if len(fitted) > 0:
+            logger.info("Fitted the ratings of %d rounds", len(fitted))
+            if self.path is not None:
+                self.save()
+        return fitted
+
+    def fit_round(self, season, round, results, previous):
+        """
+        Fits the ratings to the given results, starting from the previous round's state.
+        """
+        teams = sorted(set(result.home for result in results) | set(result.away for result in results))
+        team_numbers = dict((team, team_num) for team_num, team in enumerate(teams))
+        home_teams = numpy.array([team_numbers[result.home] for result in results])
+        away_teams = numpy.array([team_numbers[result.away] for result in results])
+        scores = numpy.array([result.home_score for result in results] + [result.away_score for result in results],
+                             dtype=float)
+
+        # Teams new since the previous round start from zero.
+        if previous is None:
+            start = [math.log(max(scores.mean(), 1.0)), 0.0] + [0.0] * (2 * len(teams))
+        else:
+            start = ([previous["intercept"], previous["home"]] +
+                     [previous["attack"].get(team, 0.0) for team in teams] +
+                     [previous["defence"].get(team, 0.0) for team in teams])
+        parameters, log_likelihood, iterations = fit_poisson_ratings(
+            make_design(home_teams, away_teams, len(teams)), scores, start, self.ridge, self.tolerance,
+            self.max_iterations)
+        attack = parameters[2:2 + len(teams)]
+        defence = parameters[2 + len(teams):]
+        return {
+            "season" : season,
+            "round" : round,
+            "date" : max(result.date for result in results).isoformat(),
+            "intercept" : float(parameters[0]),
+            "home" : float(parameters[1]),
+            "attack" : dict(zip(teams, [float(value) for value in attack])),
+            "defence" : dict(zip(teams, [float(value) for value in defence])),
+            "log_likelihood" : log_likelihood,
+            "iterations" : iterations,
+            "games" : len(results),
+        }
+
+    def get_ratings(self, season=None, round=None):
+        """
+        Gets the ratings of the given round, or of the latest round fitted (of the given
+        season, if one is given). Returns None if there are none.
+        """
+        if round is not None:
+            state = self.states.get("%s:%s" % (season, round))
+            return None if state is None else make_ratings(state)
+        states = [state for state in self.states.values() if season is None or state["season"] == season]
+        if len(states) == 0:
+            return None
+        return make_ratings(max(states, key=lambda state: (state["date"], state["games"])))
+
+    def predict(self, home, away, ratings=None):
+        """
+        Gets the expected scores of a match between the given teams, and the probabilities
+        of a home win, a draw and an away win, from the given ratings (by default, the
+        latest). Raises ValueError if no ratings have been fitted.
+        """
+        if ratings is None:
+            ratings = self.get_ratings()
+        if ratings is None:
+            raise ValueError("No ratings have been fitted yet")
+        home, away = normalise_team_name(home), normalise_team_name(away)
+        home_rate = math.exp(ratings.intercept + ratings.home + ratings.attack.get(home, 0.0) +
+                             ratings.defence.get(away, 0.0))
+        away_rate = math.exp(ratings.intercept + ratings.attack.get(away, 0.0) + ratings.defence.get(home, 0.0))
+        return (home_rate, away_rate), make_price(home_rate, away_rate)
+
+def make_ratings(state):
+    return TeamRatings(state["season"], state["round"], state["date"], state["intercept"], state["home"],
+                       state["attack"], state["defence"], state["log_likelihood"], state["iterations"],
+                       state["games"])
+
+if __name__ == "__main__":
+    import match_loader
+    logging.basicConfig(level=logging.INFO)
+    engine = RatingEngine("ratings.json")
+    matches = match_loader.read_match_table(os.path.join(match_loader.default_data_dir,
+                                                         match_loader.match_table_name))
+    engine.update(results_from_match_table(matches))
+    ratings = engine.get_ratings()
+    for team in sorted(ratings.attack, key=lambda team: ratings.attack[team] - ratings.defence[team], reverse=True):
+        print("%-20s %+.3f %+.3f" % (team, ratings.attack[team], ratings.defence[team]))
+    print(engine.predict("North Queensland", "Brisbane", ratings))
@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+from urllib.parse import urlsplit
+
+import scraper
+import stand_in_server
+
+# The tests that fetch pages fetch them from the stand-in server (see stand_in_server.py),
+# which serves the fixture pages in benchmarks/fixtures in place of the real sites.
+
+class StandInTestCase(unittest.TestCase):
+    """
+    Runs each test with the hosts of the fixture pages resolved to a stand-in server, and
+    with a temporary directory in self.out_dir.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.server = stand_in_server.start_stand_in_server()
+        # Tests that stop reading a page part way close the connection under the server.
+        cls.server.handle_error = lambda request, client_address: None
+        cls.saved_resolve = dict(scraper.default_client.resolve)
+        for url in stand_in_server.load_pages().keys():
+            scraper.default_client.resolve[urlsplit(url).netloc] = "127.0.0.1:" + str(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        # The pooled connections would go on being served by this server's threads.
+        scraper.default_client.close()
+        scraper.default_client.resolve.clear()
+        scraper.default_client.resolve.update(cls.saved_resolve)
+
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp(prefix="nrl-test-")
+        self.addCleanup(shutil.rmtree, self.out_dir, ignore_errors=True)
+        self.saved_cache = scraper.default_client.cache
+        scraper.default_client.cache = None
+        self.server.redirects.clear()
+
+    def tearDown(self):
+        scraper.default_client.cache = self.saved_cache
+
+def read_fixture(name):
+    return stand_in_server.read_fixture(name)
+
+def list_files(directory, extension=".csv"):
+    """
+    Lists the files with the given extension under a directory, relative to it.
+    """
+    paths = []
+    for parent, dirs, names in os.walk(directory):
+        for name in names:
+            if name.endswith(extension):
+                paths.append(os.path.relpath(os.path.join(parent, name), directory))
+    return sorted(paths)
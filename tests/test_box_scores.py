@@ -0,0 +1,53 @@
+import datetime
+import os
+import unittest
+
+import scraper
+from page_archive import PageArchive
+from schedule_index import ScheduleIndex
+from tests.stand_in import StandInTestCase, list_files
+
+start_date = datetime.date(2013, 5, 14)
+end_date = datetime.date(2013, 5, 16)
+
+class BoxScoresTest(StandInTestCase):
+    def crawl_and_replay(self, discover):
+        archive = PageArchive(os.path.join(self.out_dir, "pages.warc.gz"))
+        scraper.extract_box_scores_range(start_date, end_date, out_dir=self.out_dir, archive=archive,
+                                         discover=discover)
+        crawled = list_files(self.out_dir)
+        self.assertEqual(len([path for path in crawled if path.endswith("basic.csv")]), 12)
+
+        for path in crawled:
+            os.remove(os.path.join(self.out_dir, path))
+        requests = self.server.requests
+        scraper.replay_box_scores(start_date, end_date, archive, out_dir=self.out_dir, processes=1,
+                                  discover=discover)
+        self.assertEqual(self.server.requests, requests)
+        self.assertEqual(list_files(self.out_dir), crawled)
+
+    def test_replay(self):
+        self.crawl_and_replay(discover=False)
+
+    def test_replay_discovered(self):
+        self.crawl_and_replay(discover=True)
+
+    def test_discover_fetches_only_game_days(self):
+        index = ScheduleIndex(os.path.join(self.out_dir, "schedule_index.json"))
+        days = list(scraper.discover_box_scores(start_date, end_date, index))
+        self.assertEqual([date for date, links in days], [start_date, start_date + datetime.timedelta(days=1),
+                                                         end_date])
+        self.assertTrue(all(len(links) == 2 for date, links in days))
+
+    def test_missing_out_dir_is_made(self):
+        out_dir = os.path.join(self.out_dir, "nba", "box_scores")
+        scraper.extract_box_scores(start_date, out_dir=out_dir)
+        self.assertEqual(len([path for path in list_files(out_dir) if path.endswith("basic.csv")]), 4)
+
+    def test_box_score_links(self):
+        links = scraper.get_box_score_links(scraper.form_date_url(start_date))
+        self.assertEqual(links, ["http://www.basketball-reference.com/boxscores/201305140SAS.html",
+                                 "http://www.basketball-reference.com/boxscores/201305140MIA.html"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import scraper
+from crawl_metrics import CrawlMetrics, Histogram
+from tests.stand_in import StandInTestCase
+
+def record_run(metrics):
+    """
+    Records the metrics of a small run: three pages fetched from one host, one of them
+    from the cache, and two parsed.
+    """
+    for seconds in (0.004, 0.02, 0.3):
+        metrics.observe("fetch", seconds, host="live.nrlstats.com")
+    metrics.observe("parse", 0.05, page="nrlstats_match")
+    metrics.observe("parse", 40.0, page="nrlstats_match")
+    metrics.increment("pages_fetched", 3, host="live.nrlstats.com")
+    metrics.increment("cache_hits", host="live.nrlstats.com")
+    metrics.increment("rows_written", 120, table='player "stats"')
+
+expected_prometheus = """\
+# HELP nrl_scraper_fetch_seconds Time taken by each run of the fetch stage.
+# TYPE nrl_scraper_fetch_seconds histogram
+nrl_scraper_fetch_seconds_bucket{host="live.nrlstats.com",le="0.005"} 1
+nrl_scraper_fetch_seconds_bucket{host="live.nrlstats.com",le="0.01"} 1
+nrl_scraper_fetch_seconds_bucket{host="live.nrlstats.com",le="0.025"} 2
+nrl_scraper_fetch_seconds_bucket{host="live.nrlstats.com",le="0.05"} 2
+nrl_scraper_fetch_seconds_bucket{host="live.nrlstats.com",le="0.1"} 2
+nrl_scraper_fetch_seconds_bucket{host="live.nrlstats.com",le="0.25"} 2
+nrl_scraper_fetch_seconds_bucket{host="live.nrlstats.com",le="0.5"} 3
+nrl_scraper_fetch_seconds_bucket{host="live.nrlstats.com",le="1.0"} 3
+nrl_scraper_fetch_seconds_bucket{host="live.nrlstats.com",le="2.5"} 3
+nrl_scraper_fetch_seconds_bucket{host="live.nrlstats.com",le="5.0"} 3
+nrl_scraper_fetch_seconds_bucket{host="live.nrlstats.com",le="10.0"} 3
+nrl_scraper_fetch_seconds_bucket{host="live.nrlstats.com",le="30.0"} 3
+nrl_scraper_fetch_seconds_bucket{host="live.nrlstats.com",le="+Inf"} 3
+nrl_scraper_fetch_seconds_sum{host="live.nrlstats.com"} 0.324
+nrl_scraper_fetch_seconds_count{host="live.nrlstats.com"} 3
+# HELP nrl_scraper_parse_seconds Time taken by each run of the parse stage.
+# TYPE nrl_scraper_parse_seconds histogram
+nrl_scraper_parse_seconds_bucket{page="nrlstats_match",le="0.005"} 0
+nrl_scraper_parse_seconds_bucket{page="nrlstats_match",le="0.01"} 0
+nrl_scraper_parse_seconds_bucket{page="nrlstats_match",le="0.025"} 0
+nrl_scraper_parse_seconds_bucket{page="nrlstats_match",le="0.05"} 1
+nrl_scraper_parse_seconds_bucket{page="nrlstats_match",le="0.1"} 1
+nrl_scraper_parse_seconds_bucket{page="nrlstats_match",le="0.25"} 1
+nrl_scraper_parse_seconds_bucket{page="nrlstats_match",le="0.5"} 1
+nrl_scraper_parse_seconds_bucket{page="nrlstats_match",le="1.0"} 1
+nrl_scraper_parse_seconds_bucket{page="nrlstats_match",le="2.5"} 1
+nrl_scraper_parse_seconds_bucket{page="nrlstats_match",le="5.0"} 1
+nrl_scraper_parse_seconds_bucket{page="nrlstats_match",le="10.0"} 1
+nrl_scraper_parse_seconds_bucket{page="nrlstats_match",le="30.0"} 1
+nrl_scraper_parse_seconds_bucket{page="nrlstats_match",le="+Inf"} 2
+nrl_scraper_parse_seconds_sum{page="nrlstats_match"} 40.05
+nrl_scraper_parse_seconds_count{page="nrlstats_match"} 2
+# TYPE nrl_scraper_cache_hits_total counter
+nrl_scraper_cache_hits_total{host="live.nrlstats.com"} 1
+# TYPE nrl_scraper_pages_fetched_total counter
+nrl_scraper_pages_fetched_total{host="live.nrlstats.com"} 3
+# TYPE nrl_scraper_rows_written_total counter
+nrl_scraper_rows_written_total{table="player \\"stats\\""} 120
+"""
+
+class HistogramTest(unittest.TestCase):
+    def test_quantiles(self):
+        histogram = Histogram((1, 2, 4))
+        self.assertIsNone(histogram.quantile(0.5))
+        for value in (0.5, 1.5, 1.5, 3, 10):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [1, 2, 1, 1])
+        self.assertEqual(histogram.quantile(0.5), 2)
+        self.assertIsNone(histogram.quantile(1.0))
+
+class CrawlMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp(prefix="nrl-test-")
+        self.addCleanup(shutil.rmtree, self.out_dir, ignore_errors=True)
+        self.metrics = CrawlMetrics()
+        record_run(self.metrics)
+
+    def test_prometheus(self):
+        path = os.path.join(self.out_dir, "metrics.prom")
+        self.metrics.write_prometheus(path)
+        with open(path) as f:
+            self.assertEqual(f.read(), expected_prometheus)
+        self.assertEqual(os.listdir(self.out_dir), ["metrics.prom"])
+
+    def test_json(self):
+        path = os.path.join(self.out_dir, "metrics.json")
+        self.metrics.write_json(path)
+        with open(path) as f:
+            summary = json.load(f)
+        self.assertEqual(summary["counters"], [
+            {"name" : "cache_hits", "labels" : {"host" : "live.nrlstats.com"}, "value" : 1},
+            {"name" : "pages_fetched", "labels" : {"host" : "live.nrlstats.com"}, "value" : 3},
+            {"name" : "rows_written", "labels" : {"table" : 'player "stats"'}, "value" : 120},
+        ])
+        fetch, parse = summary["histograms"]
+        self.assertEqual((fetch["stage"], fetch["labels"], fetch["count"]), ("fetch", {"host" : "live.nrlstats.com"}, 3))
+        self.assertAlmostEqual(fetch["mean"], 0.108)
+        self.assertEqual((fetch["p50"], fetch["p95"]), (0.025, 0.5))
+        # The slowest parse is past the last bound, so its quantile has no bound either.
+        self.assertEqual((parse["p50"], parse["p95"]), (0.05, None))
+        self.assertEqual(summary["memory_peaks"], {})
+
+    def test_totals(self):
+        self.metrics.increment("pages_fetched", host="www.basketball-reference.com")
+        self.assertEqual(self.metrics.get_total("pages_fetched"), 4)
+        self.assertEqual(self.metrics.get_total("retries"), 0)
+
+    def test_take_and_merge(self):
+        taken = self.metrics.take()
+        self.assertEqual(self.metrics.to_dict()["counters"], [])
+        self.assertEqual(self.metrics.format_prometheus(), "\n")
+
+        # Merging the metrics of two workers that each recorded the run counts it twice.
+        merged = CrawlMetrics()
+        merged.merge(taken)
+        merged.merge(json.loads(json.dumps(taken)))
+        self.assertEqual(merged.get_total("pages_fetched"), 6)
+        fetch = merged.to_dict()["histograms"][0]
+        self.assertEqual((fetch["count"], fetch["counts"][0]), (6, 2))
+        self.assertAlmostEqual(fetch["sum"], 0.648)
+
+        # Merged into metrics of its own, the counts add up.
+        record_run(self.metrics)
+        self.metrics.merge(taken)
+        self.assertEqual(self.metrics.to_dict(), merged.to_dict())
+
+class ReplayMetricsTest(StandInTestCase):
+    def setUp(self):
+        StandInTestCase.setUp(self)
+        saved_metrics = scraper.default_metrics.take()
+        self.addCleanup(scraper.default_metrics.merge, saved_metrics)
+        self.addCleanup(scraper.default_metrics.reset)
+
+    def test_worker_metrics_are_merged(self):
+        scraper.extract_nrlstats_season(2015, out_dir=self.out_dir)
+        written = scraper.default_metrics.get_total("rows_written")
+        self.assertGreater(written, 0)
+
+        # Each match is parsed and written again in a worker process, which returns its
+        # metrics with the match. A worker doesn't return what it had before it started.
+        scraper.replay_nrlstats_season(2015, out_dir=self.out_dir, processes=2)
+        self.assertEqual(scraper.default_metrics.get_total("rows_written"), 2 * written)
+        parses = [entry for entry in scraper.default_metrics.to_dict()["histograms"]
+                  if entry["stage"] == "parse" and entry["labels"].get("page") == "nrlstats_match"]
+        self.assertEqual(sum(entry["count"] for entry in parses), 2 * 16)
+
+if __name__ == "__main__":
+    unittest.main()
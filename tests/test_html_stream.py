@@ -0,0 +1,59 @@
+import unittest
+
+from html_stream import find_element_spans, iter_chunks, iter_table_rows
+
+page = ('<html><body>'
+        '<div data-id="stats"><p>Not this one</p></div>'
+        '<div class="box" id="stats"><div>inner</div><table><tr><th colspan="2">Héading</th></tr>'
+        '<tr><td rowspan="2">1</td><td>2</td></tr></table></div>'
+        '<div id=other>other</div>'
+        '</body></html>')
+
+def join_cell_strings(event):
+    """
+    Joins the strings of each cell of a row event, which are split where the chunks are.
+    """
+    if event[0] != "row":
+        return event
+    return (event[0], event[1], [(tag, "".join(strings), colspan, rowspan)
+                                 for tag, strings, colspan, rowspan in event[2]])
+
+class ElementSpansTest(unittest.TestCase):
+    def test_spans(self):
+        spans = find_element_spans(page, "div", ["stats", "other"])
+        start, end = spans["stats"]
+        self.assertTrue(page[start:end].startswith('<div class="box" id="stats">'))
+        # The nested div doesn't end the element.
+        self.assertTrue(page[start:end].endswith('</table></div>'))
+        start, end = spans["other"]
+        self.assertEqual(page[start:end], "<div id=other>other</div>")
+
+    def test_data_id_is_not_an_id(self):
+        spans = find_element_spans('<div data-id="stats">x</div>', "div", ["stats"])
+        self.assertEqual(spans, {})
+        html = '<div class="box"id="stats">x</div>'
+        self.assertEqual(find_element_spans(html, "div", ["stats"]), {"stats" : (0, len(html))})
+
+    def test_bytes(self):
+        data = page.encode("utf-8")
+        start, end = find_element_spans(data, "div", ["stats"])["stats"]
+        text_start, text_end = find_element_spans(page, "div", ["stats"])["stats"]
+        self.assertEqual(data[start:end].decode("utf-8"), page[text_start:text_end])
+
+class TableRowsTest(unittest.TestCase):
+    def test_rows(self):
+        def find_container(tag, attrs):
+            if tag == "div" and attrs.get("id") == "stats":
+                return "stats"
+            return None
+
+        # Small chunks split the page mid-tag and mid-character.
+        events = list(iter_table_rows(iter_chunks(page.encode("utf-8"), 7), find_container, "utf-8"))
+        self.assertEqual([join_cell_strings(event) for event in events], [
+            ("row", "stats", [("th", "Héading", 2, 1)]),
+            ("row", "stats", [("td", "1", 1, 2), ("td", "2", 1, 1)]),
+            ("end", "stats"),
+        ])
+
+if __name__ == "__main__":
+    unittest.main()
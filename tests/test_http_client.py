@@ -0,0 +1,80 @@
+import gzip
+import socket
+import threading
+import unittest
+import zlib
+
+import scraper
+from crawl_metrics import CrawlMetrics
+from http_client import HttpClient, HttpError, decode_body
+from tests.stand_in import StandInTestCase, read_fixture
+
+season_url = "http://live.nrlstats.com/nrl/season2015.html"
+match_urls = ["http://live.nrlstats.com/nrl/match%04d.html" % match_num for match_num in range(4)]
+
+class DecodeBodyTest(unittest.TestCase):
+    def test_encodings(self):
+        body = b"<html>" * 100
+        self.assertEqual(decode_body(gzip.compress(body), "gzip"), body)
+        self.assertEqual(decode_body(zlib.compress(body), "deflate"), body)
+        raw = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        self.assertEqual(decode_body(raw.compress(body) + raw.flush(), "Deflate"), body)
+        self.assertEqual(decode_body(body, None), body)
+
+class KeepAliveTest(StandInTestCase):
+    def setUp(self):
+        StandInTestCase.setUp(self)
+        self.client = HttpClient()
+        self.client.resolve = dict(scraper.default_client.resolve)
+        self.addCleanup(self.client.close)
+
+    def test_connection_is_reused(self):
+        connections = self.server.connections
+        for url in [season_url] + match_urls:
+            response = self.client.get(url)
+            self.assertEqual(response.status, 200)
+        self.assertEqual(response.body, read_fixture("nrlstats_match_b.html"))
+        self.assertEqual(self.server.connections - connections, 1)
+
+    def test_streamed_pages_reuse_the_connection(self):
+        connections = self.server.connections
+        for url in match_urls:
+            self.assertEqual(b"".join(self.client.stream(url, chunk_size=4096)), self.client.get(url).body)
+        self.assertEqual(self.server.connections - connections, 1)
+
+    def test_dropped_connection_is_replaced(self):
+        self.client.metrics = CrawlMetrics()
+        self.client.get(season_url)
+        # The idle connection is dropped, as a server does after its keep-alive timeout.
+        idle = self.client.idle_connections[("http", "live.nrlstats.com")]
+        idle[0].sock.shutdown(socket.SHUT_RDWR)
+        connections = self.server.connections
+        self.assertEqual(self.client.get(season_url).status, 200)
+        self.assertEqual(self.server.connections - connections, 1)
+        self.assertEqual(self.client.metrics.get_total("retries"), 1)
+
+    def test_threads_share_the_pool(self):
+        client = HttpClient(max_idle_per_host=2)
+        client.resolve = self.client.resolve
+        self.addCleanup(client.close)
+        barrier = threading.Barrier(4)
+
+        def fetch():
+            barrier.wait()
+            for url in match_urls:
+                client.get(url)
+
+        threads = [threading.Thread(target=fetch) for thread_num in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(len(client.idle_connections[("http", "live.nrlstats.com")]), 2)
+
+    def test_missing_page(self):
+        with self.assertRaises(HttpError) as context:
+            self.client.get("http://live.nrlstats.com/nrl/missing.html")
+        self.assertEqual(context.exception.status, 404)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import datetime
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import scraper
+from job_queue import JobQueue, LeaseKeeper
+from tests.stand_in import StandInTestCase, list_files
+
+def make_urls(count):
+    return ["http://live.nrlstats.com/nrl/match%04d.html" % match_num for match_num in range(count)]
+
+class JobQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp(prefix="nrl-test-")
+        self.addCleanup(shutil.rmtree, self.out_dir, ignore_errors=True)
+        self.path = os.path.join(self.out_dir, "jobs.sqlite3")
+
+    def open_queue(self, **settings):
+        queue = JobQueue(self.path, **settings)
+        self.addCleanup(queue.close)
+        return queue
+
+    def test_each_url_is_queued_once(self):
+        queue = self.open_queue()
+        self.assertEqual(queue.add_many("nrlstats_match", [(url, None) for url in make_urls(3)]), 3)
+        self.assertFalse(queue.add("nrlstats_match", make_urls(1)[0]))
+        self.assertEqual(queue.counts()["pending"], 3)
+
+    def test_claims_in_order_by_kind(self):
+        queue = self.open_queue()
+        queue.add("box_score", "http://www.basketball-reference.com/boxscores/201305140SAS.html")
+        queue.add_many("nrlstats_match", [(url, {"year" : 2015}) for url in make_urls(2)])
+        job = queue.claim("a", ["nrlstats_match"])
+        self.assertEqual((job.url, job.payload, job.attempts), (make_urls(1)[0], {"year" : 2015}, 1))
+        self.assertEqual(queue.claim("b", ["nrlstats_match"]).url, make_urls(2)[1])
+        self.assertIsNone(queue.claim("c", ["nrlstats_match"]))
+        self.assertEqual(queue.claim("c").kind, "box_score")
+
+    def test_expired_lease_is_claimed_again(self):
+        queue = self.open_queue(lease_seconds=0.1)
+        queue.add("nrlstats_match", make_urls(1)[0])
+        job = queue.claim("a")
+        self.assertIsNone(queue.claim("b"))
+
+        time.sleep(0.2)
+        taken = queue.claim("b")
+        self.assertEqual((taken.id, taken.attempts, taken.worker), (job.id, 2, "b"))
+        # The first worker has lost the job, so it can neither renew nor finish it.
+        self.assertFalse(queue.heartbeat(job))
+        self.assertFalse(queue.complete(job))
+        self.assertTrue(queue.complete(taken))
+        self.assertTrue(queue.is_finished())
+
+    def test_heartbeats_keep_the_lease(self):
+        queue = self.open_queue(lease_seconds=0.2)
+        queue.add("nrlstats_match", make_urls(1)[0])
+        job = queue.claim("a")
+        with LeaseKeeper(queue, job, interval=0.05) as lease:
+            time.sleep(0.4)
+            self.assertIsNone(queue.claim("b"))
+        self.assertFalse(lease.lost)
+        self.assertTrue(queue.complete(job))
+
+    def test_failed_jobs_are_tried_again(self):
+        queue = self.open_queue(max_attempts=2)
+        queue.add("nrlstats_match", make_urls(1)[0])
+        self.assertTrue(queue.fail(queue.claim("a"), "timed out"))
+        self.assertEqual(queue.counts()["pending"], 1)
+        self.assertTrue(queue.fail(queue.claim("a"), "timed out again"))
+        self.assertEqual(queue.failed_jobs(), [(make_urls(1)[0], "timed out again")])
+        self.assertIsNone(queue.claim("a"))
+
+    def test_lease_expired_on_last_attempt(self):
+        queue = self.open_queue(lease_seconds=0.1, max_attempts=1)
+        queue.add("nrlstats_match", make_urls(1)[0])
+        queue.claim("a")
+        time.sleep(0.2)
+        self.assertIsNone(queue.claim("b"))
+        self.assertEqual(queue.failed_jobs(), [(make_urls(1)[0], "lease expired")])
+
+    def test_settings_are_kept_with_the_queue(self):
+        self.open_queue(lease_seconds=30, max_attempts=2)
+        queue = self.open_queue()
+        self.assertEqual((queue.lease_seconds, queue.max_attempts), (30, 2))
+
+class QueuedCrawlTest(StandInTestCase):
+    def test_box_scores(self):
+        path = os.path.join(self.out_dir, "jobs.sqlite3")
+        queue = JobQueue(path)
+        scraper.queue_box_scores_range(datetime.date(2013, 5, 14), datetime.date(2013, 5, 16), queue,
+                                       os.path.join(self.out_dir, "schedule_index.json"))
+        self.assertEqual(queue.counts()["pending"], 6)
+        queue.close()
+
+        out_dir = os.path.join(self.out_dir, "out")
+        self.assertEqual(scraper.run_worker(path, out_dir, "a", poll_seconds=0), 6)
+        self.assertEqual(len([path for path in list_files(out_dir) if path.endswith("basic.csv")]), 12)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import match_loader
+from match_loader import load_match_dataset, pandas, read_cached_dataset
+
+match_table = '''"","date","time","round","team_1","team_2","team_score_1","team_score_2","venue","crowd"
+"1","2015-07-06","7:00PM","18","Wests Tigers","Parramatta","16","28","Leichhardt Oval","15000"
+"2","2015-07-08","8:00PM","","Queensland","NSW","6","18","Suncorp Stadium","52000"
+"3","2015-07-10","7:45PM","18","South Sydney","Brisbane","12","47","Allianz Stadium","12036"
+'''
+
+compound_cells = ['"14 (318m) | 0 | 2"'] * 4 + ['"133 | 6 | 94 | 33"'] * 4 + ['"50% | 158 | 25 | 86%"'] * 4
+
+def make_team_row(row_num, date, period, team, score, tackles):
+    return ",".join(['"%d"' % row_num, '"%s"' % date, '"7:00PM"', '"18"', '"%s"' % period, '"%s"' % team,
+                     '"%d"' % score, '"%d"' % tackles] + compound_cells)
+
+team_table = "\n".join([
+    '"","date","time","round","period","team","score","tackles","kicks","kicks_metres","forty_twenty_kicks",'
+    '"line_dropouts","play_the_balls_total","play_the_balls_slow","play_the_balls_neutral",'
+    '"play_the_balls_fast","possession_percent","used_plays","unused_plays","possession_efficiency_percent"',
+    make_team_row(1, "2015-07-06", "match", "Wests Tigers", 16, 300),
+    make_team_row(2, "2015-07-06", "1st_half", "Wests Tigers", 6, 140),
+    make_team_row(3, "2015-07-06", "match", "Parramatta", 28, 320),
+    make_team_row(4, "2015-07-10", "match", "South Sydney", 12, 336),
+    make_team_row(5, "2015-07-10", "match", "Brisbane", 47, 280),
+]) + "\n"
+
+# A line of headings above the column names, as the aussportsbetting files have.
+odds_table = '''Pinnacle Sports,,,,,,,,,,,
+Date,Kick-off (local),Home Team,Away Team,Home Score,Away Score,Play Off Game?,Over Time?,Home Odds,Draw Odds,Away Odds,Notes
+06-Jul-15,19:00,Wests Tigers,Parramatta Eels,16,28,,, 2.91 , 21.71 , 1.43 ,
+,,,,,,,,,,,
+'''
+
+scores_table = '''Date,Home Team,Away Team,Home Score,Away Score,Play Off Game?
+10-Jul-15,South Sydney Rabbitohs,Brisbane Broncos,12,47,
+06-Jul-15,Wests Tigers,Parramatta Eels,0,0,
+'''
+
+@unittest.skipIf(pandas is None, "pandas isn't installed")
+class MatchLoaderTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp(prefix="nrl-test-")
+        self.addCleanup(shutil.rmtree, self.data_dir, ignore_errors=True)
+        self.write_file(match_loader.match_table_name, match_table)
+        self.write_file(match_loader.team_table_name, team_table)
+        self.write_file("nrl_20150713.csv", odds_table)
+        self.write_file("scores_2015.csv", scores_table)
+
+    def write_file(self, name, text):
+        with open(os.path.join(self.data_dir, name), 'w') as f:
+            f.write(text)
+
+    def test_aliases_are_joined(self):
+        dataset = load_match_dataset(self.data_dir)
+        self.assertEqual(list(zip(dataset["home"], dataset["away"])),
+                         [("Wests", "Parramatta"), ("Queensland", "NSW"), ("SouthSydney", "Brisbane")])
+        self.assertEqual(dataset["betting_home_odds"].tolist()[0], 2.91)
+        self.assertEqual(dataset["home_tackles"].tolist()[0], 300)
+        self.assertEqual(dataset["away_tackles"].tolist()[0], 320)
+        # The scores file fills in the match the odds file doesn't have, but the odds file
+        # wins where both have a match.
+        self.assertEqual(dataset["betting_home_score"].tolist()[0], 16)
+        self.assertEqual(dataset["betting_away_score"].tolist()[2], 47)
+        self.assertTrue(pandas.isnull(dataset["betting_home_odds"].tolist()[2]))
+        # A match the betting data doesn't have is kept.
+        self.assertTrue(pandas.isnull(dataset["betting_home_score"].tolist()[1]))
+
+    def test_compound_cells_are_split(self):
+        teams = match_loader.read_team_table(os.path.join(self.data_dir, match_loader.team_table_name))
+        row = teams.iloc[0]
+        self.assertEqual([row[column] for column in ["kicks", "kicks_metres", "forty_twenty_kicks", "line_dropouts"]],
+                         [14, 318, 0, 2])
+        self.assertEqual([row[column] for column in ["play_the_balls_total", "play_the_balls_fast"]], [133, 33])
+        self.assertEqual([row[column] for column in ["possession_percent", "used_plays", "unused_plays",
+                                                     "possession_efficiency_percent"]], [50, 158, 25, 86])
+
+    def test_cache_is_made_again_when_an_input_changes(self):
+        cache_path = os.path.join(self.data_dir, "match_dataset.pkl")
+        dataset = load_match_dataset(self.data_dir)
+        key = match_loader.hash_inputs(match_loader.get_input_paths(self.data_dir))
+        self.assertIsNotNone(read_cached_dataset(cache_path, key))
+        self.assertTrue(load_match_dataset(self.data_dir).equals(dataset))
+
+        self.write_file("nrl_20150713.csv", odds_table.replace(" 2.91 ", " 3.10 "))
+        new_key = match_loader.hash_inputs(match_loader.get_input_paths(self.data_dir))
+        self.assertIsNone(read_cached_dataset(cache_path, new_key))
+        self.assertEqual(load_match_dataset(self.data_dir)["betting_home_odds"].tolist()[0], 3.10)
+
+        # A new input file changes the key too.
+        self.write_file("scores_2016.csv", scores_table)
+        self.assertNotEqual(match_loader.hash_inputs(match_loader.get_input_paths(self.data_dir)), new_key)
+
+    def test_unreadable_cache_is_made_again(self):
+        cache_path = os.path.join(self.data_dir, "match_dataset.pkl")
+        with open(cache_path, 'wb') as f:
+            f.write(b"not a pickle")
+        with self.assertLogs("match_loader", "WARNING"):
+            self.assertEqual(len(load_match_dataset(self.data_dir)), 3)
+
+if __name__ == "__main__":
+    unittest.main()
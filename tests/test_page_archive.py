@@ -0,0 +1,75 @@
+import os
+import unittest
+
+import scraper
+from http_client import HttpResponse, make_headers
+from page_archive import PageArchive
+from tests.stand_in import StandInTestCase, list_files
+
+def make_response(url, body):
+    return HttpResponse(url, 200, make_headers([("Content-Type", "text/html; charset=utf-8")]), body)
+
+class PageArchiveTest(StandInTestCase):
+    def test_round_trip(self):
+        path = os.path.join(self.out_dir, "pages.warc.gz")
+        archive = PageArchive(path)
+        archive.add(make_response("http://example.com/a.html", b"<p>a</p>"))
+        archive.add(make_response("http://example.com/b.html", b"<p>b</p>"))
+
+        # Read back from a new archive, from its index.
+        archive = PageArchive(path)
+        self.assertEqual(archive.urls(), ["http://example.com/a.html", "http://example.com/b.html"])
+        response = archive.get("http://example.com/b.html")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.body, b"<p>b</p>")
+        self.assertEqual(response.headers.get("Content-Type"), "text/html; charset=utf-8")
+        self.assertIsNone(archive.get("http://example.com/c.html"))
+
+    def test_deduplicates(self):
+        path = os.path.join(self.out_dir, "pages.warc.gz")
+        archive = PageArchive(path)
+        archive.add(make_response("http://example.com/a.html", b"<p>same</p>"))
+        size = os.path.getsize(path)
+        archive.add(make_response("http://example.com/a.html", b"<p>same</p>"))
+        self.assertEqual(os.path.getsize(path), size)
+
+        # The same content under another URL is a revisit of the first.
+        archive.add(make_response("http://example.com/copy.html", b"<p>same</p>"))
+        self.assertEqual([record["type"] for record in archive.records], ["response", "revisit"])
+        self.assertEqual(PageArchive(path).get("http://example.com/copy.html").body, b"<p>same</p>")
+
+    def test_truncated_write_is_dropped(self):
+        path = os.path.join(self.out_dir, "pages.warc.gz")
+        archive = PageArchive(path)
+        archive.add(make_response("http://example.com/a.html", b"<p>a</p>"))
+        with open(path, 'ab') as f:
+            f.write(b"\x1f\x8b partial")
+        archive = PageArchive(path)
+        self.assertEqual(archive.get("http://example.com/a.html").body, b"<p>a</p>")
+        archive.add(make_response("http://example.com/b.html", b"<p>b</p>"))
+        self.assertEqual(PageArchive(path).get("http://example.com/b.html").body, b"<p>b</p>")
+
+    def test_replay_after_redirects(self):
+        # The Wayback Machine redirects a capture to the nearest one it holds, so the pages
+        # are archived under other URLs than those the season page links to.
+        matches = scraper.get_nrlstats_season_matches(2007)
+        for match in matches:
+            location = match.url.replace("/web/20080718185646/", "/web/20080801000000/")
+            self.server.redirects[match.url] = location
+            self.server.bodies[location] = self.server.bodies[match.url]
+
+        scraper.extract_nrlstats_season(2007, out_dir=self.out_dir)
+        year_dir = os.path.join(self.out_dir, "2007")
+        crawled = list_files(year_dir)
+        self.assertEqual(len(crawled), 22 * len(matches))
+
+        for match in matches:
+            for name in os.listdir(os.path.join(year_dir, match.name)):
+                os.remove(os.path.join(year_dir, match.name, name))
+        requests = self.server.requests
+        scraper.replay_nrlstats_season(2007, out_dir=self.out_dir, processes=1)
+        self.assertEqual(self.server.requests, requests)
+        self.assertEqual(list_files(year_dir), crawled)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import csv
+import datetime
+import os
+import unittest
+
+import scraper
+from page_archive import PageArchive
+from pbp_events import iter_pbp_row_events, parse_pbp_clock, parse_pbp_period, pbp_event_columns
+from tests.stand_in import StandInTestCase, read_fixture
+
+pbp_url = "http://www.basketball-reference.com/boxscores/pbp/201305140SAS.html"
+start_date = datetime.date(2013, 5, 14)
+end_date = datetime.date(2013, 5, 16)
+
+def make_row(*values):
+    return [("td", [value], 1, 1) for value in values]
+
+class PbpParsingTest(unittest.TestCase):
+    def test_clock(self):
+        self.assertEqual(parse_pbp_clock("11:45.0"), 705.0)
+        self.assertEqual(parse_pbp_clock("0:00.4"), 0.4)
+        self.assertIsNone(parse_pbp_clock("Time"))
+
+    def test_period(self):
+        self.assertEqual(parse_pbp_period("2nd Quarter"), 2)
+        self.assertEqual(parse_pbp_period("1st Overtime"), 5)
+        self.assertEqual(parse_pbp_period("2nd OT"), 6)
+        self.assertIsNone(parse_pbp_period("Start of 2nd quarter"))
+
+    def test_row_events(self):
+        rows = [
+            [("th", ["1st Quarter"], 6, 1)],
+            make_row("Time", "SAS", "", "Score", "", "GSW"),
+            [("td", ["12:00.0"], 1, 1), ("td", ["Start of 1st quarter"], 5, 1)],
+            make_row("11:40.0", "Parker makes 2-pt shot", "+2", "2-0", "", ""),
+            make_row("11:20.0", "", "", "2-3", "+3", "Curry makes 3-pt shot"),
+            [("th", ["2nd Quarter"], 6, 1)],
+            make_row("11:50.0", "", "", "2-3", "", "Curry turnover"),
+        ]
+        events = list(iter_pbp_row_events("201305140SAS", rows))
+        self.assertEqual([(event.period, event.team, event.points, event.score_1, event.score_2)
+                          for event in events],
+                         [(1, None, 0, 0, 0), (1, "SAS", 2, 2, 0), (1, "GSW", 3, 2, 3), (2, "GSW", 0, 2, 3)])
+        self.assertEqual(events[1].clock, 700.0)
+        self.assertEqual(events[2].text, "Curry makes 3-pt shot")
+
+class PbpEventsTest(StandInTestCase):
+    def test_page_events(self):
+        events = list(scraper.iter_pbp_events(pbp_url, read_fixture("bbref_pbp.html")))
+        self.assertEqual(len(events), 484)
+        self.assertEqual(sorted(set(event.period for event in events)), [1, 2, 3, 4])
+        # The points of each team add up to its final score.
+        last = events[-1]
+        self.assertEqual(sum(event.points for event in events if event.team == "SAS"), last.score_1)
+        self.assertEqual(sum(event.points for event in events if event.team == "GSW"), last.score_2)
+        # The page is the same streamed from the server.
+        self.assertEqual(list(scraper.iter_pbp_events(pbp_url)), events)
+
+    def test_events_are_lazy(self):
+        requests = self.server.requests
+        events = scraper.iter_pbp_events_range(start_date, end_date)
+        next(events)
+        # The day's page and the first play-by-play page.
+        self.assertEqual(self.server.requests - requests, 2)
+        events.close()
+
+    def test_range_to_csv(self):
+        path = os.path.join(self.out_dir, "pbp_events.csv")
+        count = scraper.extract_pbp_events_range(start_date, end_date, path)
+        self.assertEqual(count, 6 * 484)
+        with open(path) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], pbp_event_columns)
+        self.assertEqual(len(rows), count + 1)
+
+    def test_replay_from_archive(self):
+        archive = PageArchive(os.path.join(self.out_dir, "pages.warc.gz"))
+        events = list(scraper.iter_pbp_events_range(start_date, end_date, archive))
+        requests = self.server.requests
+        replayed = list(scraper.iter_archived_pbp_events(start_date, end_date, archive))
+        self.assertEqual(self.server.requests, requests)
+        self.assertEqual(replayed, events)
+
+if __name__ == "__main__":
+    unittest.main()
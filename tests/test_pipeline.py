@@ -0,0 +1,102 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline import map_window, run_pipeline
+
+def parse_page(item, page):
+    if page == "bad page":
+        raise ValueError("Can't parse item %d" % item)
+    return page.upper()
+
+def fetch_page(item):
+    # The later items are fetched quicker, so they arrive before the earlier ones.
+    time.sleep(0.002 * (20 - item % 20))
+    return "page %d" % item
+
+class PipelineTest(unittest.TestCase):
+    def test_written_in_order(self):
+        batches = []
+        run_pipeline(range(40), fetch_page, parse_page, batches.append, fetchers=4, parsers=2, queue_size=4,
+                     batch_size=8)
+        written = [entry for batch in batches for entry in batch]
+        self.assertEqual(written, [(item, "PAGE %d" % item) for item in range(40)])
+        self.assertTrue(all(len(batch) <= 8 for batch in batches))
+
+    def test_no_items(self):
+        batches = []
+        run_pipeline([], fetch_page, parse_page, batches.append, parsers=1)
+        self.assertEqual(batches, [])
+
+    def test_fetch_failure_is_raised(self):
+        def fetch(item):
+            if item == 5:
+                raise IOError("Can't fetch item 5")
+            return "page %d" % item
+
+        with self.assertRaisesRegex(IOError, "item 5"):
+            run_pipeline(range(20), fetch, parse_page, lambda batch: None, parsers=1)
+
+    def test_parse_failure_is_raised(self):
+        def fetch(item):
+            return "bad page" if item == 7 else "page %d" % item
+
+        batches = []
+        with self.assertRaisesRegex(ValueError, "item 7"):
+            run_pipeline(range(20), fetch, parse_page, batches.append, parsers=1, batch_size=1)
+        # Nothing after the failed item is written.
+        self.assertTrue(all(item < 7 for batch in batches for item, parsed in batch))
+
+    def test_write_failure_is_raised(self):
+        def write(batch):
+            raise OSError("Disk full")
+
+        with self.assertRaisesRegex(OSError, "Disk full"):
+            run_pipeline(range(20), fetch_page, parse_page, write, parsers=1)
+
+class MapWindowTest(unittest.TestCase):
+    def test_in_order_within_the_window(self):
+        started = []
+        lock = threading.Lock()
+
+        def fetch(item):
+            with lock:
+                started.append(item)
+            return fetch_page(item)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            pages = []
+            for page in map_window(executor, fetch, range(20), 4):
+                # No more than the window is started ahead of the page being handed on.
+                with lock:
+                    self.assertLessEqual(len(started), len(pages) + 4)
+                pages.append(page)
+        self.assertEqual(pages, ["page %d" % item for item in range(20)])
+
+    def test_stopping_early_cancels_the_rest(self):
+        started = []
+
+        def fetch(item):
+            started.append(item)
+            time.sleep(0.01)
+            return item
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            results = map_window(executor, fetch, range(100), 4)
+            self.assertEqual([next(results) for i in range(3)], [0, 1, 2])
+            results.close()
+        self.assertLess(len(started), 10)
+
+    def test_failure_is_raised(self):
+        def fetch(item):
+            if item == 3:
+                raise IOError("Can't fetch item 3")
+            return item
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            with self.assertRaisesRegex(IOError, "item 3"):
+                list(map_window(executor, fetch, range(10), 4))
+
+if __name__ == "__main__":
+    unittest.main()
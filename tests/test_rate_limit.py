@@ -0,0 +1,129 @@
+import email.utils
+import time
+import unittest
+
+import scraper
+from crawl_metrics import CrawlMetrics
+from http_client import HttpClient, get_retry_after, make_headers
+from rate_limit import HostLimiter, HostLimits, TokenBucket
+from stand_in_server import throttle_settings
+from tests.stand_in import StandInTestCase
+
+match_urls = ["http://live.nrlstats.com/nrl/match%04d.html" % match_num for match_num in range(8)]
+
+class TokenBucketTest(unittest.TestCase):
+    def test_unlimited(self):
+        bucket = TokenBucket()
+        self.assertEqual([bucket.take(0.0) for i in range(10)], [0.0] * 10)
+
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=2.0, burst=3)
+        bucket.updated = 0.0
+        self.assertEqual([bucket.take(0.0) for i in range(3)], [0.0] * 3)
+        self.assertAlmostEqual(bucket.take(0.0), 0.5)
+        self.assertEqual(bucket.take(0.5), 0.0)
+        # Tokens don't build up past the burst.
+        self.assertEqual([bucket.take(100.0) for i in range(3)], [0.0] * 3)
+        self.assertGreater(bucket.take(100.0), 0.0)
+
+class HostLimiterTest(unittest.TestCase):
+    def run_requests(self, limiter, count, latency=0.01, throttled=False):
+        for i in range(count):
+            limiter.acquire()
+            limiter.release(latency, throttled)
+
+    def test_throttling_halves_the_limit_and_starts_the_rate(self):
+        # A high minimum rate, so that the bucket doesn't hold the requests back for long.
+        limiter = HostLimiter(max_concurrency=8, min_rate=20.0)
+        self.assertIsNone(limiter.bucket.rate)
+        self.run_requests(limiter, 1, throttled=True)
+        self.assertEqual(limiter.limit, 4.0)
+        rate = limiter.bucket.rate
+        self.assertIsNotNone(rate)
+
+        # Throttled again after a round trip, the limit and rate are halved again, but never
+        # below their minimums.
+        limiter.last_decrease = 0.0
+        self.run_requests(limiter, 1, throttled=True)
+        self.assertEqual(limiter.limit, 2.0)
+        self.assertAlmostEqual(limiter.bucket.rate, max(limiter.min_rate, rate * 0.5))
+        for i in range(10):
+            limiter.last_decrease = 0.0
+            self.run_requests(limiter, 1, throttled=True)
+        self.assertEqual(limiter.limit, float(limiter.min_concurrency))
+        self.assertEqual(limiter.bucket.rate, limiter.min_rate)
+
+    def test_success_grows_the_limit_back(self):
+        limiter = HostLimiter(max_concurrency=4, max_rate=50.0)
+        limiter.limit = 1.0
+        limiter.bucket.rate = 1.0
+        self.run_requests(limiter, 4)
+        self.assertGreater(limiter.limit, 2.0)
+        self.assertGreater(limiter.bucket.rate, 1.0)
+        limiter.bucket.rate = None
+        self.run_requests(limiter, 20)
+        self.assertEqual(limiter.limit, 4.0)
+
+    def test_slow_responses_cut_the_limit(self):
+        limiter = HostLimiter(max_concurrency=4)
+        self.run_requests(limiter, 5, latency=0.01)
+        self.assertEqual(limiter.limit, 4.0)
+        self.run_requests(limiter, 10, latency=1.0)
+        self.assertLess(limiter.limit, 4.0)
+        self.assertIsNone(limiter.bucket.rate)
+
+    def test_pause(self):
+        limiter = HostLimiter()
+        limiter.pause(0.2)
+        start = time.monotonic()
+        limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+        limiter.release(0.01)
+
+    def test_hosts_have_their_own_limiters(self):
+        limits = HostLimits(max_concurrency=2)
+        self.assertIs(limits.get("a"), limits.get("a"))
+        self.assertIsNot(limits.get("a"), limits.get("b"))
+        self.assertEqual(limits.get("b").max_concurrency, 2)
+
+class RetryDelayTest(unittest.TestCase):
+    def test_retry_after(self):
+        self.assertEqual(get_retry_after(make_headers([("Retry-After", "7")])), 7.0)
+        when = email.utils.formatdate(time.time() + 60, usegmt=True)
+        self.assertAlmostEqual(get_retry_after(make_headers([("Retry-After", when)])), 60, delta=2)
+        self.assertIsNone(get_retry_after(make_headers([("Retry-After", "soon")])))
+        self.assertIsNone(get_retry_after(None))
+
+    def test_backoff(self):
+        client = HttpClient(backoff_base=0.5, max_backoff=3, max_retry_after=10)
+        for attempt in range(6):
+            delay = client.get_retry_delay(attempt)
+            self.assertTrue(0 <= delay <= min(3, 0.5 * 2 ** attempt))
+        self.assertEqual(client.get_retry_delay(0, make_headers([("Retry-After", "2")])), 2.0)
+        self.assertEqual(client.get_retry_delay(0, make_headers([("Retry-After", "3600")])), 10)
+
+class ThrottledServerTest(StandInTestCase):
+    def setUp(self):
+        StandInTestCase.setUp(self)
+        saved_settings = dict(throttle_settings)
+        self.addCleanup(throttle_settings.update, saved_settings)
+        throttle_settings.update(max_in_flight=100, fail_every=3, latency_per_request=0)
+        self.server.throttle = True
+        self.addCleanup(setattr, self.server, "throttle", False)
+
+    def test_failures_are_retried(self):
+        client = HttpClient(metrics=CrawlMetrics(), limits=HostLimits(min_rate=20.0), backoff_base=0.001)
+        client.resolve = dict(scraper.default_client.resolve)
+        self.addCleanup(client.close)
+        throttled = self.server.throttled
+        for url in match_urls:
+            self.assertEqual(client.get(url).status, 200)
+        # Every third request failed, and was tried again.
+        self.assertGreater(self.server.throttled, throttled)
+        self.assertEqual(client.metrics.get_total("retries"), self.server.throttled - throttled)
+        limiter = client.limits.get("live.nrlstats.com")
+        self.assertIsNotNone(limiter.bucket.rate)
+        self.assertEqual(limiter.in_flight, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import unittest
+
+import scraper
+from http_client import HttpClient
+from response_cache import ResponseCache, get_cache_ttl
+from tests.stand_in import StandInTestCase, read_fixture
+
+match_url = "http://live.nrlstats.com/nrl/match0000.html"
+box_score_url = "http://www.basketball-reference.com/boxscores/201305140SAS.html"
+
+class CachePolicyTest(unittest.TestCase):
+    def test_ttls(self):
+        self.assertIsNone(get_cache_ttl("http://web.archive.org/web/20080718185646/http://www.nrlstats.com/"))
+        self.assertEqual(get_cache_ttl(match_url), 0)
+        self.assertEqual(get_cache_ttl(box_score_url), 7 * 24 * 60 * 60)
+
+class ResponseCacheTest(StandInTestCase):
+    def setUp(self):
+        StandInTestCase.setUp(self)
+        self.cache = ResponseCache(os.path.join(self.out_dir, "http_cache"))
+        self.addCleanup(self.cache.close)
+        self.client = HttpClient(cache=self.cache)
+        self.client.resolve = dict(scraper.default_client.resolve)
+        self.addCleanup(self.client.close)
+        self.saved_body = self.server.bodies[match_url]
+        self.addCleanup(self.server.bodies.__setitem__, match_url, self.saved_body)
+
+    def test_stale_copy_is_revalidated(self):
+        response = self.client.get(match_url)
+        self.assertFalse(response.from_cache)
+        requests, not_modified = self.server.requests, self.server.not_modified
+
+        # Match pages are always stale, so each get asks the server, which says they haven't changed.
+        for attempt in range(2):
+            response = self.client.get(match_url)
+            self.assertTrue(response.from_cache)
+            self.assertEqual(response.body, read_fixture("nrlstats_match_a.html"))
+        self.assertEqual(self.server.requests - requests, 2)
+        self.assertEqual(self.server.not_modified - not_modified, 2)
+
+    def test_changed_page_replaces_the_copy(self):
+        self.client.get(match_url)
+        self.server.bodies[match_url] = read_fixture("nrlstats_match_b.html")
+        response = self.client.get(match_url)
+        self.assertFalse(response.from_cache)
+        self.assertEqual(response.body, read_fixture("nrlstats_match_b.html"))
+        self.assertEqual(self.cache.get(match_url).body, read_fixture("nrlstats_match_b.html"))
+
+    def test_fresh_copy_is_used(self):
+        self.client.get(box_score_url)
+        requests = self.server.requests
+        response = self.client.get(box_score_url)
+        self.assertTrue(response.from_cache)
+        self.assertEqual(self.server.requests, requests)
+
+    def test_bodies_are_stored_once(self):
+        # Match pages 0 and 2 are the same page.
+        self.client.get(match_url)
+        self.client.get("http://live.nrlstats.com/nrl/match0002.html")
+        self.assertEqual(self.cache.total_bytes(), len(read_fixture("nrlstats_match_a.html")))
+
+    def test_least_recently_used_are_evicted(self):
+        self.cache.max_bytes = len(read_fixture("nrlstats_match_a.html")) + len(read_fixture("nrlstats_match_b.html"))
+        self.client.get(match_url)
+        self.client.get("http://live.nrlstats.com/nrl/match0001.html")
+        self.client.get(match_url)
+        self.client.get(box_score_url)
+        self.assertIsNotNone(self.cache.get(match_url))
+        self.assertIsNone(self.cache.get("http://live.nrlstats.com/nrl/match0001.html"))
+        self.assertLessEqual(self.cache.total_bytes(), self.cache.max_bytes)
+
+if __name__ == "__main__":
+    unittest.main()
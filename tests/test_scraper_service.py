@@ -0,0 +1,102 @@
+import http.client
+import json
+import os
+import threading
+import time
+import unittest
+
+import scraper
+from scraper_service import ScraperService, make_server, parse_job_command
+from tests.stand_in import StandInTestCase, list_files
+
+class JobCommandTest(unittest.TestCase):
+    def test_commands(self):
+        self.assertEqual(parse_job_command("season 2008"), ("season", {"year" : 2008}))
+        self.assertEqual(parse_job_command("box scores 2013-05-14..2013-05-16"),
+                         ("box_scores", {"start" : "2013-05-14", "end" : "2013-05-16"}))
+        self.assertEqual(parse_job_command("match http://live.nrlstats.com/nrl/match0000.html"),
+                         ("match", {"url" : "http://live.nrlstats.com/nrl/match0000.html"}))
+        with self.assertRaises(ValueError):
+            parse_job_command("seasons 2008")
+
+class ScraperServiceTest(StandInTestCase):
+    def setUp(self):
+        StandInTestCase.setUp(self)
+        self.service = ScraperService(self.out_dir, workers=2)
+        self.addCleanup(self.service.shutdown)
+        self.api = make_server(self.service, port=0)
+        threading.Thread(target=self.api.serve_forever, daemon=True).start()
+        self.addCleanup(self.api.server_close)
+        self.addCleanup(self.api.shutdown)
+
+    def call(self, method, path, body=None):
+        conn = http.client.HTTPConnection("127.0.0.1", self.api.server_address[1], timeout=10)
+        try:
+            conn.request(method, path, body)
+            response = conn.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            conn.close()
+
+    def wait_for_job(self, job_id):
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            status, job = self.call("GET", "/jobs/%d" % job_id)
+            self.assertEqual(status, 200)
+            if job["status"] in ("done", "failed"):
+                return job
+            time.sleep(0.05)
+        self.fail("Job %d didn't finish" % job_id)
+
+    def test_box_scores_job(self):
+        status, job = self.call("POST", "/jobs", "box scores 2013-05-14")
+        self.assertEqual(status, 202)
+        self.assertEqual((job["kind"], job["params"]), ("box_scores", {"start" : "2013-05-14", "end" : "2013-05-14"}))
+        job = self.wait_for_job(job["id"])
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(len([path for path in list_files(self.out_dir) if path.endswith("basic.csv")]), 4)
+
+        status, jobs = self.call("GET", "/jobs")
+        self.assertEqual([job["id"] for job in jobs], [job["id"]])
+        status, counts = self.call("GET", "/status")
+        self.assertEqual(counts["jobs"]["done"], 1)
+
+    def test_match_job(self):
+        url = scraper.get_nrlstats_season_matches(2015)[0].url
+        status, job = self.call("POST", "/jobs", json.dumps({"kind" : "match", "url" : url, "year" : 2015}))
+        self.assertEqual(status, 202)
+        self.assertEqual(self.wait_for_job(job["id"])["status"], "done")
+        self.assertGreater(len(list_files(os.path.join(self.out_dir, "2015"))), 0)
+
+    def test_bad_jobs(self):
+        status, error = self.call("POST", "/jobs", "seasons 2008")
+        self.assertEqual(status, 400)
+        self.assertIn("Unknown job", error["error"])
+        status, error = self.call("POST", "/jobs", json.dumps({"year" : 2008}))
+        self.assertEqual(status, 400)
+        self.assertIn("no kind", error["error"])
+        status, error = self.call("POST", "/jobs", "{not json")
+        self.assertEqual(status, 400)
+        self.assertEqual(self.call("GET", "/jobs/99")[0], 404)
+        self.assertEqual(self.call("GET", "/jobs"), (200, []))
+
+    def test_season_page_is_fetched_once(self):
+        matches = scraper.get_nrlstats_season_matches(2015)
+        requests = self.server.requests
+        barrier = threading.Barrier(4)
+        found = []
+
+        def find(match):
+            barrier.wait()
+            found.append(self.service.find_match(match.url, 2015))
+
+        threads = [threading.Thread(target=find, args=(match,)) for match in matches[:4]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(match.url for match in found), sorted(match.url for match in matches[:4]))
+        self.assertEqual(self.server.requests - requests, 1)
+
+if __name__ == "__main__":
+    unittest.main()
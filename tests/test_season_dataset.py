@@ -0,0 +1,66 @@
+import os
+import unittest
+
+import scraper
+from records import NrlstatsTeamStat
+from season_dataset import SeasonDataset, parse_stat_value, pyarrow, read_season_dataset
+from tests.stand_in import StandInTestCase
+
+def make_match():
+    return scraper.make_nrlstats_match("http://live.nrlstats.com/nrl/match0001.html", "1_Mar",
+                                       ["Brisbane", "Canberra"], 2015, 1, "12 - 6", "Full Time")
+
+class StatValueTest(unittest.TestCase):
+    def test_values(self):
+        self.assertEqual(parse_stat_value("14 (318m)"), [("", 14), ("_metres", 318)])
+        self.assertEqual(parse_stat_value("86%"), [("_percent", 86)])
+        self.assertEqual(parse_stat_value("1,307"), [("", 1307)])
+        self.assertEqual(parse_stat_value("-"), [])
+        self.assertIsNone(parse_stat_value("Try"))
+
+    def test_compound_values(self):
+        self.assertEqual(parse_stat_value("25 (510m) | 1 | 3"),
+                         [("_1", 25), ("_1_metres", 510), ("_2", 1), ("_3", 3)])
+        self.assertEqual(parse_stat_value("50% | 1,307"), [("_1_percent", 50), ("_2", 1307)])
+        # Only the separator that the lines of a cell are joined with splits it.
+        self.assertIsNone(parse_stat_value("12; 4"))
+        self.assertIsNone(parse_stat_value("12, 4"))
+
+@unittest.skipIf(pyarrow is None, "pyarrow isn't installed")
+class SeasonDatasetTest(StandInTestCase):
+    def test_team_and_game_stats_are_kept_apart(self):
+        match = make_match()
+        dataset = SeasonDataset()
+        dataset.add_match(match)
+        dataset.add_team_stat(NrlstatsTeamStat(match, "team", "full", "Tackles", ("300", "280")))
+        dataset.add_team_stat(NrlstatsTeamStat(match, "game", "full", "Tackles", ("310", "290")))
+        columns = dataset.get_columns("team")
+        self.assertEqual(columns["tackles"], [300, 280])
+        self.assertEqual(columns["game_tackles"], [310, 290])
+
+    def test_empty_tables_can_be_read(self):
+        match = make_match()
+        dataset = SeasonDataset()
+        dataset.add_match(match)
+        dataset.add_team_stat(NrlstatsTeamStat(match, "team", "full", "Tackles", ("300", "280")))
+        path = os.path.join(self.out_dir, "dataset")
+        dataset.write(path)
+
+        self.assertEqual(read_season_dataset(path, "match").num_rows, 1)
+        self.assertEqual(read_season_dataset(path, "team").num_rows, 2)
+        players = read_season_dataset(path, "player")
+        self.assertEqual(players.num_rows, 0)
+        self.assertEqual(players.column_names, ["match", "date", "period", "team", "player"])
+
+    def test_season(self):
+        scraper.extract_nrlstats_season(2015, out_dir=self.out_dir, output="parquet")
+        path = os.path.join(self.out_dir, "2015", "dataset")
+        matches = read_season_dataset(path, "match").to_pandas()
+        self.assertEqual(len(matches), len(scraper.get_nrlstats_season_matches(2015)))
+        teams = read_season_dataset(path, "team").to_pandas()
+        self.assertIn("game_tackles", teams.columns)
+        self.assertFalse((teams["tackles"].isnull()).any())
+        self.assertGreater(len(read_season_dataset(path, "player")), 0)
+
+if __name__ == "__main__":
+    unittest.main()
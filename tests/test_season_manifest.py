@@ -0,0 +1,113 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import scraper
+from scraper import SeasonManifest, open_atomic
+from tests.stand_in import StandInTestCase, list_files
+
+class AtomicFileTest(unittest.TestCase):
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp(prefix="nrl-test-")
+        self.addCleanup(shutil.rmtree, self.out_dir, ignore_errors=True)
+        self.path = os.path.join(self.out_dir, "table.csv")
+
+    def test_written_on_close(self):
+        with open_atomic(self.path) as f:
+            f.write("a,b\n")
+            self.assertFalse(os.path.exists(self.path))
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "a,b\n")
+        self.assertEqual(os.listdir(self.out_dir), ["table.csv"])
+
+    def test_exception_leaves_no_file(self):
+        with self.assertRaises(ValueError):
+            with open_atomic(self.path) as f:
+                f.write("a,b\n")
+                raise ValueError("Bad row")
+        self.assertEqual(os.listdir(self.out_dir), [])
+
+    def test_exception_keeps_the_old_file(self):
+        with open_atomic(self.path) as f:
+            f.write("old\n")
+        with self.assertRaises(ValueError):
+            with open_atomic(self.path) as f:
+                f.write("new\n")
+                raise ValueError("Bad row")
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "old\n")
+        self.assertEqual(os.listdir(self.out_dir), ["table.csv"])
+
+class SeasonDirectoryTest(StandInTestCase):
+    def test_missing_out_dir_is_made(self):
+        out_dir = os.path.join(self.out_dir, "nrl", "seasons")
+        scraper.extract_nrlstats_season(2015, out_dir=out_dir)
+        self.assertEqual(len(SeasonManifest(os.path.join(out_dir, "2015", "manifest.json")).matches), 16)
+
+class ResumedSeasonTest(StandInTestCase):
+    def setUp(self):
+        StandInTestCase.setUp(self)
+        scraper.extract_nrlstats_season(2015, out_dir=self.out_dir)
+        self.year_dir = os.path.join(self.out_dir, "2015")
+        self.manifest_path = os.path.join(self.year_dir, "manifest.json")
+        self.manifest = SeasonManifest(self.manifest_path)
+        self.match_names = sorted(self.manifest.matches.keys())
+        self.files = self.read_files()
+
+    def read_files(self):
+        files = {}
+        for path in list_files(self.year_dir):
+            with open(os.path.join(self.year_dir, path), 'rb') as f:
+                files[path] = f.read()
+        return files
+
+    def rerun(self):
+        """
+        Runs the season again, returning the number of match pages that were fetched.
+        """
+        requests = self.server.requests
+        scraper.extract_nrlstats_season(2015, out_dir=self.out_dir)
+        # The season page is always fetched, for its list of matches.
+        return self.server.requests - requests - 1
+
+    def test_complete_season_fetches_nothing(self):
+        self.assertEqual(len(self.match_names), 16)
+        self.assertTrue(all(entry["state"] == "complete" for entry in self.manifest.matches.values()))
+        self.assertEqual(self.rerun(), 0)
+        self.assertEqual(self.read_files(), self.files)
+
+    def test_started_match_is_redone(self):
+        match_name = self.match_names[3]
+        self.manifest.mark_started(match_name, self.manifest.matches[match_name]["url"])
+        self.assertEqual(self.rerun(), 1)
+        self.assertTrue(SeasonManifest(self.manifest_path).is_complete(match_name,
+                                                                       os.path.join(self.year_dir, match_name)))
+        self.assertEqual(self.read_files(), self.files)
+
+    def test_edited_file_is_redone(self):
+        match_name = self.match_names[0]
+        name = sorted(self.manifest.matches[match_name]["files"].keys())[0]
+        path = os.path.join(self.year_dir, match_name, name)
+        with open(path, 'a') as f:
+            f.write("edited,row\n")
+        self.assertFalse(self.manifest.is_complete(match_name, os.path.join(self.year_dir, match_name)))
+        self.assertEqual(self.rerun(), 1)
+        self.assertEqual(self.read_files(), self.files)
+
+    def test_removed_file_is_redone(self):
+        match_name = self.match_names[1]
+        name = sorted(self.manifest.matches[match_name]["files"].keys())[-1]
+        os.remove(os.path.join(self.year_dir, match_name, name))
+        self.assertEqual(self.rerun(), 1)
+        self.assertEqual(self.read_files(), self.files)
+
+    def test_manifest_is_written_whole(self):
+        with open(self.manifest_path) as f:
+            matches = json.load(f)
+        self.assertEqual(matches, self.manifest.matches)
+        self.assertFalse(any(name.endswith(".tmp") for name in os.listdir(self.year_dir)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import datetime
+import os
+import sqlite3
+import unittest
+
+import scraper
+from stats_store import StatsStore, get_box_score_game
+from tests.stand_in import StandInTestCase
+
+class StatsStoreTest(StandInTestCase):
+    def test_box_scores_range_is_committed(self):
+        path = os.path.join(self.out_dir, "stats.db")
+        store = StatsStore(path)
+        scraper.extract_box_scores_range(datetime.date(2013, 5, 14), datetime.date(2013, 5, 16), store=store)
+
+        # Seen from another connection, without closing the store, fewer games than a batch
+        # must still have been saved.
+        db = sqlite3.connect(path)
+        games = db.execute("SELECT COUNT(DISTINCT game) FROM box_score_rows").fetchone()[0]
+        db.close()
+        store.close()
+        self.assertEqual(games, 6)
+
+    def test_storing_again_replaces(self):
+        path = os.path.join(self.out_dir, "stats.db")
+        store = StatsStore(path)
+        date = datetime.date(2013, 5, 14)
+        scraper.extract_box_scores(date, store=store)
+        rows = store.query_box_scores(date=date.isoformat())
+        scraper.extract_box_scores(date, store=store)
+        self.assertEqual(store.query_box_scores(date=date.isoformat()), rows)
+        store.close()
+
+    def test_nrlstats_season(self):
+        path = os.path.join(self.out_dir, "stats.db")
+        store = StatsStore(path)
+        scraper.extract_nrlstats_season(2015, store=store)
+        matches = scraper.get_nrlstats_season_matches(2015)
+        self.assertTrue(all(store.has_match(match.name) for match in matches))
+        self.assertGreater(len(store.query_player_stats(season=2015, team=matches[0].teams[0])), 0)
+        store.close()
+
+    def test_box_score_game(self):
+        self.assertEqual(get_box_score_game("http://www.basketball-reference.com/boxscores/201305140SAS.html"),
+                         "201305140SAS")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import scraper
+from crawl_metrics import CrawlMetrics
+from table_deltas import DeltaStream, diff_rows
+from tests.stand_in import StandInTestCase
+
+match_url = "http://live.nrlstats.com/nrl/match0000.html"
+
+# A row of the tackling stats of the fixture match, and the same row later in the match.
+tackles_row = b"<tr><td>2 Jones, Ben</td><td>WG</td><td>31</td><td>0</td>"
+later_tackles_row = b"<tr><td>2 Jones, Ben</td><td>WG</td><td>35</td><td>3</td>"
+
+def read_deltas(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+class DiffRowsTest(unittest.TestCase):
+    def test_changes(self):
+        old = [["Smith", "10"], ["Jones", "4"], ["Brown", "7"]]
+        new = [["Lee", "1"], ["Smith", "12"], ["Brown", "7"]]
+        self.assertEqual(diff_rows(old, new), [
+            ("add", "Lee", ["Lee", "1"], None),
+            ("change", "Smith", ["Smith", "12"], ["Smith", "10"]),
+            ("remove", "Jones", None, ["Jones", "4"]),
+        ])
+        self.assertEqual(diff_rows(new, new), [])
+
+    def test_repeated_keys(self):
+        old = [["Smith", "1"], ["Smith", "2"]]
+        self.assertEqual(diff_rows(old, [["Smith", "1"], ["Smith", "3"]]),
+                         [("change", "Smith#2", ["Smith", "3"], ["Smith", "2"])])
+
+class DeltaStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp(prefix="nrl-test-")
+        self.addCleanup(shutil.rmtree, self.out_dir, ignore_errors=True)
+
+    def test_lines(self):
+        path = os.path.join(self.out_dir, "live", "deltas.jsonl")
+        stream = DeltaStream(path)
+        stream.append("match", "table", diff_rows([["Smith", "10"]], [["Smith", "12"], ["Lee", "1"]]))
+        stream.append("match", "table", [])
+        stream.close()
+        deltas = read_deltas(path)
+        self.assertEqual(stream.count, 2)
+        for delta in deltas:
+            datetime.datetime.fromisoformat(delta.pop("time"))
+        self.assertEqual(deltas, [
+            {"source" : "match", "table" : "table", "op" : "change", "key" : "Smith", "values" : ["Smith", "12"],
+             "previous" : ["Smith", "10"]},
+            {"source" : "match", "table" : "table", "op" : "add", "key" : "Lee", "values" : ["Lee", "1"]},
+        ])
+
+class LivePollTest(StandInTestCase):
+    def setUp(self):
+        StandInTestCase.setUp(self)
+        self.saved_body = self.server.bodies[match_url]
+        self.addCleanup(self.server.bodies.__setitem__, match_url, self.saved_body)
+        self.match = scraper.get_nrlstats_season_matches(2015)[0]
+        self.assertEqual(self.match.url, match_url)
+        self.saved_metrics = scraper.default_metrics
+        scraper.default_metrics = CrawlMetrics()
+        self.addCleanup(setattr, scraper, "default_metrics", self.saved_metrics)
+        self.path = os.path.join(self.out_dir, "deltas.jsonl")
+
+    def test_only_changes_are_emitted(self):
+        live = scraper.LiveMatch(self.match)
+        stream = DeltaStream(self.path)
+        self.addCleanup(stream.close)
+
+        # The first poll adds every row of every table.
+        tables = scraper.poll_nrlstats_match(live, stream)
+        self.assertEqual(tables, len(scraper.nrlstats_match_tables))
+        first_count = stream.count
+        self.assertTrue(all(delta["op"] == "add" for delta in read_deltas(self.path)))
+
+        # The page hasn't changed, so the server says so, and nothing is emitted.
+        not_modified = self.server.not_modified
+        self.assertEqual(scraper.poll_nrlstats_match(live, stream), 0)
+        self.assertEqual(self.server.not_modified - not_modified, 1)
+        self.assertEqual(stream.count, first_count)
+
+        # One row of one table changes, so only its div is parsed, and only the row is emitted.
+        self.assertEqual(self.saved_body.count(tackles_row), 1)
+        self.server.bodies[match_url] = self.saved_body.replace(tackles_row, later_tackles_row)
+        skipped = scraper.default_metrics.get_total("live_tables_skipped")
+        self.assertEqual(scraper.poll_nrlstats_match(live, stream), 1)
+        self.assertEqual(scraper.default_metrics.get_total("live_tables_skipped") - skipped,
+                         len(scraper.nrlstats_match_tables) - 1)
+        deltas = read_deltas(self.path)[first_count:]
+        self.assertEqual(len(deltas), 1)
+        self.assertEqual((deltas[0]["table"], deltas[0]["op"]), ("tab-ps-0-tackles-data", "change"))
+        self.assertEqual(deltas[0]["values"][2:4], ["35", "3"])
+        self.assertEqual(deltas[0]["previous"][2:4], ["31", "0"])
+
+    def test_page_without_validators(self):
+        live = scraper.LiveMatch(self.match)
+        stream = DeltaStream(self.path)
+        self.addCleanup(stream.close)
+        scraper.poll_nrlstats_match(live, stream)
+        count = stream.count
+        # Without validators, the page is downloaded again, but its hash shows it is the same.
+        live.validators = None
+        requests = self.server.requests
+        self.assertEqual(scraper.poll_nrlstats_match(live, stream), 0)
+        self.assertEqual(self.server.requests - requests, 1)
+        self.assertEqual(stream.count, count)
+
+    def test_follow_stops_when_idle(self):
+        scraper.follow_nrlstats_matches([self.match], self.path, interval=0.05, idle_timeout=0.3, workers=1)
+        deltas = read_deltas(self.path)
+        self.assertGreater(len(deltas), 0)
+        self.assertTrue(all(delta["op"] == "add" for delta in deltas))
+        # The page didn't change after the first poll, so the later polls were all answered
+        # with 304s.
+        self.assertGreater(scraper.default_metrics.get_total("not_modified"), 1)
+        self.assertEqual(scraper.default_metrics.get_total("live_tables_parsed"), len(scraper.nrlstats_match_tables))
+
+    def test_follow_a_number_of_polls(self):
+        scraper.follow_nrlstats_matches([self.match], self.path, interval=0, polls=3, workers=1)
+        self.assertEqual(scraper.default_metrics.get_total("pages_fetched"), 3)
+        self.assertEqual(scraper.default_metrics.get_total("not_modified"), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import io
+import unittest
+
+from html_parsers import get_parsers
+from html_stream import iter_table_rows
+from table_extract import expand_spans, get_cell_text, get_table_values, write_csv_rows
+
+span_table = ('<div id="stats"><table>'
+              '<tr><th rowspan="2">Player</th><th colspan="2">Tackles</th><th>Runs</th></tr>'
+              '<tr><th>Made</th><th>Missed</th><th>Metres</th></tr>'
+              '<tr><td>Smith</td><td colspan="2" rowspan="2">DNP</td><td rowspan="2">12</td></tr>'
+              '<tr><td>Jones</td></tr>'
+              '<tr><td>Brown<br>(c)</td><td>30</td><td>2</td><td>110</td></tr>'
+              '</table></div>')
+
+span_values = [
+    ("Player", "Tackles", "", "Runs"),
+    ("Player", "Made", "Missed", "Metres"),
+    ("Smith", "DNP", "", "12"),
+    ("Jones", "DNP", "", "12"),
+    ("Brown | (c)", "30", "2", "110"),
+]
+
+def cell(text, colspan=1, rowspan=1, tag="td"):
+    return (tag, [text], colspan, rowspan)
+
+def find_stats(tag, attrs):
+    return "stats" if tag == "div" and attrs.get("id") == "stats" else None
+
+def get_values(cells):
+    return [get_cell_text(cell) for cell in cells]
+
+class ExpandSpansTest(unittest.TestCase):
+    def test_colspan(self):
+        grid = expand_spans([[cell("a", colspan=3), cell("b")]])
+        self.assertEqual(grid, [[cell("a"), ("td", [], 1, 1), ("td", [], 1, 1), cell("b")]])
+
+    def test_rowspan(self):
+        grid = expand_spans([[cell("a", rowspan=3), cell("b")], [cell("c")], [cell("d")]])
+        self.assertEqual(grid, [[cell("a"), cell("b")], [cell("a"), cell("c")], [cell("a"), cell("d")]])
+
+    def test_rowspan_past_the_end_of_a_row(self):
+        grid = expand_spans([[cell("a"), cell("b", rowspan=2)], [cell("c")]])
+        self.assertEqual(grid, [[cell("a"), cell("b")], [cell("c"), cell("b")]])
+
+    def test_colspan_and_rowspan(self):
+        grid = expand_spans([[cell("a", colspan=2, rowspan=2), cell("b")], [cell("c")]])
+        self.assertEqual([get_values(row) for row in grid], [["a", "", "b"], ["a", "", "c"]])
+
+    def test_every_parser_lays_out_the_same_table(self):
+        for name, parser in get_parsers().items():
+            with self.subTest(parser=name):
+                (key, rows), = parser.get_tables(span_table, "div", find_stats)
+                self.assertEqual(get_table_values(rows, get_values), span_values)
+        streamed = [event[2] for event in iter_table_rows([span_table], find_stats) if event[0] == "row"]
+        self.assertEqual(get_table_values(streamed, get_values), span_values)
+
+class WriteCsvRowsTest(unittest.TestCase):
+    def test_batches(self):
+        rows = [(num, "a, b", 'say "hi"') for num in range(10)]
+        for batch_size in (1, 3, 256):
+            f = io.StringIO()
+            write_csv_rows(f, rows, batch_size)
+            lines = f.getvalue().splitlines()
+            self.assertEqual(len(lines), 10)
+            self.assertEqual(lines[0], '0,"a, b","say ""hi"""')
+
+if __name__ == "__main__":
+    unittest.main()
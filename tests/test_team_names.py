@@ -0,0 +1,28 @@
+import unittest
+
+import scraper
+from team_names import normalise_team_name
+
+season_page = ('<div class="m_nrl"><div class="m_h">Round 1</div><div class="m_b"><table>'
+               '<tr><th>Date</th><th>Match</th><th>Score</th><th>Status</th></tr>'
+               '<tr><td>6 Mar</td><td><a href="/nrl/match0000.html">South Sydney v Brisbane Broncos</a></td>'
+               '<td>12 - 27</td><td>Full Time</td></tr>'
+               '<tr><td>8 Jul</td><td><a href="/nrl/match0001.html">Queensland v NSW</a></td>'
+               '<td>6 - 18</td><td>Full Time</td></tr>'
+               '</table></div></div>')
+
+class TeamNamesTest(unittest.TestCase):
+    def test_aliases(self):
+        self.assertEqual(normalise_team_name("South Sydney Rabbitohs"), "SouthSydney")
+        self.assertEqual(normalise_team_name("  st.  george illawarra "), "StGeorgeIllawarra")
+        self.assertEqual(normalise_team_name("Warriors"), "NewZealand")
+
+    def test_unknown_names_are_stripped(self):
+        self.assertEqual(normalise_team_name(" NSW "), "NSW")
+
+    def test_season_page_teams(self):
+        matches = scraper.parse_nrlstats_season_matches(season_page, 2015, "http://live.nrlstats.com")
+        self.assertEqual([match.teams for match in matches], [("SouthSydney", "Brisbane"), ("Queensland", "NSW")])
+
+if __name__ == "__main__":
+    unittest.main()
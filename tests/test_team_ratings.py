@@ -0,0 +1,125 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+import scraper
+from season_dataset import pyarrow
+from stats_store import StatsStore
+from team_ratings import MatchResult, RatingEngine, full_time_statuses, numpy, results_from_nrlstats_matches
+from tests.stand_in import StandInTestCase, read_fixture
+
+def make_match(teams, score, status, day=1):
+    return scraper.make_nrlstats_match("http://live.nrlstats.com/nrl/match%04d.html" % day, "%d_Mar" % day, teams,
+                                       2015, 1, score, status)
+
+def make_season():
+    """
+    Makes four rounds between four clubs, in which Brisbane always scores the most.
+    """
+    teams = ["Brisbane", "Canberra", "Melbourne", "Penrith"]
+    strength = {"Brisbane" : 30, "Canberra" : 20, "Melbourne" : 16, "Penrith" : 12}
+    pairings = [[(0, 1), (2, 3)], [(0, 2), (1, 3)], [(0, 3), (1, 2)], [(1, 0), (3, 2)]]
+    results = []
+    for round_num, pairs in enumerate(pairings):
+        date = datetime.date(2015, 3, 1) + datetime.timedelta(days=7 * round_num)
+        for home, away in pairs:
+            home, away = teams[home], teams[away]
+            results.append(MatchResult(2015, str(round_num + 1), date, home, away,
+                                       strength[home] + 2, strength[away]))
+    return results
+
+class ResultsTest(unittest.TestCase):
+    def test_only_full_time(self):
+        matches = [
+            make_match(["Wests", "Parramatta"], "12 - 6", "Full Time", 1),
+            make_match(["Brisbane", "Canberra"], "6 - 0", "Half Time", 2),
+            make_match(["Melbourne", "Penrith"], "", "", 3),
+        ]
+        results = results_from_nrlstats_matches(matches)
+        self.assertEqual([(result.home, result.away, result.home_score, result.away_score) for result in results],
+                         [("Wests", "Parramatta", 12, 6)])
+
+    def test_season_page(self):
+        html = read_fixture("nrlstats_season2015.html")
+        matches = scraper.parse_nrlstats_season_matches(html, 2015, scraper.nrlstats_season_base_url(2015))
+        self.assertEqual(len(matches), 16)
+        self.assertTrue(all(match.status.lower() in full_time_statuses for match in matches))
+        results = results_from_nrlstats_matches(matches)
+        self.assertEqual(len(results), 16)
+        self.assertEqual(results[0], MatchResult(2015, "Round 1", datetime.date(2015, 3, 6), "SouthSydney", "Brisbane",
+                                                 12, 27))
+
+        # The last match of the season is still being played.
+        last_match = b"<td>15 - 34</td><td>Full Time</td>"
+        self.assertEqual(html.count(last_match), 1)
+        html = html.replace(last_match, b"<td>15 - 34</td><td>Half Time</td>")
+        matches = scraper.parse_nrlstats_season_matches(html, 2015, scraper.nrlstats_season_base_url(2015))
+        self.assertEqual(len(results_from_nrlstats_matches(matches)), 15)
+
+@unittest.skipIf(numpy is None, "numpy isn't installed")
+class RatingEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp(prefix="nrl-test-")
+        self.addCleanup(shutil.rmtree, self.out_dir, ignore_errors=True)
+
+    def test_predict_without_ratings(self):
+        with self.assertRaises(ValueError):
+            RatingEngine().predict("Brisbane", "Canberra")
+
+    def test_fits_each_round_once(self):
+        path = os.path.join(self.out_dir, "ratings.json")
+        engine = RatingEngine(path)
+        results = make_season()
+        self.assertEqual(len(engine.update(results[:4])), 2)
+        self.assertEqual(len(engine.update(results)), 2)
+        self.assertEqual(engine.update(results), [])
+
+        ratings = engine.get_ratings()
+        self.assertEqual(ratings.round, "4")
+        self.assertEqual(ratings.games, len(results))
+        self.assertEqual(max(ratings.attack, key=ratings.attack.get), "Brisbane")
+        (home_rate, away_rate), (home_win, draw, away_win) = engine.predict("Brisbane", "Penrith")
+        self.assertGreater(home_rate, away_rate)
+        self.assertGreater(home_win, away_win)
+        self.assertAlmostEqual(home_win + draw + away_win, 1.0, places=6)
+
+        # The ratings are kept between runs, so nothing is fitted again.
+        engine = RatingEngine(path)
+        self.assertEqual(engine.update(results), [])
+        self.assertEqual(engine.get_ratings(), ratings)
+
+    def test_changed_round_is_fitted_again(self):
+        engine = RatingEngine()
+        results = make_season()
+        engine.update(results)
+        results[-1] = results[-1]._replace(home_score=40)
+        self.assertEqual([ratings.round for ratings in engine.update(results)], ["4"])
+
+@unittest.skipIf(numpy is None, "numpy isn't installed")
+class SeasonRatingsTest(StandInTestCase):
+    def check_ratings(self, engine):
+        ratings = engine.get_ratings()
+        self.assertEqual((ratings.round, ratings.games), ("Round 4", 16))
+
+    def test_csv(self):
+        engine = RatingEngine()
+        scraper.extract_nrlstats_season(2015, out_dir=self.out_dir, ratings=engine)
+        self.check_ratings(engine)
+
+    @unittest.skipIf(pyarrow is None, "pyarrow isn't installed")
+    def test_dataset(self):
+        engine = RatingEngine()
+        scraper.extract_nrlstats_season(2015, out_dir=self.out_dir, output="parquet", ratings=engine)
+        self.check_ratings(engine)
+
+    def test_store(self):
+        engine = RatingEngine()
+        store = StatsStore(os.path.join(self.out_dir, "stats.sqlite3"))
+        self.addCleanup(store.close)
+        scraper.extract_nrlstats_season(2015, store=store, ratings=engine)
+        self.check_ratings(engine)
+
+if __name__ == "__main__":
+    unittest.main()
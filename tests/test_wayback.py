@@ -0,0 +1,113 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import scraper
+import wayback
+from stand_in_server import cdx_url
+from tests.stand_in import StandInTestCase, list_files
+from wayback import WaybackIndex, parse_cdx_response, parse_wayback_url, read_snapshots, url_key
+
+links_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "links.txt")
+
+season_url = "http://www.nrlstats.com/season2007/index.html"
+match_url = "http://www.nrlstats.com/season2007/match0000.html"
+
+class WaybackUrlTest(unittest.TestCase):
+    def test_parse_wayback_url(self):
+        self.assertEqual(parse_wayback_url("http://web.archive.org/web/20080718185646/http://www.nrlstats.com/"),
+                         ("20080718185646", "http://www.nrlstats.com/"))
+        self.assertEqual(parse_wayback_url("http://web.archive.org/web/20080718185646id_/www.nrlstats.com/"),
+                         ("20080718185646", "http://www.nrlstats.com/"))
+        self.assertIsNone(parse_wayback_url("http://live.nrlstats.com/nrl/season2015.html"))
+
+    def test_url_key(self):
+        key = url_key("http://www.nrlstats.com/season2007/")
+        self.assertEqual(key, "nrlstats.com/season2007/")
+        self.assertEqual(url_key("https://WWW.nrlstats.com:80/season2007/"), key)
+        self.assertEqual(url_key("nrlstats.com"), "nrlstats.com/")
+
+    def test_read_snapshots(self):
+        snapshots = read_snapshots(links_path)
+        self.assertIn(("20080718185646", "http://www.nrlstats.com/"), snapshots)
+        self.assertTrue(all(len(timestamp) == 14 for timestamp, original in snapshots))
+
+    def test_parse_cdx_response(self):
+        body = '[["timestamp","original"],["20080718185823","%s"],[],["1"]]' % match_url
+        self.assertEqual(parse_cdx_response(body), ([{"timestamp" : "20080718185823", "original" : match_url}], "1"))
+        self.assertEqual(parse_cdx_response(b""), ([], None))
+
+class BestCaptureTest(unittest.TestCase):
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp(prefix="nrl-test-")
+        self.addCleanup(shutil.rmtree, self.out_dir, ignore_errors=True)
+
+    def open_index(self, snapshots=()):
+        index = WaybackIndex(os.path.join(self.out_dir, "wayback.sqlite3"), snapshots)
+        self.addCleanup(index.close)
+        index.add_captures("http://www.nrlstats.com/season2007/", [
+            {"timestamp" : "20070601000000", "original" : match_url},
+            {"timestamp" : "20080718185823", "original" : match_url},
+            {"timestamp" : "20090101000000", "original" : "http://nrlstats.com/season2007/match0000.html"},
+        ])
+        return index
+
+    def test_latest_without_snapshots(self):
+        self.assertEqual(self.open_index().best_capture(match_url),
+                         ("20090101000000", "http://nrlstats.com/season2007/match0000.html"))
+
+    def test_nearest_to_a_snapshot(self):
+        index = self.open_index([("20080718185646", "http://www.nrlstats.com/")])
+        self.assertEqual(index.best_capture(match_url), ("20080718185823", match_url))
+        # The captures from before the match are only used when there are none after it.
+        index = self.open_index([("20070501000000", "http://www.nrlstats.com/")])
+        self.assertEqual(index.best_capture(match_url), ("20070601000000", match_url))
+        self.assertEqual(index.best_capture(match_url, datetime.date(2007, 9, 1)), ("20080718185823", match_url))
+        self.assertEqual(index.best_capture(match_url, datetime.date(2010, 1, 1)), ("20070601000000", match_url))
+
+    def test_resolve(self):
+        index = self.open_index([("20080718185646", "http://www.nrlstats.com/")])
+        self.assertEqual(index.resolve("http://web.archive.org/web/20080718185646/" + match_url),
+                         "http://web.archive.org/web/20080718185823id_/" + match_url)
+
+    def test_no_capture(self):
+        index = self.open_index()
+        url = "http://web.archive.org/web/20080718185646/http://www.nrlstats.com/season2007/match0099.html"
+        self.assertIsNone(index.best_capture(parse_wayback_url(url)[1]))
+        self.assertEqual(index.resolve(url), url)
+        self.assertEqual(index.resolve("http://live.nrlstats.com/nrl/match0000.html"),
+                         "http://live.nrlstats.com/nrl/match0000.html")
+
+class WaybackSeasonTest(StandInTestCase):
+    def open_index(self):
+        index = WaybackIndex(os.path.join(self.out_dir, "wayback.sqlite3"), read_snapshots(links_path),
+                             cdx_url=cdx_url)
+        self.addCleanup(index.close)
+        return index
+
+    def test_captures_are_loaded_a_page_at_a_time(self):
+        index = self.open_index()
+        requests = self.server.requests
+        with mock.patch.object(wayback, "cdx_page_size", 4):
+            season = scraper.resolve_nrlstats_season_url(2007, scraper.nrlstats_season_base_url(2007), index)
+        self.assertEqual(season, "http://web.archive.org/web/20080718185646id_/" + season_url)
+        self.assertEqual(self.server.requests - requests, 3)
+        self.assertEqual(len(index.get_captures(match_url)), 2)
+
+        # The prefix is only asked for once.
+        scraper.load_wayback_captures(index, "http://www.nrlstats.com/season2007/")
+        self.assertEqual(self.server.requests - requests, 3)
+
+    def test_season_is_read_from_raw_captures(self):
+        index = self.open_index()
+        scraper.extract_nrlstats_season(2007, out_dir=self.out_dir, wayback=index)
+        self.assertGreater(len(list_files(os.path.join(self.out_dir, "2007"))), 0)
+        with open(os.path.join(self.out_dir, "2007", "manifest.json")) as f:
+            manifest = f.read()
+        self.assertIn("20080718185823id_/" + match_url, manifest)
+
+if __name__ == "__main__":
+    unittest.main()
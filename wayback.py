@@ -0,0 +1,214 @@
+import datetime
+import json
+import os
+import re
+import sqlite3
+import threading
+from urllib.parse import urlencode, urlsplit
+
+# The CDX server of the Wayback Machine, which lists the captures of each URL.
+default_cdx_url = "http://web.archive.org/cdx/search/cdx"
+
+# Where the captures are served from. A capture is at <archive_url><timestamp>id_/<url>,
+# where id_ asks for the page exactly as it was captured, without the toolbar and rewritten
+# links that are otherwise added.
+default_archive_url = "http://web.archive.org/web/"
+
+# The number of captures asked of the CDX server at a time.
+cdx_page_size = 5000
+
+# A URL of a page in the Wayback Machine, such as
+# http://web.archive.org/web/20080718185646/http://www.nrlstats.com/season2007/index.html.
+wayback_url_re = re.compile(r"^https?://web\.archive\.org/web/(\d{1,14})(?:[a-z]{2}_)?/(.+)$")
+
+schema = [
+    "CREATE TABLE IF NOT EXISTS captures ("
+    " key TEXT, timestamp TEXT, original TEXT, status TEXT, digest TEXT, length INTEGER,"
+    " PRIMARY KEY (key, timestamp))",
+
+    "CREATE TABLE IF NOT EXISTS prefixes (prefix TEXT PRIMARY KEY, loaded TEXT)",
+]
+
+def parse_wayback_url(url):
+    """
+    Splits a Wayback Machine URL into the timestamp it asks for and the original URL, or
+    returns None if it isn't one.
+    """
+    match = wayback_url_re.match(url)
+    if match is None:
+        return None
+    original = match.group(2)
+    if "://" not in original:
+        original = "http://" + original
+    return match.group(1), original
+
+def url_key(url):
+    """
+    Gets the key that captures of a URL are indexed under, which is the same for the
+    variants of a URL that the site served the same page for: the scheme, a leading www.
+    and the default port are left out, and the host is put in lower case.
+    """
+    if "://" not in url:
+        url = "http://" + url
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    if host.endswith(":80"):
+        host = host[:-3]
+    if host.startswith("www."):
+        host = host[4:]
+    key = host + (parts.path or "/")
+    if parts.query:
+        key += "?" + parts.query
+    return key
+
+def parse_timestamp(timestamp):
+    """
+    Gets the time of a Wayback timestamp (YYYYMMDDhhmmss, or a leading part of it).
+    """
+    timestamp = (timestamp + "00000101000000"[len(timestamp):])[:14]
+    return datetime.datetime.strptime(timestamp, "%Y%m%d%H%M%S")
+
+def read_snapshots(path):
+    """
+    Reads the Wayback snapshots listed in a file such as links.txt, as (timestamp, original
+    URL) pairs. Lines that aren't Wayback URLs are skipped.
+
+    links.txt lists the snapshots of nrlstats.com that the old seasons were found in. They
+    are given to a WaybackIndex, so that it prefers the captures taken around them, as in
+    WaybackIndex("wayback.sqlite3", read_snapshots("links.txt")).
+    """
+    snapshots = []
+    with open(path) as f:
+        for line in f:
+            parsed = parse_wayback_url(line.strip())
+            if parsed is not None:
+                snapshots.append(parsed)
+    return snapshots
+
+def parse_cdx_response(body):
+    """
+    Parses a page of JSON output from the CDX server into its captures, as dicts of field
+    name to value, and the key to resume from for the next page (None on the last page).
+    """
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    rows = json.loads(body) if body.strip() else []
+    if len(rows) == 0:
+        return [], None
+    fields = rows[0]
+    resume_key = None
+    captures = []
+    for row_num, row in enumerate(rows[1:]):
+        if len(row) == 0:
+            # An empty row comes before the resume key.
+            if row_num + 2 < len(rows) and len(rows[row_num + 2]) > 0:
+                resume_key = rows[row_num + 2][0]
+            break
+        captures.append(dict(zip(fields, row)))
+    return captures, resume_key
+
+class WaybackIndex:
+    """
+    A local index of the captures the Wayback Machine holds of each page, kept in an SQLite
+    database at path. It is filled from the CDX server at cdx_url, one URL prefix (such as
+    the directory of a season) at a time, and a prefix is only asked for once.
+
+    It resolves the Wayback URLs that a season is read from to the raw (id_) URL of the
+    best capture of each page, so that the page is fetched in one request, without being
+    redirected to the nearest capture, and without the toolbar markup added to it. The best
+    capture is one that was a success, taken after the given time (such as the day after a
+    match, so that the page holds the result) when there is one, and taken nearest to one of
+    the given snapshots (see read_snapshots), since the site was captured most completely
+    around them.
+    """
+    def __init__(self, path, snapshots=(), cdx_url=default_cdx_url, archive_url=default_archive_url):
+        self.path = os.path.abspath(path)
+        self.cdx_url = cdx_url
+        self.archive_url = archive_url
+        self.snapshot_times = [parse_timestamp(timestamp) for timestamp, original in snapshots]
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        for statement in schema:
+            self.db.execute(statement)
+        self.db.commit()
+
+    def form_cdx_query(self, prefix, resume_key=None):
+        """
+        Forms the URL that asks the CDX server for a page of the successful captures of
+        the URLs starting with the given prefix.
+        """
+        params = [("url", prefix), ("matchType", "prefix"), ("output", "json"),
+                  ("fl", "timestamp,original,statuscode,digest,length"), ("filter", "statuscode:200"),
+                  ("limit", str(cdx_page_size)), ("showResumeKey", "true")]
+        if resume_key is not None:
+            params.append(("resumeKey", resume_key))
+        return self.cdx_url + "?" + urlencode(params)
+
+    def has_prefix(self, prefix):
+        with self.lock:
+            row = self.db.execute("SELECT 1 FROM prefixes WHERE prefix = ?", (url_key(prefix),)).fetchone()
+        return row is not None
+
+    def add_captures(self, prefix, captures):
+        """
+        Stores the captures listed by the CDX server for a prefix, as from
+        parse_cdx_response, and records that the prefix has been loaded.
+        """
+        rows = [(url_key(capture["original"]), capture["timestamp"], capture["original"],
+                 capture.get("statuscode"), capture.get("digest"), int(capture.get("length") or 0))
+                for capture in captures]
+        with self.lock:
+            self.db.executemany("INSERT OR REPLACE INTO captures VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self.db.execute("INSERT OR REPLACE INTO prefixes VALUES (?, ?)",
+                            (url_key(prefix), datetime.datetime.now(datetime.timezone.utc).isoformat()))
+            self.db.commit()
+
+    def get_captures(self, url):
+        """
+        Gets the successful captures of a URL, as (timestamp, original URL) pairs in time order.
+        """
+        with self.lock:
+            return self.db.execute(
+                "SELECT timestamp, original FROM captures WHERE key = ? AND (status = '200' OR status IS NULL)"
+                " ORDER BY timestamp", (url_key(url),)).fetchall()
+
+    def best_capture(self, url, after=None):
+        """
+        Gets the best capture of a URL (see WaybackIndex) as a (timestamp, original URL)
+        pair, or None if it has none. after is a datetime.date or datetime.datetime.
+        """
+        captures = self.get_captures(url)
+        if after is not None:
+            after_timestamp = after.strftime("%Y%m%d%H%M%S")
+            later = [capture for capture in captures if capture[0] >= after_timestamp]
+            if len(later) > 0:
+                captures = later
+        if len(captures) == 0:
+            return None
+        if len(self.snapshot_times) == 0:
+            return captures[-1]
+
+        def distance(capture):
+            time = parse_timestamp(capture[0])
+            return min(abs((time - snapshot_time).total_seconds()) for snapshot_time in self.snapshot_times)
+        return min(captures, key=distance)
+
+    def form_capture_url(self, timestamp, original):
+        return self.archive_url + timestamp + "id_/" + original
+
+    def resolve(self, url, after=None):
+        """
+        Gets the raw URL of the best capture of the page that a Wayback URL points at. A URL
+        that isn't a Wayback URL, or whose page has no known capture, is returned as it is.
+        """
+        parsed = parse_wayback_url(url)
+        if parsed is None:
+            return url
+        capture = self.best_capture(parsed[1], after)
+        if capture is None:
+            return url
+        return self.form_capture_url(capture[0], capture[1])
+
+    def close(self):
+        with self.lock:
+            self.db.close()